@@ -0,0 +1,204 @@
+from django.db.models import Count
+
+from submission.models import JudgeStatus, Submission
+from utils.cache import cache
+from utils.constants import CacheKey, ContestRuleType
+from utils.shortcuts import rand_str
+from .models import AdminType, User, UserProfile
+
+# ACM 순위는 accepted_number 내림차순, submission_number 오름차순이므로 하나의 score 로 합친다
+ACM_SCORE_STEP = 10 ** 10
+REBUILD_CHUNK_SIZE = 1000
+# (rank point 하한, 등급), 높은 등급부터
+RANK_TEARS = [(100, "코딩신"), (70, "코딩왕"), (40, "전문가"), (15, "개발자"), (5, "코린이"), (0, "코생아")]
+
+
+def rank_tear(rank_point):
+    return next(tear for lower, tear in RANK_TEARS if rank_point >= lower)
+
+
+def rank_points():
+    """
+    {user_id: rank point}, rank point 는 사용자가 AC 를 받은 문제의 수
+    """
+    submissions = Submission.objects.filter(result=JudgeStatus.ACCEPTED)
+    return dict(submissions.order_by().values("user_id").annotate(point=Count("problem_id", distinct=True))
+                .values_list("user_id", "point"))
+
+
+class Leaderboard:
+    """
+    전체 사용자 순위를 규칙(ACM, OI, POINT)마다 Redis sorted set (member: user_id) 으로 유지한다.
+    채점이 끝나면 바뀐 값만큼 score 를 더하고(update_leaderboards), 순위 조회와 page 조회는 O(log n) 이다.
+    APIView.paginate_data 에 그대로 넘길 수 있도록 slice 와 count() 를 지원한다.
+
+    더하기만 하므로 다시 만드는 중에 들어온 채점 결과는 빠질 수 있다, 주기적으로 reconcile() 로 DB 와 맞춘다.
+    """
+    def __init__(self, rule_type):
+        if rule_type not in ContestRuleType.choices():
+            rule_type = ContestRuleType.ACM
+        self.rule_type = rule_type
+        self.key = f"{CacheKey.user_leaderboard}:{rule_type}"
+        self.built_key = f"{CacheKey.user_leaderboard_built}:{rule_type}"
+
+    @classmethod
+    def all(cls):
+        return [cls(rule_type) for rule_type in ContestRuleType.choices()]
+
+    @property
+    def model(self):
+        return User if self.rule_type == ContestRuleType.POINT else UserProfile
+
+    def scores(self):
+        """
+        DB 로 계산한 (user_id, score) 목록, 관리자와 비활성 사용자, score 가 없는 사용자는 뺀다
+        """
+        users = User.objects.filter(admin_type=AdminType.REGULAR_USER, is_disabled=False)
+        if self.rule_type == ContestRuleType.POINT:
+            regular = set(users.values_list("id", flat=True))
+            return ((user_id, point) for user_id, point in rank_points().items() if user_id in regular)
+        profiles = UserProfile.objects.filter(user__in=users)
+        if self.rule_type == ContestRuleType.ACM:
+            rows = profiles.filter(submission_number__gt=0) \
+                .values_list("user_id", "accepted_number", "submission_number").iterator()
+            return ((user_id, accepted_number * ACM_SCORE_STEP - submission_number)
+                    for user_id, accepted_number, submission_number in rows)
+        return profiles.filter(total_score__gt=0).values_list("user_id", "total_score").iterator()
+
+    def is_built(self):
+        return bool(cache.exists(self.built_key))
+
+    def rebuild(self):
+        # 동시에 여러 곳에서 다시 만들어도 서로의 임시 key 를 지우지 않도록 key 를 따로 쓴다
+        tmp_key = f"{self.key}:rebuild:{rand_str()}"
+        mapping = {}
+        for user_id, score in self.scores():
+            mapping[user_id] = score
+            if len(mapping) >= REBUILD_CHUNK_SIZE:
+                cache.zadd(tmp_key, mapping)
+                mapping = {}
+        if mapping:
+            cache.zadd(tmp_key, mapping)
+
+        pipe = cache.pipeline()
+        if cache.exists(tmp_key):
+            pipe.rename(tmp_key, self.key)
+        else:
+            pipe.delete(self.key)
+        pipe.set(self.built_key, 1)
+        pipe.execute()
+
+    def ensure_built(self):
+        if not self.is_built():
+            self.rebuild()
+
+    def invalidate(self):
+        cache.delete_many([self.key, self.built_key])
+
+    def reconcile(self):
+        """
+        sorted set 을 DB 의 score 와 비교해서 다른 것만 고친다
+        :return: 고친 사용자 수
+        """
+        if not self.is_built():
+            self.rebuild()
+            return 0
+        expected = dict(self.scores())
+        pipe = cache.pipeline()
+        fixed = 0
+        for member, score in cache.zscan_iter(self.key):
+            user_id = int(member)
+            expected_score = expected.pop(user_id, None)
+            if expected_score is None:
+                pipe.zrem(self.key, user_id)
+                fixed += 1
+            elif score != expected_score:
+                pipe.zadd(self.key, {user_id: expected_score})
+                fixed += 1
+        # 남은 것은 sorted set 에 없는 사용자
+        if expected:
+            pipe.zadd(self.key, expected)
+            fixed += len(expected)
+        pipe.execute()
+        return fixed
+
+    def increment(self, user_id, amount):
+        """
+        아직 만들어지지 않은 순위표는 다음 조회 때 DB 에서 만들어지므로 건너뛴다
+        """
+        if not amount or not self.is_built():
+            return
+        score = cache.zincrby(self.key, amount, user_id)
+        # ACM 은 AC 가 없어도 제출이 있으면 순위에 있다, OI 와 POINT 는 0 점이면 뺀다
+        if score <= 0 and self.rule_type != ContestRuleType.ACM:
+            cache.zrem(self.key, user_id)
+
+    def rank_of(self, user_id):
+        """
+        :return: 1 부터 시작하는 순위, 순위표에 없으면 None
+        """
+        self.ensure_built()
+        rank = cache.zrevrank(self.key, user_id)
+        return None if rank is None else rank + 1
+
+    def count(self):
+        self.ensure_built()
+        return cache.zcard(self.key)
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            raise TypeError("Leaderboard only supports slicing")
+        self.ensure_built()
+        start = item.start or 0
+        stop = item.stop if item.stop is not None else 0
+        if stop <= start:
+            return []
+        user_ids = [int(uid) for uid in cache.zrevrange(self.key, start, stop - 1)]
+        if self.model is User:
+            objects = {user.id: user for user in User.objects.filter(id__in=user_ids)}
+        else:
+            objects = {profile.user_id: profile for profile in
+                       UserProfile.objects.filter(user_id__in=user_ids).select_related("user")}
+        return [objects[uid] for uid in user_ids if uid in objects]
+
+    def __iter__(self):
+        return iter(self[0:self.count()])
+
+
+def update_leaderboards(user_id, submission_number=0, accepted_number=0, total_score=0, rank_point=0):
+    """
+    채점으로 바뀐 값만큼 순위표의 score 를 바꾼다, 관리자와 비활성 사용자는 순위표에 없다
+    """
+    amounts = {ContestRuleType.ACM: accepted_number * ACM_SCORE_STEP - submission_number,
+               ContestRuleType.OI: total_score,
+               ContestRuleType.POINT: rank_point}
+    if not any(amounts.values()):
+        return
+    if not User.objects.filter(id=user_id, admin_type=AdminType.REGULAR_USER, is_disabled=False).exists():
+        return
+    for rule_type, amount in amounts.items():
+        Leaderboard(rule_type).increment(user_id, amount)
+
+
+def sync_rank_points():
+    """
+    User.rank_point 와 rank_tear 를 제출 기록과 맞춘다
+    :return: 고친 사용자 수
+    """
+    points = rank_points()
+    fixed = 0
+    for user_id, rank_point in User.objects.values_list("id", "rank_point").iterator():
+        expected = points.get(user_id, 0)
+        if rank_point != expected:
+            User.objects.filter(id=user_id).update(rank_point=expected, rank_tear=rank_tear(expected))
+            fixed += 1
+    return fixed
+
+
+def reconcile_leaderboards():
+    """
+    CRONJOBS 에서 주기적으로 실행한다
+    """
+    sync_rank_points()
+    for leaderboard in Leaderboard.all():
+        leaderboard.reconcile()
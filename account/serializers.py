@@ -6,7 +6,8 @@ from contest.serializers import ContestSerializer, UserContestSerializer
 from .models import AdminType, ProblemPermission, User, UserProfile
 from lecture.models import signup_class
 from contest.models import Contest
-from lecture.serializers import LectureSerializer
+from problem.models import UserProblemStatus
+from lecture.serializers import LectureSerializer, ScoreField
 
 
 class UserLoginSerializer(serializers.Serializer):
@@ -71,6 +72,7 @@ class UserSerializer(serializers.ModelSerializer):
 
 class SimpleSignupSerializer(serializers.ModelSerializer):
     user = UserSerializer()
+    score = ScoreField()
     class Meta:
         model = signup_class
         fields = "__all__"
@@ -78,6 +80,7 @@ class SimpleSignupSerializer(serializers.ModelSerializer):
 class ContestSignupSerializer(serializers.ModelSerializer):
     totalScore = serializers.IntegerField()
     lecDict = serializers.DictField()
+    score = ScoreField()
 
     class Meta:
         model = signup_class
@@ -101,6 +104,7 @@ class SignupSerializer(serializers.ModelSerializer):
     avgScore = serializers.FloatField()
     progress = serializers.FloatField()
     lecDict = serializers.DictField()
+    score = ScoreField()
     class Meta:
         model = signup_class
         fields = "__all__"
@@ -108,9 +112,30 @@ class SignupSerializer(serializers.ModelSerializer):
 class MainSignupSerializer(SignupSerializer):
     contestlist = serializers.DictField()
 
+
+class SignupSummarySerializer(SignupSerializer):
+    """
+    LectureScoreSummary 를 annotate 한 signup_class 용, score 원본은 내보내지 않는다
+    """
+    score = None
+    lecDict = serializers.SerializerMethodField()
+
+    class Meta:
+        model = signup_class
+        exclude = ("score",)
+
+    def get_lecDict(self, obj):
+        return dict()
+
+
+class MainSignupSummarySerializer(SignupSummarySerializer):
+    contestlist = serializers.DictField()
+
 class UserProfileSerializer(serializers.ModelSerializer):
     user = UserSerializer()
     real_name = serializers.SerializerMethodField()
+    acm_problems_status = serializers.SerializerMethodField()
+    oi_problems_status = serializers.SerializerMethodField()
 
     class Meta:
         model = UserProfile
@@ -118,11 +143,27 @@ class UserProfileSerializer(serializers.ModelSerializer):
 
     def __init__(self, *args, **kwargs):
         self.show_real_name = kwargs.pop("show_real_name", False)
+        self._problems_status = {}
         super(UserProfileSerializer, self).__init__(*args, **kwargs)
 
     def get_real_name(self, obj):
         return obj.real_name if self.show_real_name else None
 
+    def problems_status(self, obj):
+        # 풀이 상태는 UserProblemStatus 에서 읽고, 아직 옮기지 않은 사용자는 JSON 기록을 그대로 보여준다
+        if obj.user_id not in self._problems_status:
+            acm, oi = UserProblemStatus.profile_status(obj.user_id)
+            if not any(acm.values()) and not any(oi.values()):
+                acm, oi = obj.acm_problems_status, obj.oi_problems_status
+            self._problems_status[obj.user_id] = (acm, oi)
+        return self._problems_status[obj.user_id]
+
+    def get_acm_problems_status(self, obj):
+        return self.problems_status(obj)[0]
+
+    def get_oi_problems_status(self, obj):
+        return self.problems_status(obj)[1]
+
 
 class EditUserSerializer(serializers.Serializer):
     id = serializers.IntegerField()
@@ -186,8 +227,6 @@ class RankInfoSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 class RankInfopointSerializer(serializers.ModelSerializer):
-    user = UserSerializer()
-
     class Meta:
         model = User
-        fields = "__all__"
+        fields = ["id", "username", "rank_point", "rank_tear"]
@@ -12,6 +12,7 @@ from utils.api.tests import APIClient, APITestCase
 from utils.shortcuts import rand_str
 from options.options import SysOptions
 
+from .leaderboard import Leaderboard, rank_tear, update_leaderboards
 from .models import AdminType, ProblemPermission, User
 from utils.constants import ContestRuleType
 
@@ -444,6 +445,8 @@ class UserChangePasswordAPITest(APITestCase):
 
 class UserRankAPITest(APITestCase):
     def setUp(self):
+        for leaderboard in Leaderboard.all():
+            leaderboard.invalidate()
         self.url = self.reverse("user_rank_api")
         self.create_user("test1", "test123", login=False)
         self.create_user("test2", "test123", login=False)
@@ -485,11 +488,49 @@ class UserRankAPITest(APITestCase):
         profile1.save()
         resp = self.client.get(self.url, data={"rule": ContestRuleType.ACM})
         self.assertSuccess(resp)
-        self.assertEqual(len(resp.data["data"]), 2)
+        self.assertEqual(len(resp.data["data"]["results"]), 2)
 
         resp = self.client.get(self.url, data={"rule": ContestRuleType.OI})
         self.assertSuccess(resp)
-        self.assertEqual(len(resp.data["data"]), 2)
+        self.assertEqual(len(resp.data["data"]["results"]), 2)
+
+    def tearDown(self):
+        for leaderboard in Leaderboard.all():
+            leaderboard.invalidate()
+
+
+class LeaderboardTest(APITestCase):
+    def setUp(self):
+        self.leaderboard = Leaderboard(ContestRuleType.ACM)
+        self.leaderboard.invalidate()
+        self.users = [self.create_user(f"user{i}", "test123", login=False) for i in range(3)]
+        for user, (accepted_number, submission_number) in zip(self.users, [(1, 1), (2, 5), (2, 3)]):
+            user.userprofile.accepted_number = accepted_number
+            user.userprofile.submission_number = submission_number
+            user.userprofile.save()
+
+    def tearDown(self):
+        self.leaderboard.invalidate()
+
+    def test_rank_order(self):
+        self.assertEqual([profile.user_id for profile in self.leaderboard[0:3]],
+                         [self.users[2].id, self.users[1].id, self.users[0].id])
+        self.assertEqual(self.leaderboard.count(), 3)
+        self.assertEqual(self.leaderboard.rank_of(self.users[1].id), 2)
+
+    def test_incremental_update(self):
+        self.leaderboard.ensure_built()
+        update_leaderboards(self.users[0].id, submission_number=1, accepted_number=2)
+        self.assertEqual(self.leaderboard.rank_of(self.users[0].id), 1)
+
+    def test_reconcile(self):
+        self.leaderboard.ensure_built()
+        update_leaderboards(self.users[0].id, accepted_number=5)
+        self.assertEqual(self.leaderboard.reconcile(), 1)
+        self.assertEqual(self.leaderboard.rank_of(self.users[0].id), 3)
+
+    def test_rank_tear(self):
+        self.assertEqual([rank_tear(point) for point in (0, 5, 39, 40, 250)], ["코생아", "코린이", "개발자", "전문가", "코딩신"])
 
 
 class ProfileProblemDisplayIDRefreshAPITest(APITestCase):
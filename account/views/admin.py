@@ -8,7 +8,7 @@ from django.http import HttpResponse
 from django.contrib.auth.hashers import make_password
 
 from contest.models import Contest, OIContestRank
-from lecture.views.LectureAnalysis import LectureAnalysis, DataType, ContestType, lecDispatcher
+from lecture.views.LectureAnalysis import LectureAnalysis
 from lecture.views.LectureBuilder import LectureBuilder
 from submission.models import Submission
 from utils.api import APIView, validate_serializer
@@ -21,9 +21,10 @@ from lecture.models import ta_admin_class
 from ..models import AdminType, ProblemPermission, User, UserProfile
 from ..serializers import EditUserSerializer, UserAdminSerializer, GenerateUserSerializer, UserSerializer, \
     SimpleSignupSerializer, ContestSignupSerializer
-from ..serializers import ImportUserSeralizer, SignupSerializer
+from ..serializers import ImportUserSeralizer, SignupSummarySerializer
 from django.db.models import Max
 from lecture.views.stdResult import RefLecture, SubmitLecture
+from lecture.views.LectureSummary import annotateSummary
 
 class PublicContInfoAPI(APIView):
     def get(self, request):
@@ -195,58 +196,9 @@ class UserAdminAPI(APIView):
                 except signup_class.DoesNotExist:
                     return self.error("수강중인 학생이 없습니다.")
 
-                #lb = LectureBuilder()
-                #lb.buildLecture(ulist[0].lecture)
-                #collect lecture info
-                plist = Problem.objects.filter(contest__lecture=lecture_id).prefetch_related('contest')
-
-                #test
-                LectureInfo = lecDispatcher()
-
-                cnt = 0
-                for us in ulist:
-                    #inlit result values
-                    us.totalPractice = 0
-                    us.subPractice = 0
-                    us.solvePractice = 0
-
-                    us.totalAssign = 0
-                    us.subAssign = 0
-                    us.solveAssign = 0
-
-                    us.tryProblem = 0
-                    us.solveProblem = 0
-                    us.totalScore = 0
-                    us.avgScore = 0
-                    us.progress = 0
-                    us.totalProblem = 0
-                    us.maxScore = 0
-                    us.lecDict = dict()
-
-                    if us.user is not None and us.isallow is True:
-                        #print(us.user.id,us.user.realname)
-                        #print(us.score)
-                        #get data from db
-                        LectureInfo.fromDict(us.score)
-                        us.totalPractice = LectureInfo.contAnalysis[ContestType.PRACTICE].Info.data[DataType.NUMOFCONTENTS]
-                        us.subPractice = LectureInfo.contAnalysis[ContestType.PRACTICE].Info.data[DataType.NUMOFSUBCONTENTS]
-                        us.solvePractice = LectureInfo.contAnalysis[ContestType.PRACTICE].Info.data[DataType.NUMOFSOLVEDCONTENTS]
-
-                        us.totalAssign = LectureInfo.contAnalysis[ContestType.ASSIGN].Info.data[DataType.NUMOFCONTENTS]
-                        us.subAssign = LectureInfo.contAnalysis[ContestType.ASSIGN].Info.data[DataType.NUMOFSUBCONTENTS]
-                        us.solveAssign = LectureInfo.contAnalysis[ContestType.ASSIGN].Info.data[DataType.NUMOFSOLVEDCONTENTS]
-
-                        us.tryProblem = LectureInfo.Info.data[DataType.NUMOFTOTALSUBPROBLEMS]
-                        us.solveProblem = LectureInfo.Info.data[DataType.NUMOFTOTALSOLVEDPROBLEMS]
-                        us.totalScore = LectureInfo.Info.data[DataType.SCORE]
-                        us.avgScore = LectureInfo.Info.data[DataType.AVERAGE]
-                        us.progress = LectureInfo.Info.data[DataType.PROGRESS]
-
-                    us.totalProblem = LectureInfo.Info.data[DataType.NUMOFTOTALPROBLEMS]
-                    us.maxScore = LectureInfo.Info.data[DataType.POINT]
-                    cnt += 1
-
-                return self.success(self.paginate_data(request, ulist, SignupSerializer))
+                # 학생별 통계는 score 를 다시 읽지 않고 LectureScoreSummary 를 JOIN 해서 가져온다
+                ulist = annotateSummary(ulist.select_related("user"), order_by=request.GET.get("order_by"))
+                return self.success(self.paginate_data(request, ulist, SignupSummarySerializer))
             return self.success()
 
         """
@@ -21,19 +21,20 @@ from utils.api import APIView, validate_serializer, CSRFExemptAPIView
 from utils.captcha import Captcha
 from utils.shortcuts import rand_str, img2base64, datetime2str
 from ..decorators import login_required
-from ..models import User, UserProfile, AdminType
-from submission.models import Submission
+from ..leaderboard import Leaderboard, rank_tear
+from ..models import User, UserProfile
 from ..serializers import (ApplyResetPasswordSerializer, ResetPasswordSerializer,
                            UserChangePasswordSerializer, UserLoginSerializer,
                            UserRegisterSerializer, UsernameOrEmailCheckSerializer,
-                           RankInfoSerializer, RankInfopointSerializer, UserChangeEmailSerializer, SSOSerializer, SignupSerializer, MainSignupSerializer)
+                           RankInfoSerializer, RankInfopointSerializer, UserChangeEmailSerializer, SSOSerializer, SignupSerializer,
+                           MainSignupSummarySerializer)
 from ..serializers import (TwoFactorAuthCodeSerializer, UserProfileSerializer,
                            EditUserProfileSerializer, ImageUploadForm)
 from ..tasks import send_email_async
 
-from lecture.models import signup_class, Lecture
-from django.db.models import Count
-from lecture.views.LectureAnalysis import LectureAnalysis, DataType, ContestType, lecDispatcher
+from lecture.models import signup_class, Lecture, ContestScoreSummary
+from lecture.views.LectureSummary import annotateSummary
+from lecture.views.LectureAnalysis import LectureAnalysis
 
 class UserProfileAPI(APIView):
     @method_decorator(ensure_csrf_cookie)
@@ -96,76 +97,28 @@ class UserProgress(APIView):
         except signup_class.DoesNotExist:
             return self.error("수강중인 학생이 없습니다.")
 
+        # 강의별 통계는 LectureScoreSummary, 진행 중인 contest 의 남은 문제 수는 ContestScoreSummary 에서 가져온다
+        lectures = annotateSummary(lectures)
         for lec in lectures:
-            #print(lec.lecture.title)
-            #collect lecture info
-            plist = Problem.objects.filter(contest__lecture=lec.lecture_id).prefetch_related('contest')
-
-            #test
-            LectureInfo = lecDispatcher()
-            # for p in plist:
-            #     # print(p.id,p.title,p.visible)
-            #     LectureInfo.migrateProblem(p)
-            #
-            # LectureInfo.cleanDataForScorebard()
-            LectureInfo.fromDict(lec.score)
-
-            #inlit result values
-            lec.totalPractice = 0
-            lec.subPractice = 0
-            lec.solvePractice = 0
-
-            lec.totalAssign = 0
-            lec.subAssign = 0
-            lec.solveAssign = 0
-
-            lec.tryProblem = 0
-            lec.solveProblem = 0
-            lec.totalScore = 0
-            lec.avgScore = 0
-            lec.progress = 0
-            lec.totalProblem = 0
-            lec.maxScore = 0
-            lec.lecDict = dict()
-
-            lec.totalPractice = LectureInfo.contAnalysis[ContestType.PRACTICE].Info.data[DataType.NUMOFCONTENTS]
-            lec.subPractice = LectureInfo.contAnalysis[ContestType.PRACTICE].Info.data[DataType.NUMOFSUBCONTENTS]
-            lec.solvePractice = LectureInfo.contAnalysis[ContestType.PRACTICE].Info.data[DataType.NUMOFSOLVEDCONTENTS]
-
-            lec.totalAssign = LectureInfo.contAnalysis[ContestType.ASSIGN].Info.data[DataType.NUMOFCONTENTS]
-            lec.subAssign = LectureInfo.contAnalysis[ContestType.ASSIGN].Info.data[DataType.NUMOFSUBCONTENTS]
-            lec.solveAssign = LectureInfo.contAnalysis[ContestType.ASSIGN].Info.data[DataType.NUMOFSOLVEDCONTENTS]
-
-            lec.tryProblem = LectureInfo.Info.data[DataType.NUMOFTOTALSUBPROBLEMS]
-            lec.solveProblem = LectureInfo.Info.data[DataType.NUMOFTOTALSOLVEDPROBLEMS]
-            lec.totalScore = LectureInfo.Info.data[DataType.SCORE]
-            lec.avgScore = LectureInfo.Info.data[DataType.AVERAGE]
-            lec.progress = LectureInfo.Info.data[DataType.PROGRESS]
-
-            lec.totalProblem = LectureInfo.Info.data[DataType.NUMOFTOTALPROBLEMS]
-            lec.maxScore = LectureInfo.Info.data[DataType.POINT]
-
-            try:
-                contestlist = Contest.objects.filter(lecture=lec.lecture.id, start_time__lte=now(), end_time__gte=now()).order_by('end_time')
-            except:
-                print("contest no exists")
+            contestlist = Contest.objects.filter(lecture=lec.lecture_id, start_time__lte=now(), end_time__gte=now()).order_by('end_time')
+            remains = {cid: total - solved for cid, total, solved in
+                       ContestScoreSummary.objects.filter(signup=lec, contest__in=contestlist)
+                       .values_list("contest_id", "total_problem", "solve_problem")}
 
             lec.contestlist = dict()
 
             for idx, contest in enumerate(contestlist):
+                if remains.get(contest.id, 0) == 0:
+                    continue
                 condict = dict()
                 condict['id'] = contest.id
                 condict['end_time'] = str(contest.end_time)
                 condict['title'] = contest.title
                 condict['description'] = contest.description
-                total = LectureInfo.contAnalysis[contest.lecture_contest_type].contests[contest.id].Info.data[DataType.NUMOFCONTENTS]
-                solved = LectureInfo.contAnalysis[contest.lecture_contest_type].contests[contest.id].Info.data[DataType.NUMOFSOLVEDCONTENTS]
-                condict['remainproblem'] = total - solved
-                print("테스트 출력",condict['remainproblem'])
-                if condict['remainproblem'] != 0:
-                    lec.contestlist[idx] = condict
+                condict['remainproblem'] = remains[contest.id]
+                lec.contestlist[idx] = condict
 
-        return self.success(self.paginate_data(request, lectures, MainSignupSerializer))
+        return self.success(self.paginate_data(request, lectures, MainSignupSummarySerializer))
 
 class AvatarUploadAPI(APIView):
     request_parsers = ()
@@ -549,49 +502,33 @@ class SessionManagementAPI(APIView):
 
 class UserRankpointAPI(APIView):
     def get(self, request):
-        rule_type = request.GET.get("rule")
-        if rule_type not in ContestRuleType.choices():
-            rule_type = ContestRuleType.ACM
-        rankpoint = User.objects.filter(admin_type=AdminType.REGULAR_USER, is_disabled__gt=False) \
-            .select_related("user")
-        if rule_type == ContestRuleType.ACM:
-            rankpoint = rankpoint.filter(problem_permission__gt=None).order_by("rank_point", "rank_tear")
-
-        return self.success(self.paginate_data(request, rankpoint, RankInfopointSerializer))
+        leaderboard = Leaderboard(ContestRuleType.POINT)
+        data = self.paginate_data(request, leaderboard, RankInfopointSerializer)
+        data["my_rank"] = leaderboard.rank_of(request.user.id) if request.user.is_authenticated else None
+        return self.success(data)
 
 class UserRankAPI(APIView):
     def get(self, request):
         rule_type = request.GET.get("rule")
         if rule_type not in ContestRuleType.choices():
             rule_type = ContestRuleType.ACM
-        profiles = UserProfile.objects.filter(user__admin_type=AdminType.REGULAR_USER, user__is_disabled=False) \
-            .select_related("user")
-        if rule_type == ContestRuleType.ACM:
-            profiles = profiles.filter(submission_number__gt=0).order_by("-accepted_number", "submission_number")
-        else:
-            profiles = profiles.filter(total_score__gt=0).order_by("-total_score")
-        return self.success(self.paginate_data(request, profiles, RankInfoSerializer))
+        # rank point 순위는 UserRankpointAPI 에서 보여준다
+        if rule_type == ContestRuleType.POINT:
+            rule_type = ContestRuleType.OI
+        leaderboard = Leaderboard(rule_type)
+        data = self.paginate_data(request, leaderboard, RankInfoSerializer)
+        data["my_rank"] = leaderboard.rank_of(request.user.id) if request.user.is_authenticated else None
+        return self.success(data)
 
 class ProfileRankpointAPI(APIView):
+    @login_required
     def get(self, request):
-        user = User.objects.get(id=request.user.id)
-        filtered_submissions = Submission.objects.filter(username=user.username, result=0).values('problem_id').annotate(count=Count('problem_id')).filter(count=1)
-        count = len(filtered_submissions)
-        user.rank_point = count
-        if count < 5:
-            user.rank_tear = "코생아"
-        elif count < 15:
-            user.rank_tear = "코린이"
-        elif count < 40:
-            user.rank_tear = "개발자"
-        elif count < 70:
-            user.rank_tear = "전문가"
-        elif count < 100:
-            user.rank_tear = "코딩왕"
-        elif count < 200:
-            user.rank_tear = "코딩신"
-        user.save()
-        return self.success(count)
+        # rank point 는 채점할 때 처음 AC 를 받으면 올린다
+        user = request.user
+        tear = rank_tear(user.rank_point)
+        if user.rank_tear != tear:
+            User.objects.filter(id=user.id).update(rank_tear=tear)
+        return self.success(user.rank_point)
 
 class ProfileRanktearAPI(APIView):
     def get(self, request):
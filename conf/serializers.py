@@ -1,3 +1,5 @@
+from judge.client import JudgeServerClient
+from judge.scheduler import get_scheduler
 from utils.api import serializers
 
 from .models import JudgeServer
@@ -30,6 +32,14 @@ class CreateEditWebsiteConfigSerializer(serializers.Serializer):
 
 class JudgeServerSerializer(serializers.ModelSerializer):
     status = serializers.CharField()
+    task_number = serializers.SerializerMethodField()
+    latency = serializers.SerializerMethodField()
+
+    def get_task_number(self, obj):
+        return get_scheduler().load(obj)
+
+    def get_latency(self, obj):
+        return JudgeServerClient.latency_histogram(obj)
 
     class Meta:
         model = JudgeServer
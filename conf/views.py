@@ -17,8 +17,10 @@ from account.decorators import super_admin_required
 from account.models import User
 from contest.models import Contest
 from judge.dispatcher import process_pending_task
+from judge.queue import JudgeQueue
 from options.options import SysOptions
 from problem.models import Problem
+from problem.test_case_store import TestCaseStore
 from submission.models import Submission
 from utils.api import APIView, CSRFExemptAPIView, validate_serializer
 from utils.shortcuts import send_email, get_env
@@ -189,21 +191,27 @@ class TestCasePruneAPI(APIView):
         test_case_id = request.GET.get("id")
         if test_case_id:
             self.delete_one(test_case_id)
-            return self.success()
-        for id in self.get_orphan_ids():
-            self.delete_one(id)
+        else:
+            for id in self.get_orphan_ids():
+                self.delete_one(id)
+        # 지운 디렉터리만 참조하던 blob 을 정리한다
+        TestCaseStore().prune()
         return self.success()
 
-    @staticmethod
-    def get_orphan_ids():
+    test_case_re = re.compile(r"^[a-zA-Z0-9]{32}$")
+
+    @classmethod
+    def get_orphan_ids(cls):
         db_ids = Problem.objects.all().values_list("test_case_id", flat=True)
         disk_ids = os.listdir(settings.TEST_CASE_DIR)
-        test_case_re = re.compile(r"^[a-zA-Z0-9]{32}$")
-        disk_ids = filter(lambda f: test_case_re.match(f), disk_ids)
+        disk_ids = filter(lambda f: cls.test_case_re.match(f), disk_ids)
         return list(set(disk_ids) - set(db_ids))
 
-    @staticmethod
-    def delete_one(id):
+    @classmethod
+    def delete_one(cls, id):
+        # .blobs 등 test case 디렉터리가 아닌 것은 지우지 않는다
+        if not cls.test_case_re.match(id):
+            return
         test_case_dir = os.path.join(settings.TEST_CASE_DIR, id)
         if os.path.isdir(test_case_dir):
             shutil.rmtree(test_case_dir, ignore_errors=True)
@@ -235,6 +243,7 @@ class DashboardInfoAPI(APIView):
             "recent_contest_count": recent_contest_count,
             "today_submission_count": today_submission_count,
             "judge_server_count": judge_server_count,
+            "judge_queue": JudgeQueue.metrics(),
             "env": {
                 "FORCE_HTTPS": get_env("FORCE_HTTPS", default=False),
                 "STATIC_CDN_HOST": get_env("STATIC_CDN_HOST", default="")
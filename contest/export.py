@@ -0,0 +1,240 @@
+import csv
+import hashlib
+import os
+import re
+import tempfile
+import time
+import zipfile
+
+import xlsxwriter
+from django.conf import settings
+from django.db.models import Count, Max
+
+from account.models import AdminType
+from submission.models import JudgeStatus, Submission
+from utils.cache import cache
+from utils.constants import CacheKey, ContestRuleType
+from utils.shortcuts import rand_str
+
+CSV_BOM = "\ufeff"
+
+
+class _Echo:
+    """
+    csv.writer 가 쓴 한 줄을 그대로 돌려주는 file-like object, StreamingHttpResponse 에 사용한다
+    """
+    def write(self, value):
+        return value
+
+
+class _ZipStream:
+    """
+    zipfile 이 쓴 bytes 를 모아 두었다가 pop 으로 꺼내는 file-like object
+    tell/seek 이 없으므로 zipfile 은 파일마다 data descriptor 를 붙여 앞으로만 쓴다
+    """
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class ContestRankExporter:
+    """
+    순위를 한 줄씩 읽어서 xlsx(constant_memory) 또는 csv 로 내보낸다
+    :param ranks: ACMContestRank/OIContestRank 의 iterable (server-side cursor 로 읽는 QuerySet.iterator() 등)
+    :param problems: [(problem.id, problem.title), ...], 열 순서대로
+    """
+    def __init__(self, contest, ranks, problems, is_contest_admin=False):
+        self.contest = contest
+        self.ranks = ranks
+        self.problems = problems
+        self.is_contest_admin = is_contest_admin
+        self.is_acm = contest.rule_type == ContestRuleType.ACM
+        self.fixed_columns = 6 if self.is_acm else 4
+        # submission_info 의 key(str problem id) -> 열 번호
+        self.columns = {str(problem_id): self.fixed_columns + index for index, (problem_id, _) in enumerate(problems)}
+
+    def header(self):
+        if self.is_acm:
+            header = ["User ID", "Username", "Real Name", "AC", "Total Submission", "Total Time"]
+        else:
+            header = ["User ID", "Username", "Real Name", "Total Score"]
+        return header + [title for _, title in self.problems]
+
+    def rows(self):
+        for rank in self.ranks:
+            user = rank.user
+            real_name = (user.userprofile.real_name or "") if self.is_contest_admin else ""
+            row = [str(user.id), user.username, real_name]
+            if self.is_acm:
+                row += [str(rank.accepted_number), str(rank.submission_number), str(rank.total_time)]
+            else:
+                row.append(str(rank.total_score))
+            row += [""] * len(self.problems)
+            for problem_id, info in rank.submission_info.items():
+                column = self.columns.get(problem_id)
+                # 숨겨진 문제의 제출 기록은 내보내지 않는다
+                if column is None:
+                    continue
+                row[column] = str(info["is_ac"]) if self.is_acm else str(info)
+            yield row
+
+    def write_xlsx(self, file):
+        """
+        constant_memory 모드에서는 한 줄을 쓰면 바로 임시 파일로 내려가므로, 행 수와 관계없이 메모리 사용량이 일정하다
+        """
+        workbook = xlsxwriter.Workbook(file, {"constant_memory": True})
+        worksheet = workbook.add_worksheet()
+        worksheet.write_row(0, 0, self.header())
+        for index, row in enumerate(self.rows()):
+            for column, value in enumerate(row):
+                worksheet.write_string(index + 1, column, value)
+        workbook.close()
+
+    def xlsx_file(self):
+        """
+        :return: 처음 위치로 돌아간 임시 파일, 닫으면 삭제된다
+        """
+        file = tempfile.TemporaryFile()
+        self.write_xlsx(file)
+        file.seek(0)
+        return file
+
+    def stream_csv(self):
+        writer = csv.writer(_Echo())
+        yield CSV_BOM + writer.writerow(self.header())
+        for row in self.rows():
+            yield writer.writerow(row)
+
+
+class ExportStatus:
+    QUEUED = "queued"
+    RUNNING = "running"
+    FINISHED = "finished"
+    FAILED = "failed"
+
+
+class ContestSubmissionExporter:
+    """
+    사용자, 문제마다 가장 최근의 AC 제출 코드를 zip 으로 내보낸다
+     - 한 번의 DISTINCT ON 쿼리를 server-side cursor 로 읽으므로 참가자 수와 관계없이 쿼리는 하나다
+     - stream 은 zip 을 파일에 쓰지 않고 만드는 대로 응답으로 보낸다
+     - 제출이 많은 대회는 worker 에서 EXPORT_DIR 에 zip 을 만들고 job_id 로 내려받는다 (start/run)
+    """
+    job_id_re = re.compile(r"^(\d+)-([01])-([0-9a-f]{16})$")
+    progress_ttl = 24 * 60 * 60
+    job_timeout = 60 * 60
+
+    def __init__(self, contest, exclude_admin=True):
+        self.contest = contest
+        self.exclude_admin = exclude_admin
+
+    def submissions(self):
+        submissions = Submission.objects.filter(contest=self.contest, result=JudgeStatus.ACCEPTED)
+        if self.exclude_admin:
+            submissions = submissions.exclude(user__admin_type__in=[AdminType.ADMIN, AdminType.SUPER_ADMIN,
+                                                                    AdminType.TA_ADMIN])
+        return submissions
+
+    def entries(self):
+        rows = (self.submissions().order_by("user_id", "problem_id", "-create_time")
+                .distinct("user_id", "problem_id").values_list("user__username", "problem___id", "code"))
+        for username, display_id, code in rows.iterator(chunk_size=500):
+            yield f"{username}_{display_id}.txt", code
+
+    def stream(self):
+        buffer = _ZipStream()
+        with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as zip_file:
+            for name, code in self.entries():
+                zip_file.writestr(name, code)
+                yield buffer.pop()
+        yield buffer.pop()
+
+    def is_large(self):
+        return self.submissions().count() > settings.CONTEST_EXPORT_STREAM_LIMIT
+
+    @property
+    def job_id(self):
+        # 새 AC 제출이 없으면 같은 job_id 가 되어 이전에 만든 zip 을 그대로 쓴다
+        watermark = self.submissions().aggregate(count=Count("id"), last=Max("create_time"))
+        last = watermark["last"].isoformat() if watermark["last"] else ""
+        digest = hashlib.sha256(f"{watermark['count']}:{last}".encode()).hexdigest()[:16]
+        return f"{self.contest.id}-{int(self.exclude_admin)}-{digest}"
+
+    @staticmethod
+    def progressKey(job_id):
+        return f"{CacheKey.contest_submission_export}:{job_id}"
+
+    @staticmethod
+    def exportPath(job_id):
+        return os.path.join(settings.CONTEST_EXPORT_DIR, f"{job_id}.zip")
+
+    @classmethod
+    def progress(cls, job_id):
+        data = {k.decode("utf-8"): v.decode("utf-8") for k, v in cache.hgetall(cls.progressKey(job_id)).items()}
+        if "done" in data:
+            data["done"] = int(data["done"])
+        if os.path.exists(cls.exportPath(job_id)):
+            data["status"] = ExportStatus.FINISHED
+        data["job_id"] = job_id
+        return data
+
+    @classmethod
+    def setProgress(cls, job_id, **kwargs):
+        key = cls.progressKey(job_id)
+        pipe = cache.pipeline()
+        pipe.hmset(key, dict(kwargs, updated_at=time.time()))
+        pipe.expire(key, cls.progress_ttl)
+        pipe.execute()
+
+    def start(self):
+        """
+        :return: job_id, 이미 만들었거나 만드는 중이면 다시 보내지 않는다
+        """
+        from contest.tasks import export_contest_submissions_task
+        job_id = self.job_id
+        data = self.progress(job_id)
+        if data.get("status") == ExportStatus.FINISHED:
+            return job_id
+        # 진행 상황이 오래 바뀌지 않은 작업은 worker 가 죽은 것으로 보고 다시 보낸다
+        pending = (data.get("status") in (ExportStatus.QUEUED, ExportStatus.RUNNING) and
+                   time.time() - float(data.get("updated_at", 0)) < self.job_timeout)
+        if not pending:
+            self.setProgress(job_id, status=ExportStatus.QUEUED, done=0, error="")
+            export_contest_submissions_task.send(self.contest.id, self.exclude_admin, job_id)
+        return job_id
+
+    def run(self, job_id):
+        os.makedirs(settings.CONTEST_EXPORT_DIR, exist_ok=True)
+        path = self.exportPath(job_id)
+        temp = f"{path}.{rand_str(8)}.tmp"
+        try:
+            self.setProgress(job_id, status=ExportStatus.RUNNING, done=0)
+            with zipfile.ZipFile(temp, "w", compression=zipfile.ZIP_DEFLATED) as zip_file:
+                for done, (name, code) in enumerate(self.entries(), 1):
+                    zip_file.writestr(name, code)
+                    if done % 1000 == 0:
+                        self.setProgress(job_id, done=done)
+            os.replace(temp, path)
+            # 같은 대회의 이전 zip 은 새 제출이 반영되지 않았으므로 지운다
+            prefix = job_id.rsplit("-", 1)[0] + "-"
+            for entry in os.scandir(settings.CONTEST_EXPORT_DIR):
+                if entry.name.startswith(prefix) and entry.name.endswith(".zip") and entry.path != path:
+                    os.remove(entry.path)
+            self.setProgress(job_id, status=ExportStatus.FINISHED)
+        except Exception as e:
+            self.setProgress(job_id, status=ExportStatus.FAILED, error=str(e))
+            raise
+        finally:
+            if os.path.exists(temp):
+                os.remove(temp)
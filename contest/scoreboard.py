@@ -0,0 +1,149 @@
+from account.models import AdminType
+from utils.cache import cache
+from utils.constants import CacheKey, ContestRuleType
+from .models import ACMContestRank, OIContestRank
+
+# ACM 순위는 accepted_number 내림차순, total_time 오름차순이므로 하나의 score 로 합친다
+ACM_SCORE_STEP = 10 ** 10
+REBUILD_CHUNK_SIZE = 1000
+
+
+class ContestScoreboard:
+    """
+    대회 순위를 Redis sorted set (member: user_id) 으로 유지한다.
+    채점이 끝날 때마다 해당 사용자의 score 만 갱신하고, 순위 조회와 page 조회는 O(log n) 이다.
+    APIView.paginate_data 에 그대로 넘길 수 있도록 slice 와 count() 를 지원한다.
+
+    실시간 순위를 보여주지 않는 ACM 대회는 이전처럼 처음 만들 때의 순위 목록 전체를 그대로 저장해 둔다(frozen).
+    """
+    def __init__(self, contest):
+        self.contest = contest
+        self.key = f"{CacheKey.contest_scoreboard}:{contest.id}"
+        self.built_key = f"{CacheKey.contest_scoreboard_built}:{contest.id}"
+        self.snapshot_key = f"{CacheKey.contest_rank_cache}:{contest.id}"
+        self.frozen = contest.rule_type == ContestRuleType.ACM and not contest.real_time_rank
+        self._snapshot = None
+
+    @property
+    def model(self):
+        return ACMContestRank if self.contest.rule_type == ContestRuleType.ACM else OIContestRank
+
+    def rank_queryset(self):
+        qs = self.model.objects.filter(contest=self.contest, user__admin_type=AdminType.REGULAR_USER,
+                                       user__is_disabled=False).select_related("user")
+        if self.contest.rule_type == ContestRuleType.ACM:
+            return qs.order_by("-accepted_number", "total_time")
+        return qs.order_by("-total_score")
+
+    def iter_ranks(self, live=False, chunk_size=2000):
+        """
+        전체 순위를 순서대로 읽는다, DB 에서 읽을 때는 server-side cursor 로 chunk 단위로 가져온다
+        :param live: frozen 이어도 DB 의 현재 순위를 읽는다
+        """
+        if self.frozen and not live:
+            self.ensure_built()
+            return iter(self._snapshot)
+        return self.rank_queryset().select_related("user__userprofile").iterator(chunk_size=chunk_size)
+
+    @property
+    def score_fields(self):
+        if self.contest.rule_type == ContestRuleType.ACM:
+            return "accepted_number", "total_time"
+        return "total_score",
+
+    def _score(self, *values):
+        if self.contest.rule_type == ContestRuleType.ACM:
+            accepted_number, total_time = values
+            return accepted_number * ACM_SCORE_STEP - total_time
+        return values[0]
+
+    def score(self, rank):
+        return self._score(*(getattr(rank, field) for field in self.score_fields))
+
+    def is_built(self):
+        if self.frozen:
+            return self._get_snapshot() is not None
+        return bool(cache.exists(self.built_key))
+
+    def _get_snapshot(self):
+        if self._snapshot is None:
+            self._snapshot = cache.get(self.snapshot_key)
+        return self._snapshot
+
+    def rebuild(self):
+        if self.frozen:
+            self._snapshot = list(self.rank_queryset())
+            cache.set(self.snapshot_key, self._snapshot)
+            return
+
+        tmp_key = f"{self.key}:rebuild"
+        cache.delete(tmp_key)
+        mapping = {}
+        for user_id, *values in self.rank_queryset().values_list("user_id", *self.score_fields).iterator():
+            mapping[user_id] = self._score(*values)
+            if len(mapping) >= REBUILD_CHUNK_SIZE:
+                cache.zadd(tmp_key, mapping)
+                mapping = {}
+        if mapping:
+            cache.zadd(tmp_key, mapping)
+
+        pipe = cache.pipeline()
+        if cache.exists(tmp_key):
+            pipe.rename(tmp_key, self.key)
+        else:
+            pipe.delete(self.key)
+        pipe.set(self.built_key, 1)
+        pipe.execute()
+
+    def ensure_built(self):
+        if not self.is_built():
+            self.rebuild()
+
+    def invalidate(self):
+        cache.delete_many([self.key, self.built_key, self.snapshot_key])
+        self._snapshot = None
+
+    def update(self, rank):
+        """
+        아직 만들어지지 않은 scoreboard 는 다음 조회 때 DB 에서 만들어지므로 건너뛴다
+        """
+        if self.frozen or not self.is_built():
+            return
+        user = rank.user
+        if user.admin_type != AdminType.REGULAR_USER or user.is_disabled:
+            return
+        cache.zadd(self.key, {rank.user_id: self.score(rank)})
+
+    def rank_of(self, user_id):
+        """
+        :return: 1 부터 시작하는 순위, 순위표에 없으면 None
+        """
+        self.ensure_built()
+        if self.frozen:
+            return next((index + 1 for index, rank in enumerate(self._snapshot) if rank.user_id == user_id), None)
+        rank = cache.zrevrank(self.key, user_id)
+        return None if rank is None else rank + 1
+
+    def count(self):
+        self.ensure_built()
+        if self.frozen:
+            return len(self._snapshot)
+        return cache.zcard(self.key)
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            raise TypeError("ContestScoreboard only supports slicing")
+        self.ensure_built()
+        start = item.start or 0
+        stop = item.stop if item.stop is not None else 0
+        if stop <= start:
+            return []
+        if self.frozen:
+            return self._snapshot[start:stop]
+        user_ids = [int(uid) for uid in cache.zrevrange(self.key, start, stop - 1)]
+        ranks = {rank.user_id: rank for rank in self.model.objects.filter(contest=self.contest, user_id__in=user_ids)
+                 .select_related("user")}
+        return [ranks[uid] for uid in user_ids if uid in ranks]
+
+    def __iter__(self):
+        return iter(self[0:self.count()])
@@ -0,0 +1,14 @@
+import dramatiq
+
+from utils.shortcuts import DRAMATIQ_WORKER_ARGS
+from .export import ContestSubmissionExporter
+from .models import Contest
+
+
+@dramatiq.actor(**DRAMATIQ_WORKER_ARGS(time_limit=3600_000, max_age=24 * 3600_000))
+def export_contest_submissions_task(contest_id, exclude_admin, job_id):
+    try:
+        contest = Contest.objects.get(id=contest_id)
+    except Contest.DoesNotExist:
+        return
+    ContestSubmissionExporter(contest, exclude_admin=exclude_admin).run(job_id)
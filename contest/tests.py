@@ -1,11 +1,19 @@
 import copy
+import io
+import os
+import tempfile
+import zipfile
 from datetime import datetime, timedelta
+from types import SimpleNamespace
 
+from django.test import TestCase, override_settings
 from django.utils import timezone
 
 from utils.api.tests import APITestCase
 
-from .models import ContestAnnouncement, ContestRuleType, Contest
+from .export import ContestRankExporter, ContestSubmissionExporter, ExportStatus
+from .models import ContestAnnouncement, ContestRuleType, Contest, ACMContestRank
+from .scoreboard import ContestScoreboard
 
 DEFAULT_CONTEST_DATA = {"title": "test title", "description": "test description",
                         "start_time": timezone.localtime(timezone.now()),
@@ -160,3 +168,92 @@ class ContestRankAPITest(APITestCase):
     def get_contest_rank(self):
         resp = self.client.get(self.url + "?contest_id=" + self.acm_contest.id)
         self.assertSuccess(resp)
+
+
+class ContestScoreboardTest(APITestCase):
+    def setUp(self):
+        admin = self.create_admin(login=False)
+        self.contest = Contest.objects.create(created_by=admin, **DEFAULT_CONTEST_DATA)
+        self.scoreboard = ContestScoreboard(self.contest)
+        self.users = [self.create_user(f"user{i}", "test123", login=False) for i in range(3)]
+        for user, (accepted_number, total_time) in zip(self.users, [(1, 100), (2, 500), (2, 300)]):
+            ACMContestRank.objects.create(user=user, contest=self.contest,
+                                          accepted_number=accepted_number, total_time=total_time)
+
+    def tearDown(self):
+        self.scoreboard.invalidate()
+
+    def test_rank_order_matches_db(self):
+        self.assertEqual([rank.user_id for rank in self.scoreboard[0:3]],
+                         [rank.user_id for rank in self.scoreboard.rank_queryset()])
+        self.assertEqual(self.scoreboard.count(), 3)
+        self.assertEqual(self.scoreboard.rank_of(self.users[2].id), 1)
+
+    def test_incremental_update(self):
+        self.scoreboard.ensure_built()
+        rank = ACMContestRank.objects.get(user=self.users[0], contest=self.contest)
+        rank.accepted_number = 3
+        rank.save()
+        self.scoreboard.update(rank)
+        self.assertEqual(self.scoreboard.rank_of(self.users[0].id), 1)
+        self.assertEqual([r.user_id for r in self.scoreboard[1:3]], [self.users[2].id, self.users[1].id])
+
+    def test_frozen_rank(self):
+        Contest.objects.filter(id=self.contest.id).update(real_time_rank=False)
+        self.contest.refresh_from_db()
+        scoreboard = ContestScoreboard(self.contest)
+        scoreboard.ensure_built()
+        ACMContestRank.objects.filter(user=self.users[0], contest=self.contest).update(accepted_number=3)
+        scoreboard = ContestScoreboard(self.contest)
+        self.assertEqual(scoreboard.rank_of(self.users[0].id), 3)
+        self.assertEqual(scoreboard[2:3][0].accepted_number, 1)
+        scoreboard.invalidate()
+
+
+class ContestRankExporterTest(TestCase):
+    def setUp(self):
+        user = SimpleNamespace(id=1, username="test", userprofile=SimpleNamespace(real_name="real"))
+        self.problems = [(10, "A"), (11, "B")]
+        self.acm_rank = SimpleNamespace(user=user, accepted_number=1, submission_number=3, total_time=60,
+                                        submission_info={"11": {"is_ac": True}, "99": {"is_ac": False}})
+
+    def test_acm_rows(self):
+        exporter = ContestRankExporter(SimpleNamespace(rule_type=ContestRuleType.ACM), [self.acm_rank], self.problems)
+        self.assertEqual(exporter.header()[-2:], ["A", "B"])
+        self.assertEqual(list(exporter.rows()), [["1", "test", "", "1", "3", "60", "", "True"]])
+
+    def test_csv_stream(self):
+        exporter = ContestRankExporter(SimpleNamespace(rule_type=ContestRuleType.ACM), [self.acm_rank], self.problems,
+                                       is_contest_admin=True)
+        content = "".join(exporter.stream_csv())
+        self.assertIn("1,test,real,1,3,60,,True", content)
+
+    def test_xlsx_file(self):
+        exporter = ContestRankExporter(SimpleNamespace(rule_type=ContestRuleType.OI),
+                                       [SimpleNamespace(user=self.acm_rank.user, total_score=30, submission_info={"10": 30})],
+                                       self.problems)
+        with exporter.xlsx_file() as f:
+            self.assertEqual(f.read(2), b"PK")
+
+
+class ContestSubmissionExporterTest(TestCase):
+    def setUp(self):
+        self.exporter = ContestSubmissionExporter(SimpleNamespace(id=1))
+        self.exporter.entries = lambda: iter([("test_A.txt", "int main() {}"), ("test_B.txt", "print(1)")])
+
+    def test_stream(self):
+        content = b"".join(self.exporter.stream())
+        with zipfile.ZipFile(io.BytesIO(content)) as f:
+            self.assertEqual(f.namelist(), ["test_A.txt", "test_B.txt"])
+            self.assertEqual(f.read("test_B.txt"), b"print(1)")
+
+    def test_run(self):
+        with tempfile.TemporaryDirectory() as root, override_settings(CONTEST_EXPORT_DIR=root):
+            old = os.path.join(root, "1-1-" + "0" * 16 + ".zip")
+            open(old, "wb").close()
+            job_id = "1-1-" + "a" * 16
+            self.exporter.run(job_id)
+            self.assertFalse(os.path.exists(old))
+            self.assertEqual(ContestSubmissionExporter.progress(job_id)["status"], ExportStatus.FINISHED)
+            with zipfile.ZipFile(ContestSubmissionExporter.exportPath(job_id)) as f:
+                self.assertEqual(len(f.namelist()), 2)
@@ -1,24 +1,20 @@
-import copy
 import os
-import zipfile
 from ipaddress import ip_network
 
 import dateutil.parser
-from django.http import FileResponse
+from django.http import StreamingHttpResponse
 from django.db.models import Count, Q
 from account.decorators import check_contest_permission, ensure_created_by
-from account.models import User
 from lecture.serializers import LectureSerializer
 from lecture.views.LectureBuilder import LectureBuilder, ContestBuilder, ProblemBuilder, UserBuilder
-from submission.models import Submission, JudgeStatus
 from utils.api import APIView, validate_serializer
-from utils.cache import cache
-from utils.constants import CacheKey
-from utils.shortcuts import rand_str
-from utils.tasks import delete_files
+from utils.shortcuts import file_response
 from problem.models import Problem
+from problem.test_case_store import TestCaseStore
 from lecture.models import Lecture, ta_admin_class
+from ..export import ContestSubmissionExporter
 from ..models import Contest, ContestAnnouncement, ACMContestRank
+from ..scoreboard import ContestScoreboard
 from ..serializers import (ContestAnnouncementSerializer, ContestAdminSerializer,
                            CreateContestSeriaizer, CreateContestAnnouncementSerializer,
                            EditContestSeriaizer, EditContestAnnouncementSerializer,
@@ -84,16 +80,15 @@ class ContestAPI(APIView):
             except ValueError:
                 return self.error(f"{ip_range} is not a valid cidr network")
         if not contest.real_time_rank and data.get("real_time_rank"):
-            cache_key = f"{CacheKey.contest_rank_cache}:{contest.id}"
-            cache.delete(cache_key)
+            ContestScoreboard(contest).invalidate()
 
         for k, v in data.items():
             setattr(contest, k, v)
 
+        contest.save()
         #contest 값 업데이트
         lb = ContestBuilder(contest)
         lb.MigrateContent()
-        contest.save()
 
         import timeit
 
@@ -361,34 +356,21 @@ class ACMContestHelper(APIView):
 
 
 class DownloadContestSubmissions(APIView):
-    def _dump_submissions(self, contest, exclude_admin=True):
-        problem_ids = contest.problem_set.all().values_list("id", "_id")
-        id2display_id = {k[0]: k[1] for k in problem_ids}
-        ac_map = {k[0]: False for k in problem_ids}
-        submissions = Submission.objects.filter(contest=contest, result=JudgeStatus.ACCEPTED).order_by("-create_time")
-        user_ids = submissions.values_list("user_id", flat=True)
-        users = User.objects.filter(id__in=user_ids)
-        path = f"/tmp/{rand_str()}.zip"
-        with zipfile.ZipFile(path, "w") as zip_file:
-            for user in users:
-                if user.is_admin_role() and exclude_admin:
-                    continue
-                user_ac_map = copy.deepcopy(ac_map)
-                user_submissions = submissions.filter(user_id=user.id)
-                for submission in user_submissions:
-                    problem_id = submission.problem_id
-                    if user_ac_map[problem_id]:
-                        continue
-                    file_name = f"{user.username}_{id2display_id[submission.problem_id]}.txt"
-                    compression = zipfile.ZIP_DEFLATED
-                    zip_file.writestr(zinfo_or_arcname=f"{file_name}",
-                                      data=submission.code,
-                                      compress_type=compression)
-                    user_ac_map[problem_id] = True
-        return path
-
+    """
+    사용자, 문제마다 가장 최근의 AC 제출 코드를 zip 으로 내려받는다
+     - 보통은 zip 을 만드는 대로 바로 응답으로 보낸다
+     - AC 제출이 CONTEST_EXPORT_STREAM_LIMIT 보다 많거나 background=1 이면 worker 에서 만들고 진행 상황을 돌려준다,
+       job_id 로 다시 요청하면 다 만든 뒤에 zip 을 내려받는다
+    """
     def get(self, request):
-        contest_id = request.GET.get("contest_id")
+        job_id = request.GET.get("job_id")
+        if job_id:
+            match = ContestSubmissionExporter.job_id_re.match(job_id)
+            if not match:
+                return self.error("Invalid job id")
+            contest_id = match.group(1)
+        else:
+            contest_id = request.GET.get("contest_id")
         if not contest_id:
             return self.error("Parameter error")
         try:
@@ -397,14 +379,21 @@ class DownloadContestSubmissions(APIView):
         except Contest.DoesNotExist:
             return self.error("Contest does not exist 6")
 
-        exclude_admin = request.GET.get("exclude_admin") == "1"
-        zip_path = self._dump_submissions(contest, exclude_admin)
-        delete_files.send_with_options(args=(zip_path,), delay=300_000)
-        resp = FileResponse(open(zip_path, "rb"))
-        resp["Content-Type"] = "application/zip"
-        resp["Content-Disposition"] = f"attachment;filename={os.path.basename(zip_path)}"
+        filename = f"contest_{contest.id}_submissions.zip"
+        if job_id:
+            path = ContestSubmissionExporter.exportPath(job_id)
+            if os.path.exists(path):
+                return file_response(request, path, filename, content_type="application/zip")
+            return self.success(ContestSubmissionExporter.progress(job_id))
+
+        exporter = ContestSubmissionExporter(contest, exclude_admin=request.GET.get("exclude_admin") == "1")
+        if request.GET.get("background") == "1" or exporter.is_large():
+            return self.success(ContestSubmissionExporter.progress(exporter.start()))
+        resp = StreamingHttpResponse(exporter.stream(), content_type="application/zip")
+        resp["Content-Disposition"] = f"attachment;filename={filename}"
         return resp
 
+
 class AddLectureAPI(APIView):
     #@validate_serializer(AddLectureContestSerializer)
     def get(self, request):
@@ -515,19 +504,8 @@ class AddLectureContestAPI(APIView):
                 problems.submission_number = problems.accepted_number = 0
                 problems.statistic_info = {}
 
-                # copy dataset create
-                while True:
-                    test_case_id = rand_str()  # create new id
-                    from django.conf import settings
-                    test_case_dir = os.path.join(settings.TEST_CASE_DIR, test_case_id)
-                    origin_test_case_dir = os.path.join(settings.TEST_CASE_DIR, problems.test_case_id)
-                    if not os.path.isdir(test_case_dir):
-                        os.mkdir(test_case_dir)
-                        import shutil
-                        shutil.copytree(origin_test_case_dir, test_case_dir)  # copy_dataset
-                        break
-
-                os.chmod(test_case_dir, 0o710)
+                # copy dataset create (hardlink 로 복사하므로 디스크를 더 쓰지 않는다)
+                test_case_id = TestCaseStore().copy(problems.test_case_id)
                 print(problems.test_case_id, test_case_id)
                 problems.test_case_id = test_case_id
                 # copy dataset done
@@ -563,19 +541,8 @@ class AddLectureContestAPI(APIView):
                 problem.submission_number = problem.accepted_number = 0
                 problem.statistic_info = {}
 
-                # copy dataset create
-                while True:
-                    test_case_id = rand_str() # create new id
-                    from django.conf import settings
-                    test_case_dir = os.path.join(settings.TEST_CASE_DIR, test_case_id)
-                    origin_test_case_dir = os.path.join(settings.TEST_CASE_DIR, problem.test_case_id)
-                    if not os.path.isdir(test_case_dir):
-                        # os.mkdir(test_case_dir)
-                        import shutil
-                        shutil.copytree(origin_test_case_dir, test_case_dir) # copy_dataset
-                        break
-
-                os.chmod(test_case_dir, 0o710)
+                # copy dataset create (hardlink 로 복사하므로 디스크를 더 쓰지 않는다)
+                test_case_id = TestCaseStore().copy(problem.test_case_id)
                 print(problem.test_case_id, test_case_id)
                 problem.test_case_id = test_case_id
                 # copy dataset done
@@ -1,21 +1,17 @@
-import io
-
-import xlsxwriter
-from django.http import HttpResponse
+from django.http import FileResponse, StreamingHttpResponse
 from django.utils.timezone import now
-from django.core.cache import cache
 
 from problem.models import Problem
 from lecture.models import Lecture, signup_class
 from utils.api import APIView, validate_serializer
-from utils.constants import CacheKey
 from utils.shortcuts import datetime2str, check_is_id
 from lecture.views.oj import LectureUtil
-from account.models import AdminType
 from account.decorators import login_required, check_contest_permission
 
 from utils.constants import ContestRuleType, ContestStatus
-from ..models import ContestAnnouncement, Contest, OIContestRank, ACMContestRank, ContestUser
+from ..export import ContestRankExporter
+from ..scoreboard import ContestScoreboard
+from ..models import ContestAnnouncement, Contest, ContestUser
 from ..serializers import ContestAnnouncementSerializer
 from ..serializers import ContestSerializer, ContestPasswordVerifySerializer
 from ..serializers import OIContestRankSerializer, ACMContestRankSerializer
@@ -210,23 +206,7 @@ class ContestExitAPI(APIView):   # working by soojung
 
 class ContestRankAPI(APIView):
     def get_rank(self):
-        if self.contest.rule_type == ContestRuleType.ACM:
-            return ACMContestRank.objects.filter(contest=self.contest,
-                                                 user__admin_type=AdminType.REGULAR_USER,
-                                                 user__is_disabled=False).\
-                select_related("user").order_by("-accepted_number", "total_time")
-        else:
-            return OIContestRank.objects.filter(contest=self.contest,
-                                                user__admin_type=AdminType.REGULAR_USER,
-                                                user__is_disabled=False). \
-                select_related("user").order_by("-total_score")
-
-    def column_string(self, n):
-        string = ""
-        while n > 0:
-            n, remainder = divmod(n - 1, 26)
-            string = chr(65 + remainder) + string
-        return string
+        return ContestScoreboard(self.contest).rank_queryset()
 
     @check_contest_permission(check_type="ranks")
 
@@ -239,61 +219,27 @@ class ContestRankAPI(APIView):
         else:
             serializer = ACMContestRankSerializer
 
+        scoreboard = ContestScoreboard(self.contest)
         if force_refresh == "1" and is_contest_admin:
-            qs = self.get_rank()
+            # 관리자는 공개된 순위표와 관계없이 DB 의 현재 순위를 본다
+            rank_source = self.get_rank()
         else:
-            cache_key = f"{CacheKey.contest_rank_cache}:{self.contest.id}"
-            qs = cache.get(cache_key)
-            if not qs:
-                qs = self.get_rank()
-                cache.set(cache_key, qs)
+            rank_source = scoreboard
 
         if download_csv:
-            data = serializer(qs, many=True, is_contest_admin=is_contest_admin).data
-            contest_problems = Problem.objects.filter(contest=self.contest, visible=True).order_by("_id")
-            problem_ids = [item.id for item in contest_problems]
-
-            f = io.BytesIO()
-            workbook = xlsxwriter.Workbook(f)
-            worksheet = workbook.add_worksheet()
-            worksheet.write("A1", "User ID")
-            worksheet.write("B1", "Username")
-            worksheet.write("C1", "Real Name")
-            if self.contest.rule_type == ContestRuleType.OI:
-                worksheet.write("D1", "Total Score")
-                for item in range(contest_problems.count()):
-                    worksheet.write(self.column_string(5 + item) + "1", f"{contest_problems[item].title}")
-                for index, item in enumerate(data):
-                    worksheet.write_string(index + 1, 0, str(item["user"]["id"]))
-                    worksheet.write_string(index + 1, 1, item["user"]["username"])
-                    worksheet.write_string(index + 1, 2, item["user"]["real_name"] or "")
-                    worksheet.write_string(index + 1, 3, str(item["total_score"]))
-                    for k, v in item["submission_info"].items():
-                        worksheet.write_string(index + 1, 4 + problem_ids.index(int(k)), str(v))
-            else:
-                worksheet.write("D1", "AC")
-                worksheet.write("E1", "Total Submission")
-                worksheet.write("F1", "Total Time")
-                for item in range(contest_problems.count()):
-                    worksheet.write(self.column_string(7 + item) + "1", f"{contest_problems[item].title}")
-
-                for index, item in enumerate(data):
-                    worksheet.write_string(index + 1, 0, str(item["user"]["id"]))
-                    worksheet.write_string(index + 1, 1, item["user"]["username"])
-                    worksheet.write_string(index + 1, 2, item["user"]["real_name"] or "")
-                    worksheet.write_string(index + 1, 3, str(item["accepted_number"]))
-                    worksheet.write_string(index + 1, 4, str(item["submission_number"]))
-                    worksheet.write_string(index + 1, 5, str(item["total_time"]))
-                    for k, v in item["submission_info"].items():
-                        worksheet.write_string(index + 1, 6 + problem_ids.index(int(k)), str(v["is_ac"]))
-
-            workbook.close()
-            f.seek(0)
-            response = HttpResponse(f.read())
+            problems = list(Problem.objects.filter(contest=self.contest, visible=True).order_by("_id").values_list("id", "title"))
+            ranks = scoreboard.iter_ranks(live=force_refresh == "1" and is_contest_admin)
+            exporter = ContestRankExporter(self.contest, ranks, problems, is_contest_admin=is_contest_admin)
+            if request.GET.get("format") == "csv":
+                response = StreamingHttpResponse(exporter.stream_csv(), content_type="text/csv; charset=utf-8")
+                response["Content-Disposition"] = f"attachment; filename=content-{self.contest.id}-rank.csv"
+                return response
+            response = FileResponse(exporter.xlsx_file(), content_type="application/xlsx")
             response["Content-Disposition"] = f"attachment; filename=content-{self.contest.id}-rank.xlsx"
-            response["Content-Type"] = "application/xlsx"
             return response
 
-        page_qs = self.paginate_data(request, qs)
+        page_qs = self.paginate_data(request, rank_source)
         page_qs["results"] = serializer(page_qs["results"], many=True, is_contest_admin=is_contest_admin).data
+        if request.user.is_authenticated:
+            page_qs["my_rank"] = scoreboard.rank_of(request.user.id)
         return self.success(page_qs)
@@ -6,32 +6,133 @@ import string
 import hashlib
 import json
 import os
+import shutil
+import tempfile
+import xml.sax
 import xml.etree.ElementTree as ET
 
+CHUNK_SIZE = 1024 * 1024
 
-class FPSParser(object):
-    def __init__(self, fps_path=None, string_data=None):
-        if fps_path:
-            self._etree = ET.parse(fps_path).getroot()
-        elif string_data:
-            self._ertree = ET.fromstring(string_data).getroot()
-        else:
-            raise ValueError("You must tell me the file path or directly give me the data for the file")
-        version = self._etree.attrib.get("version", "No Version")
-        if version not in ["1.1", "1.2"]:
-            raise ValueError("Unsupported version '" + version + "'")
 
-    @property
-    def etree(self):
-        return self._etree
+class SpooledFile(object):
+    """
+    FPSStreamParser 가 tag 의 내용을 메모리에 두지 않고 바로 쓴 임시 파일
+    """
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
 
-    def parse(self):
-        ret = []
-        for node in self._etree:
-            if node.tag == "item":
-                ret.append(self._parse_one_problem(node))
-        return ret
+    def move(self, dst):
+        shutil.move(self.path, dst)
+        self.path = dst
+
+
+class _TextSink(object):
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, text):
+        self.chunks.append(text)
+
+    def close(self):
+        return "".join(self.chunks) if self.chunks else None
+
+
+class _FileSink(object):
+    def __init__(self, spool_dir):
+        fd, self.path = tempfile.mkstemp(dir=spool_dir)
+        self.file = os.fdopen(fd, "wb")
+        self.size = 0
+
+    def write(self, text):
+        data = text.encode("utf-8")
+        self.size += len(data)
+        self.file.write(data)
+
+    def close(self):
+        self.file.close()
+        return SpooledFile(self.path, self.size)
 
+
+class _Base64Sink(_FileSink):
+    # 4 글자씩 끊어서 decode 하고 남은 글자는 다음 chunk 와 합친다
+    def __init__(self, spool_dir):
+        super().__init__(spool_dir)
+        self.rest = ""
+
+    def write(self, text):
+        data = self.rest + "".join(text.split())
+        end = len(data) // 4 * 4
+        self.rest = data[end:]
+        if end:
+            blob = base64.b64decode(data[:end])
+            self.size += len(blob)
+            self.file.write(blob)
+
+    def close(self):
+        if self.rest:
+            blob = base64.b64decode(self.rest + "=" * (-len(self.rest) % 4))
+            self.size += len(blob)
+            self.file.write(blob)
+        return super().close()
+
+
+class _FPSHandler(xml.sax.handler.ContentHandler):
+    """
+    item 하나를 다 읽을 때마다 ET.Element 로 만들어 items 에 넣는다
+    test case 와 이미지는 내용 대신 SpooledFile 을 text 로 둔다
+    """
+    file_tags = ("test_input", "test_output")
+
+    def __init__(self, spool_dir):
+        super().__init__()
+        self.spool_dir = spool_dir
+        self.items = []
+        self.depth = 0
+        self.item = None
+        self.elements = []
+        self.sink = None
+
+    def startElement(self, name, attrs):
+        self.depth += 1
+        if self.depth == 1:
+            version = attrs.get("version", "No Version")
+            if version not in ["1.1", "1.2"]:
+                raise ValueError("Unsupported version '" + version + "'")
+        elif self.depth == 2:
+            if name == "item":
+                self.item = ET.Element(name)
+        elif self.item is not None:
+            parent = self.elements[-1] if self.elements else self.item
+            self.elements.append(ET.SubElement(parent, name, dict(attrs)))
+            if name in self.file_tags:
+                self.sink = _FileSink(self.spool_dir)
+            elif name == "base64":
+                self.sink = _Base64Sink(self.spool_dir)
+            else:
+                self.sink = _TextSink()
+
+    def characters(self, content):
+        if self.sink is not None:
+            self.sink.write(content)
+
+    def endElement(self, name):
+        self.depth -= 1
+        if self.depth == 1:
+            if self.item is not None:
+                self.items.append(self.item)
+                self.item = None
+        elif self.elements:
+            element = self.elements.pop()
+            if self.sink is not None:
+                element.text = self.sink.close()
+                self.sink = None
+
+
+class _FPSProblemParser(object):
+    """
+    FPSParser 와 FPSStreamParser 가 함께 쓰는, <item> 하나를 문제 dict 로 바꾸는 부분
+    """
     def _parse_one_problem(self, node):
         sample_start = True
         test_case_start = True
@@ -81,7 +182,8 @@ class FPSParser(object):
                     if child.tag == "src":
                         problem["images"][-1]["src"] = child.text
                     elif child.tag == "base64":
-                        problem["images"][-1]["blob"] = base64.b64decode(child.text)
+                        problem["images"][-1]["blob"] = (child.text if isinstance(child.text, SpooledFile)
+                                                         else base64.b64decode(child.text))
             elif tag == "sample_input":
                 if not sample_start:
                     raise ValueError("Invalid xml, error 'sample_input' tag order")
@@ -106,6 +208,53 @@ class FPSParser(object):
         return problem
 
 
+class FPSParser(_FPSProblemParser):
+    def __init__(self, fps_path=None, string_data=None):
+        if fps_path:
+            self._etree = ET.parse(fps_path).getroot()
+        elif string_data:
+            self._ertree = ET.fromstring(string_data).getroot()
+        else:
+            raise ValueError("You must tell me the file path or directly give me the data for the file")
+        version = self._etree.attrib.get("version", "No Version")
+        if version not in ["1.1", "1.2"]:
+            raise ValueError("Unsupported version '" + version + "'")
+
+    @property
+    def etree(self):
+        return self._etree
+
+    def parse(self):
+        ret = []
+        for node in self._etree:
+            if node.tag == "item":
+                ret.append(self._parse_one_problem(node))
+        return ret
+
+
+class FPSStreamParser(_FPSProblemParser):
+    """
+    FPS 파일을 조금씩 읽으면서 문제를 하나씩 돌려준다, 파일 전체나 test case, 이미지를 메모리에 올리지 않는다
+    test case 와 이미지는 spool_dir 의 SpooledFile 로 두고, FPSHelper 가 최종 위치로 옮긴다
+    """
+    def __init__(self, fps_path, spool_dir):
+        self.fps_path = fps_path
+        self.spool_dir = spool_dir
+
+    def parse(self):
+        handler = _FPSHandler(self.spool_dir)
+        parser = xml.sax.make_parser()
+        parser.setContentHandler(handler)
+        with open(self.fps_path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                parser.feed(chunk)
+                while handler.items:
+                    yield self._parse_one_problem(handler.items.pop(0))
+            parser.close()
+        while handler.items:
+            yield self._parse_one_problem(handler.items.pop(0))
+
+
 class FPSHelper(object):
     def save_image(self, problem, base_dir, base_url):
         _problem = copy.deepcopy(problem)
@@ -113,8 +262,11 @@ class FPSHelper(object):
             name = "".join(random.choice(string.ascii_lowercase + string.digits) for _ in range(12))
             ext = os.path.splitext(img["src"])[1]
             file_name = name + ext
-            with open(os.path.join(base_dir, file_name), "wb") as f:
-                f.write(img["blob"])
+            if isinstance(img["blob"], SpooledFile):
+                img["blob"].move(os.path.join(base_dir, file_name))
+            else:
+                with open(os.path.join(base_dir, file_name), "wb") as f:
+                    f.write(img["blob"])
             for item in ["description", "input", "output"]:
                 _problem[item] = _problem[item].replace(img["src"], os.path.join(base_url, file_name))
         return _problem
@@ -131,30 +283,62 @@ class FPSHelper(object):
     #         }
     #     }
     # }
+    def _save_content(self, path, content):
+        """
+        :return: 크기, SpooledFile 이면 파일을 옮기고 byte 수를 돌려준다
+        """
+        if isinstance(content, SpooledFile):
+            content.move(path)
+            return content.size
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+        return len(content)
+
+    @staticmethod
+    def _stripped_md5(content):
+        if not isinstance(content, SpooledFile):
+            return hashlib.md5(content.rstrip().encode("utf-8")).hexdigest()
+        # 끝에서부터 공백이 아닌 곳을 찾고, 그 앞까지만 조금씩 읽어서 md5 를 계산한다
+        with open(content.path, "rb") as f:
+            end = content.size
+            while end > 0:
+                start = max(0, end - CHUNK_SIZE)
+                f.seek(start)
+                stripped = f.read(end - start).rstrip()
+                if stripped:
+                    end = start + len(stripped)
+                    break
+                end = start
+            f.seek(0)
+            md5 = hashlib.md5()
+            while f.tell() < end:
+                md5.update(f.read(min(CHUNK_SIZE, end - f.tell())))
+        return md5.hexdigest()
+
     def save_test_case(self, problem, base_dir):
         spj = problem.get("spj", {})
         test_cases = {}
         for index, item in enumerate(problem["test_cases"]):
             input_content = item.get("input")
             output_content = item.get("output")
+            input_size = output_size = 0
             if input_content:
-                with open(os.path.join(base_dir, str(index + 1) + ".in"), "w", encoding="utf-8") as f:
-                    f.write(input_content)
+                input_size = self._save_content(os.path.join(base_dir, str(index + 1) + ".in"), input_content)
             if output_content:
-                with open(os.path.join(base_dir, str(index + 1) + ".out"), "w", encoding="utf-8") as f:
-                    f.write(output_content)
+                # md5 는 파일을 옮긴 뒤에 그 경로에서 계산한다
+                output_size = self._save_content(os.path.join(base_dir, str(index + 1) + ".out"), output_content)
             if spj:
                 one_info = {
-                    "input_size": len(input_content),
+                    "input_size": input_size,
                     "input_name": f"{index + 1}.in"
                 }
             else:
                 one_info = {
-                    "input_size": len(input_content),
+                    "input_size": input_size,
                     "input_name": f"{index + 1}.in",
-                    "output_size": len(output_content),
+                    "output_size": output_size,
                     "output_name": f"{index + 1}.out",
-                    "stripped_output_md5": hashlib.md5(output_content.rstrip().encode("utf-8")).hexdigest()
+                    "stripped_output_md5": self._stripped_md5(output_content or "")
                 }
             test_cases[index] = one_info
         info = {
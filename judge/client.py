@@ -0,0 +1,141 @@
+import logging
+import os
+import threading
+import time
+from urllib.parse import urljoin
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.cache import cache
+from utils.constants import CacheKey
+
+logger = logging.getLogger(__name__)
+
+CONNECT_TIMEOUT = 3
+# 컴파일 + 요청 처리에 필요한 기본 시간(초)
+BASE_READ_TIMEOUT = 30
+MAX_RETRIES = 2
+RETRY_BACKOFF = 0.2
+
+# 연속으로 CIRCUIT_FAILURE_THRESHOLD 번 실패하면 CIRCUIT_OPEN_SECONDS 동안 해당 서버로 채점을 보내지 않는다
+CIRCUIT_FAILURE_THRESHOLD = 3
+CIRCUIT_FAILURE_WINDOW = 60
+CIRCUIT_OPEN_SECONDS = 30
+
+# 응답 시간 histogram 의 bucket 상한(ms)
+LATENCY_BUCKETS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+
+def judge_read_timeout(time_limit, test_case_number):
+    """
+    judge server 는 real time limit 을 cpu time limit 의 3배로 잡는다, 최악의 경우 모든 test case 가 순서대로 실행된다고 본다
+    :param time_limit: problem.time_limit (ms)
+    :param test_case_number: test case 개수
+    """
+    return BASE_READ_TIMEOUT + time_limit * 3 / 1000 * max(test_case_number, 1)
+
+
+class JudgeServerClient:
+    """
+    service_url 별로 keep-alive session 을 process 단위로 재사용한다
+    """
+    _sessions = {}
+    _pid = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def _get_session(cls, service_url):
+        with cls._lock:
+            # fork 된 process 에서는 부모의 connection 을 쓰지 않는다
+            if cls._pid != os.getpid():
+                cls._sessions = {}
+                cls._pid = os.getpid()
+            session = cls._sessions.get(service_url)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=32)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                cls._sessions[service_url] = session
+            return session
+
+    @staticmethod
+    def _failure_key(server):
+        return f"{CacheKey.judge_server_failure}:{server.id}"
+
+    @staticmethod
+    def _circuit_key(server):
+        return f"{CacheKey.judge_server_circuit}:{server.id}"
+
+    @staticmethod
+    def _latency_key(server):
+        return f"{CacheKey.judge_server_latency}:{server.hostname}"
+
+    @classmethod
+    def filter_available(cls, servers):
+        if not servers:
+            return servers
+        opened = cache.mget([cls._circuit_key(s) for s in servers])
+        return [s for s, flag in zip(servers, opened) if flag is None]
+
+    @classmethod
+    def _record_success(cls, server, elapsed):
+        ms = elapsed * 1000
+        bucket = next((str(b) for b in LATENCY_BUCKETS if ms <= b), "inf")
+        key = cls._latency_key(server)
+        pipe = cache.pipeline()
+        pipe.delete(cls._failure_key(server))
+        pipe.hincrby(key, bucket, 1)
+        pipe.hincrby(key, "count", 1)
+        pipe.hincrbyfloat(key, "sum", ms)
+        pipe.execute()
+
+    @classmethod
+    def _record_failure(cls, server):
+        key = cls._failure_key(server)
+        failures = cache.redis_incr(key)
+        cache.expire(key, CIRCUIT_FAILURE_WINDOW)
+        if failures >= CIRCUIT_FAILURE_THRESHOLD:
+            logger.error(f"Judge server {server.hostname} failed {failures} times, stop dispatching for {CIRCUIT_OPEN_SECONDS}s")
+            cache.set(cls._circuit_key(server), 1, timeout=CIRCUIT_OPEN_SECONDS)
+
+    @classmethod
+    def latency_histogram(cls, server):
+        data = {k.decode("utf-8"): float(v) for k, v in cache.hgetall(cls._latency_key(server)).items()}
+        count = int(data.get("count", 0))
+        return {"buckets": {str(b): int(data.get(str(b), 0)) for b in LATENCY_BUCKETS + ("inf",)},
+                "count": count,
+                "avg": data.get("sum", 0) / count if count else 0}
+
+    @classmethod
+    def post(cls, server, path, data, headers, read_timeout=BASE_READ_TIMEOUT, idempotent=False):
+        """
+        connect timeout 은 요청이 전달되기 전이므로 항상 재시도한다.
+        그 외의 connection error / read timeout 은 idempotent 한 요청일 때만 재시도한다.
+        """
+        session = cls._get_session(server.service_url)
+        url = urljoin(server.service_url, path)
+        for attempt in range(MAX_RETRIES + 1):
+            start = time.time()
+            try:
+                resp = session.post(url, json=data, headers=headers, timeout=(CONNECT_TIMEOUT, read_timeout))
+                resp.raise_for_status()
+                result = resp.json()
+            except requests.ConnectTimeout as e:
+                error = e
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+                if not idempotent:
+                    break
+            except (requests.RequestException, ValueError) as e:
+                error = e
+                break
+            else:
+                cls._record_success(server, time.time() - start)
+                return result
+            logger.warning(f"Request to judge server {server.hostname} failed (attempt {attempt + 1}): {error}")
+            if attempt < MAX_RETRIES:
+                time.sleep(RETRY_BACKOFF * (2 ** attempt))
+        cls._record_failure(server)
+        raise error
@@ -1,68 +1,73 @@
 import hashlib
 import json
 import logging
-from urllib.parse import urljoin
 
-import requests
 from django.db import transaction, IntegrityError
 from django.db.models import F
 
-from account.models import User
+from account.leaderboard import update_leaderboards
+from account.models import User, UserProfile
 from conf.models import JudgeServer
 from contest.models import ContestRuleType, ACMContestRank, OIContestRank, ContestStatus
+from contest.scoreboard import ContestScoreboard
+from judge.client import JudgeServerClient, BASE_READ_TIMEOUT, judge_read_timeout
+from judge.queue import JudgeQueue, submission_priority
+from judge.scheduler import get_scheduler
 from lecture.views.LectureBuilder import SubmitBuilder
 from options.options import SysOptions
-from problem.models import Problem, ProblemRuleType
+from problem.models import Problem, ProblemRuleType, UserProblemStatus
+from problem.tasks import fingerprint_submission
 from problem.utils import parse_problem_template
 from submission.models import JudgeStatus, Submission
 from utils.cache import cache
 from utils.constants import CacheKey
+from utils.shortcuts import rand_str
 
 logger = logging.getLogger(__name__)
 
 
 # 继续处理在队列中的问题
 def process_pending_task():
-    if cache.llen(CacheKey.waiting_queue):
-        # 防止循环引入
-        from judge.tasks import judge_task
+    # 이전 버전의 list 형태 대기열에 남아 있는 항목을 옮긴다
+    while True:
         tmp_data = cache.rpop(CacheKey.waiting_queue)
-        if tmp_data:
-            data = json.loads(tmp_data.decode("utf-8"))
-            judge_task.send(**data)
+        if not tmp_data:
+            break
+        data = json.loads(tmp_data.decode("utf-8"))
+        user_id = Submission.objects.filter(id=data["submission_id"]).values_list("user_id", flat=True).first()
+        if user_id is not None:
+            JudgeQueue.push(data["submission_id"], data["problem_id"], user_id)
+
+    # 防止循环引入
+    from judge.tasks import judge_task
+    for data in JudgeQueue.pop_batch(get_scheduler().free_slots()):
+        judge_task.send(data["submission_id"], data["problem_id"])
 
 
 class ChooseJudgeServer:
-    def __init__(self):
+    def __init__(self, test_case_id=None):
+        self.test_case_id = test_case_id
+        self.scheduler = get_scheduler()
         self.server = None
+        self.token = None
 
     def __enter__(self) -> [JudgeServer, None]:
-        with transaction.atomic():
-            servers = JudgeServer.objects.select_for_update().filter(is_disabled=False).order_by("task_number")
-            servers = [s for s in servers if s.status == "normal"]
-            for server in servers:
-                if server.task_number <= server.cpu_core * 2:
-                    server.task_number = F("task_number") + 1
-                    server.save(update_fields=["task_number"])
-                    self.server = server
-                    return server
-        return None
+        self.server, self.token = self.scheduler.acquire(test_case_id=self.test_case_id)
+        return self.server
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         if self.server:
-            JudgeServer.objects.filter(id=self.server.id).update(task_number=F("task_number") - 1)
+            self.scheduler.release(self.server, self.token)
 
 
 class DispatcherBase(object):
     def __init__(self):
         self.token = hashlib.sha256(SysOptions.judge_server_token.encode("utf-8")).hexdigest()
 
-    def _request(self, url, data=None):
-        kwargs = {"headers": {"X-Judge-Server-Token": self.token}}
-        if data:
-            kwargs["json"] = data
+    def _request(self, server, path, data=None, read_timeout=BASE_READ_TIMEOUT, idempotent=False):
         try:
-            return requests.post(url, **kwargs).json()
+            return JudgeServerClient.post(server, path, data=data, headers={"X-Judge-Server-Token": self.token},
+                                          read_timeout=read_timeout, idempotent=idempotent)
         except Exception as e:
             logger.exception(e)
 
@@ -70,8 +75,7 @@ class DispatcherBase(object):
 class SPJCompiler(DispatcherBase):
     def __init__(self, spj_code, spj_version, spj_language):
         super().__init__()
-        spj_compile_config = list(filter(lambda config: spj_language == config["name"], SysOptions.spj_languages))[0]["spj"][
-            "compile"]
+        spj_compile_config = SysOptions.spj_language_map[spj_language]["spj"]["compile"]
         self.data = {
             "src": spj_code,
             "spj_version": spj_version,
@@ -82,7 +86,7 @@ class SPJCompiler(DispatcherBase):
         with ChooseJudgeServer() as server:
             if not server:
                 return "No available judge_server"
-            result = self._request(urljoin(server.service_url, "compile_spj"), data=self.data)
+            result = self._request(server, "compile_spj", data=self.data, idempotent=True)
             if not result:
                 return "Failed to call judge server"
             if result["err"]:
@@ -125,13 +129,10 @@ class JudgeDispatcher(DispatcherBase):
 
     def judge(self):
         language = self.submission.language
-        sub_config = list(filter(lambda item: language == item["name"], SysOptions.languages))[0]
+        sub_config = SysOptions.language_map[language]
         spj_config = {}
-        if self.problem.spj_code:
-            for lang in SysOptions.spj_languages:
-                if lang["name"] == self.problem.spj_language:
-                    spj_config = lang["spj"]
-                    break
+        if self.problem.spj_code and self.problem.spj_language in SysOptions.spj_language_map:
+            spj_config = SysOptions.spj_language_map[self.problem.spj_language]["spj"]
 
         if language in self.problem.template:
             template = parse_problem_template(self.problem.template[language])
@@ -153,13 +154,26 @@ class JudgeDispatcher(DispatcherBase):
             "io_mode": self.problem.io_mode
         }
 
-        with ChooseJudgeServer() as server:
-            if not server:
-                data = {"submission_id": self.submission.id, "problem_id": self.problem.id}
-                cache.lpush(CacheKey.waiting_queue, json.dumps(data))
-                return
-            Submission.objects.filter(id=self.submission.id).update(result=JudgeStatus.JUDGING)
-            resp = self._request(urljoin(server.service_url, "/judge"), data=data)
+        user_id = self.submission.user_id
+        priority = submission_priority(self.contest if self.contest_id else None)
+        user_slot = rand_str()
+        # 한 사용자가 동시에 채점받을 수 있는 수를 넘으면 대기 queue 로 보낸다
+        if not JudgeQueue.acquire_user_slot(user_id, user_slot):
+            JudgeQueue.push(self.submission.id, self.problem.id, user_id, priority)
+            return
+        try:
+            with ChooseJudgeServer(test_case_id=self.problem.test_case_id) as server:
+                if not server:
+                    JudgeQueue.push(self.submission.id, self.problem.id, user_id, priority)
+                    return
+                Submission.objects.filter(id=self.submission.id).update(result=JudgeStatus.JUDGING)
+                read_timeout = judge_read_timeout(self.problem.time_limit, len(self.problem.test_case_score or []))
+                resp = self._request(server, "/judge", data=data, read_timeout=read_timeout)
+        finally:
+            JudgeQueue.release_user_slot(user_id, user_slot)
+        # 판정 서버와 사용자 slot 이 반환되었으므로 대기 중인 제출을 한꺼번에 보낸다
+        process_pending_task()
+
         if not resp:
             Submission.objects.filter(id=self.submission.id).update(result=JudgeStatus.SYSTEM_ERROR)
             return
@@ -184,6 +198,9 @@ class JudgeDispatcher(DispatcherBase):
                 self.submission.result = JudgeStatus.PARTIALLY_ACCEPTED
 
         self.submission.save()
+        # 강의 문제의 제출은 표절 검사용 fingerprint 를 미리 만들어 둔다
+        if self.contest_id and self.contest.lecture_id:
+            fingerprint_submission.send(self.submission.id)
 
         if self.contest_id:
             if self.contest.status != ContestStatus.CONTEST_UNDERWAY or User.objects.get(id=self.submission.user_id).is_contest_admin(self.contest):
@@ -200,9 +217,6 @@ class JudgeDispatcher(DispatcherBase):
             else:
                 self.update_problem_status()
 
-        # 至此判题结束，尝试处理任务队列中剩余的任务
-        process_pending_task()
-
     def updateLecturePersonalInfo(self):
         #try:
         lb = SubmitBuilder(self.submission)
@@ -211,10 +225,60 @@ class JudgeDispatcher(DispatcherBase):
         # except Exception as ex:
         #     print("exception", ex)
 
+    def _lock_problem_status(self):
+        """
+        이 사용자와 문제의 UserProblemStatus 를 잠가서 돌려준다, 없으면 UserProfile 의 이전 기록으로 만든다
+        사용자 행은 잠그지 않으므로 같은 사용자의 다른 문제 채점을 기다리지 않는다
+        """
+        lookup = {"user_id": self.submission.user_id, "problem_id": self.problem.id}
+        try:
+            return UserProblemStatus.objects.select_for_update().get(**lookup)
+        except UserProblemStatus.DoesNotExist:
+            pass
+        profile = UserProfile.objects.only("acm_problems_status", "oi_problems_status").get(user_id=lookup["user_id"])
+        # 기록이 없으면 PENDING 으로 만들고, 호출한 쪽에서 이번 결과로 바꾼다
+        status, score = UserProblemStatus.legacy_status(profile).get(self.problem.id, (JudgeStatus.PENDING, 0))
+        try:
+            with transaction.atomic():
+                return UserProblemStatus.objects.create(status=status, score=score, **lookup)
+        except IntegrityError:
+            return UserProblemStatus.objects.select_for_update().get(**lookup)
+
+    def _update_problem_status(self, problem_status, profile_update, rejudge=False):
+        """
+        대회가 아닌 문제의 풀이 상태를 고치고, 바뀐 AC 수와 점수를 profile_update 에 넣는다
+        :return: 순위표에 더할 값, update_leaderboards 참고
+        """
+        changes = {}
+        if problem_status.status == JudgeStatus.ACCEPTED:
+            return changes
+        if self.submission.result == JudgeStatus.ACCEPTED:
+            profile_update["accepted_number"] = F("accepted_number") + 1
+            problem_status.first_ac_time = self.submission.create_time
+            changes.update(accepted_number=1, rank_point=1)
+        if self.problem.rule_type == ProblemRuleType.OI:
+            score = self.submission.statistic_info["score"]
+            # 재채점은 같은 제출의 점수를 다시 매기므로 최고 점수와 비교하지 않는다
+            if not rejudge:
+                score = max(score, problem_status.score)
+            profile_update["total_score"] = F("total_score") - problem_status.score + score
+            changes["total_score"] = score - problem_status.score
+            problem_status.score = score
+        problem_status.status = self.submission.result
+        problem_status.save(update_fields=["status", "score", "first_ac_time"])
+        return changes
+
+    def _update_leaderboards(self, changes):
+        """
+        처음 AC 를 받았으면 rank point 를 올리고, commit 뒤에 전체 순위표를 고친다
+        """
+        user_id = self.submission.user_id
+        if changes.get("rank_point"):
+            User.objects.filter(id=user_id).update(rank_point=F("rank_point") + changes["rank_point"])
+        transaction.on_commit(lambda: update_leaderboards(user_id, **changes))
 
     def update_problem_status_rejudge(self):
         result = str(self.submission.result)
-        problem_id = str(self.problem.id)
         with transaction.atomic():
             # update problem status
             problem = Problem.objects.select_for_update().get(contest_id=self.contest_id, id=self.problem.id)
@@ -225,33 +289,14 @@ class JudgeDispatcher(DispatcherBase):
             problem_info[result] = problem_info.get(result, 0) + 1
             problem.save(update_fields=["accepted_number", "statistic_info"])
 
-            profile = User.objects.select_for_update().get(id=self.submission.user_id).userprofile
-            if problem.rule_type == ProblemRuleType.ACM:
-                acm_problems_status = profile.acm_problems_status.get("problems", {})
-                if acm_problems_status[problem_id]["status"] != JudgeStatus.ACCEPTED:
-                    acm_problems_status[problem_id]["status"] = self.submission.result
-                    if self.submission.result == JudgeStatus.ACCEPTED:
-                        profile.accepted_number += 1
-                profile.acm_problems_status["problems"] = acm_problems_status
-                profile.save(update_fields=["accepted_number", "acm_problems_status"])
-
-            else:
-                oi_problems_status = profile.oi_problems_status.get("problems", {})
-                score = self.submission.statistic_info["score"]
-                if oi_problems_status[problem_id]["status"] != JudgeStatus.ACCEPTED:
-                    # minus last time score, add this tim score
-                    profile.add_score(this_time_score=score,
-                                      last_time_score=oi_problems_status[problem_id]["score"])
-                    oi_problems_status[problem_id]["score"] = score
-                    oi_problems_status[problem_id]["status"] = self.submission.result
-                    if self.submission.result == JudgeStatus.ACCEPTED:
-                        profile.accepted_number += 1
-                profile.oi_problems_status["problems"] = oi_problems_status
-                profile.save(update_fields=["accepted_number", "oi_problems_status"])
+            profile_update = {}
+            changes = self._update_problem_status(self._lock_problem_status(), profile_update, rejudge=True)
+            if profile_update:
+                UserProfile.objects.filter(user_id=self.submission.user_id).update(**profile_update)
+            self._update_leaderboards(changes)
 
     def update_problem_status(self):
         result = str(self.submission.result)
-        problem_id = str(self.problem.id)
         with transaction.atomic():
             # update problem status
             problem = Problem.objects.select_for_update().get(contest_id=self.contest_id, id=self.problem.id)
@@ -263,72 +308,31 @@ class JudgeDispatcher(DispatcherBase):
             problem.save(update_fields=["accepted_number", "submission_number", "statistic_info"])
 
             # update_userprofile
-            user = User.objects.select_for_update().get(id=self.submission.user_id)
-            user_profile = user.userprofile
-            user_profile.submission_number += 1
-            if problem.rule_type == ProblemRuleType.ACM:
-                acm_problems_status = user_profile.acm_problems_status.get("problems", {})
-                if problem_id not in acm_problems_status:
-                    acm_problems_status[problem_id] = {"status": self.submission.result, "_id": self.problem._id}
-                    if self.submission.result == JudgeStatus.ACCEPTED:
-                        user_profile.accepted_number += 1
-                elif acm_problems_status[problem_id]["status"] != JudgeStatus.ACCEPTED:
-                    acm_problems_status[problem_id]["status"] = self.submission.result
-                    if self.submission.result == JudgeStatus.ACCEPTED:
-                        user_profile.accepted_number += 1
-                user_profile.acm_problems_status["problems"] = acm_problems_status
-                user_profile.save(update_fields=["submission_number", "accepted_number", "acm_problems_status"])
-
-            else:
-                oi_problems_status = user_profile.oi_problems_status.get("problems", {})
-                score = self.submission.statistic_info["score"]
-                if problem_id not in oi_problems_status:
-                    user_profile.add_score(score)
-                    oi_problems_status[problem_id] = {"status": self.submission.result,
-                                                      "_id": self.problem._id,
-                                                      "score": score}
-                    if self.submission.result == JudgeStatus.ACCEPTED:
-                        user_profile.accepted_number += 1
-                elif oi_problems_status[problem_id]["status"] != JudgeStatus.ACCEPTED:
-                    # minus last time score, add this time score
-                    user_profile.add_score(this_time_score=score,
-                                           last_time_score=oi_problems_status[problem_id]["score"])
-                    oi_problems_status[problem_id]["score"] = score
-                    oi_problems_status[problem_id]["status"] = self.submission.result
-                    if self.submission.result == JudgeStatus.ACCEPTED:
-                        user_profile.accepted_number += 1
-                user_profile.oi_problems_status["problems"] = oi_problems_status
-                user_profile.save(update_fields=["submission_number", "accepted_number", "oi_problems_status"])
+            profile_update = {"submission_number": F("submission_number") + 1}
+            changes = self._update_problem_status(self._lock_problem_status(), profile_update)
+            UserProfile.objects.filter(user_id=self.submission.user_id).update(**profile_update)
+            self._update_leaderboards(dict(changes, submission_number=1))
 
     def update_contest_problem_status(self):
         with transaction.atomic():
-            user = User.objects.select_for_update().get(id=self.submission.user_id)
-            user_profile = user.userprofile
-            problem_id = str(self.problem.id)
+            problem_status = self._lock_problem_status()
+            first_ac = self.submission.result == JudgeStatus.ACCEPTED and \
+                problem_status.status != JudgeStatus.ACCEPTED and problem_status.first_ac_time is None
             if self.contest.rule_type == ContestRuleType.ACM:
-                contest_problems_status = user_profile.acm_problems_status.get("contest_problems", {})
-                if problem_id not in contest_problems_status:
-                    contest_problems_status[problem_id] = {"status": self.submission.result, "_id": self.problem._id}
-                elif contest_problems_status[problem_id]["status"] != JudgeStatus.ACCEPTED:
-                    contest_problems_status[problem_id]["status"] = self.submission.result
-                else:
+                if problem_status.status == JudgeStatus.ACCEPTED:
                     # 如果已AC， 直接跳过 不计入任何计数器
                     return
-                user_profile.acm_problems_status["contest_problems"] = contest_problems_status
-                user_profile.save(update_fields=["acm_problems_status"])
+                problem_status.status = self.submission.result
 
             elif self.contest.rule_type == ContestRuleType.OI:
-                contest_problems_status = user_profile.oi_problems_status.get("contest_problems", {})
-                score = self.submission.statistic_info["score"]
-                if problem_id not in contest_problems_status:
-                    contest_problems_status[problem_id] = {"status": self.submission.result,
-                                                           "_id": self.problem._id,
-                                                           "score": score}
-                else:
-                    contest_problems_status[problem_id]["score"] = score
-                    contest_problems_status[problem_id]["status"] = self.submission.result
-                user_profile.oi_problems_status["contest_problems"] = contest_problems_status
-                user_profile.save(update_fields=["oi_problems_status"])
+                problem_status.score = self.submission.statistic_info["score"]
+                problem_status.status = self.submission.result
+            if self.submission.result == JudgeStatus.ACCEPTED and problem_status.first_ac_time is None:
+                problem_status.first_ac_time = self.submission.create_time
+            problem_status.save(update_fields=["status", "score", "first_ac_time"])
+            # 대회 문제는 전체 순위의 AC 수와 점수에는 들어가지 않고 rank point 에만 들어간다
+            if first_ac:
+                self._update_leaderboards({"rank_point": 1})
 
             problem = Problem.objects.select_for_update().get(contest_id=self.contest_id, id=self.problem.id)
             result = str(self.submission.result)
@@ -341,9 +345,6 @@ class JudgeDispatcher(DispatcherBase):
             print("Submission and Problem saved")
 
     def update_contest_rank(self):
-        if self.contest.rule_type == ContestRuleType.OI or self.contest.real_time_rank:
-            cache.delete(f"{CacheKey.contest_rank_cache}:{self.contest.id}")
-
         def get_rank(model):
             return model.objects.select_for_update().get(user_id=self.submission.user_id, contest=self.contest)
 
@@ -364,6 +365,11 @@ class JudgeDispatcher(DispatcherBase):
                 rank = get_rank(model)
         func(rank)
 
+        # 실시간 순위를 보여주지 않는 ACM 대회는 마지막으로 만들어진 순위표를 그대로 둔다
+        if self.contest.rule_type == ContestRuleType.OI or self.contest.real_time_rank:
+            scoreboard = ContestScoreboard(self.contest)
+            transaction.on_commit(lambda: scoreboard.update(rank))
+
     def _update_acm_contest_rank(self, rank):
         info = rank.submission_info.get(str(self.submission.problem_id))
         # 因前面更改过，这里需要重新获取
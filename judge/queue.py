@@ -0,0 +1,144 @@
+import json
+import time
+
+from django.conf import settings
+
+from utils.cache import cache
+from utils.constants import CacheKey, LectureContestType
+
+# 우선순위가 다르면 score 가 이 값만큼 차이나므로, 같은 우선순위 안에서는 먼저 들어온 제출이 먼저 나간다
+PRIORITY_STEP = 10 ** 10
+# drain 한 번에 앞에서부터 살펴보는 최대 항목 수 (제한에 걸린 사용자의 제출은 건너뛴다)
+DRAIN_SCAN_LIMIT = 500
+
+
+class JudgePriority:
+    COMPETITION = 0
+    ASSIGNMENT = 1
+    PRACTICE = 2
+
+
+def submission_priority(contest):
+    if contest is None:
+        return JudgePriority.PRACTICE
+    if contest.lecture_contest_type == LectureContestType.Competition:
+        return JudgePriority.COMPETITION
+    if contest.lecture_contest_type == LectureContestType.Assignment:
+        return JudgePriority.ASSIGNMENT
+    return JudgePriority.PRACTICE
+
+
+# KEYS[1]: 사용자의 채점 중 lease sorted set
+# ARGV: now, expire_at, token, limit
+_ACQUIRE_USER_SLOT_SCRIPT = """
+redis.call("ZREMRANGEBYSCORE", KEYS[1], "-inf", ARGV[1])
+if redis.call("ZCARD", KEYS[1]) >= tonumber(ARGV[4]) then
+    return 0
+end
+redis.call("ZADD", KEYS[1], ARGV[2], ARGV[3])
+redis.call("EXPIREAT", KEYS[1], math.ceil(tonumber(ARGV[2])))
+return 1
+"""
+
+# KEYS[1]: 대기 queue, KEYS[2]: 통계 hash
+# ARGV: now, batch size, 사용자별 제한, scan limit, priority step, 사용자 lease key prefix
+# 사용자별 lease key 는 항목에서 꺼낸 user_id 로 만든다 (단일 redis 인스턴스 전제)
+_DRAIN_SCRIPT = """
+local now = tonumber(ARGV[1])
+local batch = tonumber(ARGV[2])
+local user_limit = tonumber(ARGV[3])
+local step = tonumber(ARGV[5])
+local items = redis.call("ZRANGE", KEYS[1], 0, tonumber(ARGV[4]) - 1, "WITHSCORES")
+local running = {}
+local result = {}
+for i = 1, #items, 2 do
+    if #result >= batch then
+        break
+    end
+    local item = items[i]
+    local uid = tostring(cjson.decode(item)["user_id"])
+    if running[uid] == nil then
+        local key = ARGV[6] .. ":" .. uid
+        redis.call("ZREMRANGEBYSCORE", key, "-inf", now)
+        running[uid] = redis.call("ZCARD", key)
+    end
+    if running[uid] < user_limit then
+        running[uid] = running[uid] + 1
+        redis.call("ZREM", KEYS[1], item)
+        local wait = now - (tonumber(items[i + 1]) % step)
+        redis.call("HINCRBY", KEYS[2], "count", 1)
+        redis.call("HINCRBYFLOAT", KEYS[2], "wait_sum", wait)
+        local max_wait = tonumber(redis.call("HGET", KEYS[2], "wait_max") or "0")
+        if wait > max_wait then
+            redis.call("HSET", KEYS[2], "wait_max", wait)
+        end
+        table.insert(result, item)
+    end
+end
+return result
+"""
+
+
+class JudgeQueue:
+    """
+    판정 서버가 모두 사용 중이거나, 사용자가 동시에 채점할 수 있는 수를 넘었을 때 제출이 대기하는 곳
+    대회 > 과제 > 실습 순으로 먼저 나가고, drain 할 때 사용자별로 채점 중인 수가 제한을 넘지 않게 한다
+    """
+    _acquire_user_slot_script = None
+    _drain_script = None
+
+    @classmethod
+    def _user_key(cls, user_id):
+        return f"{CacheKey.judge_user_inflight}:{user_id}"
+
+    @classmethod
+    def push(cls, submission_id, problem_id, user_id, priority=JudgePriority.PRACTICE):
+        item = json.dumps({"submission_id": submission_id, "problem_id": problem_id, "user_id": user_id},
+                          sort_keys=True)
+        cache.zadd(CacheKey.judge_pending_queue, {item: priority * PRIORITY_STEP + time.time()}, nx=True)
+
+    @classmethod
+    def acquire_user_slot(cls, user_id, token):
+        if cls._acquire_user_slot_script is None:
+            cls._acquire_user_slot_script = cache.register_script(_ACQUIRE_USER_SLOT_SCRIPT)
+        now = time.time()
+        return bool(cls._acquire_user_slot_script(keys=[cls._user_key(user_id)],
+                                                  args=[now, now + settings.JUDGE_LEASE_TTL, token,
+                                                        settings.JUDGE_USER_INFLIGHT_LIMIT]))
+
+    @classmethod
+    def release_user_slot(cls, user_id, token):
+        cache.zrem(cls._user_key(user_id), token)
+
+    @classmethod
+    def pop_batch(cls, size):
+        if size <= 0:
+            return []
+        if cls._drain_script is None:
+            cls._drain_script = cache.register_script(_DRAIN_SCRIPT)
+        items = cls._drain_script(keys=[CacheKey.judge_pending_queue, CacheKey.judge_queue_stats],
+                                  args=[time.time(), size, settings.JUDGE_USER_INFLIGHT_LIMIT, DRAIN_SCAN_LIMIT,
+                                        PRIORITY_STEP, CacheKey.judge_user_inflight])
+        return [json.loads(item.decode("utf-8")) for item in items]
+
+    @classmethod
+    def metrics(cls):
+        queue = CacheKey.judge_pending_queue
+        pipe = cache.pipeline()
+        pipe.zcard(queue)
+        for priority in (JudgePriority.COMPETITION, JudgePriority.ASSIGNMENT, JudgePriority.PRACTICE):
+            pipe.zcount(queue, priority * PRIORITY_STEP, (priority + 1) * PRIORITY_STEP - 1)
+        pipe.zrange(queue, 0, 0, withscores=True)
+        pipe.hgetall(CacheKey.judge_queue_stats)
+        depth, competition, assignment, practice, head, stats = pipe.execute()
+
+        # 맨 앞 항목(다음에 나갈 제출)이 기다린 시간
+        head_wait = time.time() - head[0][1] % PRIORITY_STEP if head else 0
+        stats = {k.decode("utf-8"): float(v) for k, v in stats.items()}
+        count = int(stats.get("count", 0))
+        return {"depth": depth,
+                "depth_by_priority": {"competition": competition, "assignment": assignment, "practice": practice},
+                "head_wait": head_wait,
+                "dispatched": count,
+                "avg_wait": stats.get("wait_sum", 0) / count if count else 0,
+                "max_wait": stats.get("wait_max", 0)}
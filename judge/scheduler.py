@@ -0,0 +1,175 @@
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from conf.models import JudgeServer
+from judge.client import JudgeServerClient
+from utils.cache import cache
+from utils.constants import Choices, CacheKey
+from utils.shortcuts import rand_str
+
+logger = logging.getLogger(__name__)
+
+
+class SchedulePolicy(Choices):
+    # 진행 중인 작업 수가 가장 적은 서버
+    LEAST_LOADED = "least_loaded"
+    # 진행 중인 작업 수 / cpu_core 가 가장 작은 서버
+    WEIGHTED = "weighted"
+    # 같은 test case 는 가능한 한 같은 서버로 보낸다 (judge server 의 page cache 재사용)
+    STICKY = "sticky"
+
+
+def server_capacity(server):
+    # 기존 ChooseJudgeServer 의 task_number <= cpu_core * 2 조건과 동일
+    return server.cpu_core * 2 + 1
+
+
+# KEYS: 각 서버의 lease sorted set (member: lease token, score: 만료 시각)
+# ARGV: now, expire_at, token, mode, 이후 서버마다 capacity, weight
+# mode == "ordered" 면 KEYS 순서대로 첫 번째 빈 서버를, 아니면 load / weight 가 가장 작은 서버를 고른다
+# 반환값: 선택된 KEYS 의 index (1부터 시작), 없으면 0
+_ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local expire_at = tonumber(ARGV[2])
+local token = ARGV[3]
+local mode = ARGV[4]
+local best = 0
+local best_ratio = nil
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[3 + i * 2])
+    local weight = tonumber(ARGV[4 + i * 2])
+    redis.call("ZREMRANGEBYSCORE", key, "-inf", now)
+    local load = redis.call("ZCARD", key)
+    if load < capacity then
+        if mode == "ordered" then
+            best = i
+            break
+        end
+        local ratio = load / weight
+        if best_ratio == nil or ratio < best_ratio then
+            best = i
+            best_ratio = ratio
+        end
+    end
+end
+if best > 0 then
+    redis.call("ZADD", KEYS[best], expire_at, token)
+    redis.call("EXPIREAT", KEYS[best], math.ceil(expire_at))
+end
+return best
+"""
+
+
+class RedisJudgeScheduler:
+    """
+    Redis sorted set 에 서버별 lease 를 기록한다.
+    lease 는 TTL 이 지나면 다음 acquire 에서 정리되므로, worker 가 중간에 죽어도 작업 수가 새지 않는다.
+    """
+    _script = None
+
+    def __init__(self, policy=None, lease_ttl=None):
+        self.policy = policy or settings.JUDGE_SCHEDULE_POLICY
+        if self.policy not in SchedulePolicy.choices():
+            raise ValueError(f"Invalid schedule policy: {self.policy}")
+        self.lease_ttl = lease_ttl or settings.JUDGE_LEASE_TTL
+
+    @classmethod
+    def _get_script(cls):
+        if cls._script is None:
+            cls._script = cache.register_script(_ACQUIRE_SCRIPT)
+        return cls._script
+
+    @staticmethod
+    def _lease_key(server_id):
+        return f"{CacheKey.judge_server_lease}:{server_id}"
+
+    @staticmethod
+    def _available_servers():
+        servers = [s for s in JudgeServer.objects.filter(is_disabled=False) if s.status == "normal"]
+        # 최근에 연속으로 실패한 서버는 circuit 이 닫힐 때까지 제외한다
+        return JudgeServerClient.filter_available(servers)
+
+    def _order_servers(self, servers, test_case_id):
+        if self.policy == SchedulePolicy.STICKY and test_case_id:
+            # rendezvous hashing, 서버가 추가/삭제되어도 대부분의 test case 는 같은 서버에 남는다
+            def score(server):
+                return hashlib.md5(f"{test_case_id}:{server.hostname}".encode("utf-8")).hexdigest()
+            return sorted(servers, key=score)
+        return sorted(servers, key=lambda s: s.id)
+
+    def acquire(self, test_case_id=None, servers=None):
+        """
+        :return: (server, token), 사용 가능한 서버가 없으면 (None, None)
+        """
+        if servers is None:
+            servers = self._available_servers()
+        if not servers:
+            return None, None
+        servers = self._order_servers(servers, test_case_id)
+        mode = "ordered" if self.policy == SchedulePolicy.STICKY and test_case_id else "ratio"
+
+        now = time.time()
+        token = rand_str()
+        args = [now, now + self.lease_ttl, token, mode]
+        for server in servers:
+            weight = server.cpu_core if self.policy == SchedulePolicy.WEIGHTED else 1
+            args += [server_capacity(server), max(weight, 1)]
+        index = self._get_script()(keys=[self._lease_key(s.id) for s in servers], args=args)
+        if not index:
+            return None, None
+        return servers[index - 1], token
+
+    def release(self, server, token):
+        cache.zrem(self._lease_key(server.id), token)
+
+    def free_slots(self):
+        servers = self._available_servers()
+        if not servers:
+            return 0
+        now = time.time()
+        pipe = cache.pipeline()
+        for server in servers:
+            pipe.zcount(self._lease_key(server.id), now, "+inf")
+        return sum(max(server_capacity(s) - load, 0) for s, load in zip(servers, pipe.execute()))
+
+    def load(self, server):
+        key = self._lease_key(server.id)
+        cache.zremrangebyscore(key, "-inf", time.time())
+        return cache.zcard(key)
+
+
+class DBLockJudgeScheduler:
+    """
+    JudgeServer row 에 select_for_update 를 걸고 task_number 를 늘리는 이전 방식, 비교용으로 남겨둔다
+    """
+    def acquire(self, test_case_id=None, servers=None):
+        with transaction.atomic():
+            servers = JudgeServer.objects.select_for_update().filter(is_disabled=False).order_by("task_number")
+            servers = [s for s in servers if s.status == "normal"]
+            for server in servers:
+                if server.task_number <= server.cpu_core * 2:
+                    server.task_number = F("task_number") + 1
+                    server.save(update_fields=["task_number"])
+                    return server, None
+        return None, None
+
+    def release(self, server, token):
+        JudgeServer.objects.filter(id=server.id).update(task_number=F("task_number") - 1)
+
+    def load(self, server):
+        return JudgeServer.objects.get(id=server.id).task_number
+
+    def free_slots(self):
+        servers = [s for s in JudgeServer.objects.filter(is_disabled=False) if s.status == "normal"]
+        return sum(max(server_capacity(s) - s.task_number, 0) for s in servers)
+
+
+def get_scheduler():
+    if settings.JUDGE_SCHEDULER == "db":
+        return DBLockJudgeScheduler()
+    return RedisJudgeScheduler()
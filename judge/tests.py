@@ -0,0 +1,131 @@
+from datetime import timedelta
+from unittest import mock
+
+import requests
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from conf.models import JudgeServer
+from utils.cache import cache
+from utils.constants import CacheKey
+from .client import JudgeServerClient, CIRCUIT_FAILURE_THRESHOLD, MAX_RETRIES
+from .queue import JudgeQueue, JudgePriority
+from .scheduler import RedisJudgeScheduler, SchedulePolicy, server_capacity
+
+
+class RedisJudgeSchedulerTest(TestCase):
+    def setUp(self):
+        self.servers = [JudgeServer.objects.create(hostname=f"judge-{i}", judger_version="2.0.1", cpu_core=cpu_core,
+                                                   memory_usage=0, cpu_usage=0, service_url=f"http://judge-{i}:8080",
+                                                   last_heartbeat=timezone.now())
+                        for i, cpu_core in enumerate([1, 4])]
+
+    def tearDown(self):
+        for server in self.servers:
+            cache.delete(RedisJudgeScheduler._lease_key(server.id))
+
+    def test_capacity_and_release(self):
+        scheduler = RedisJudgeScheduler(policy=SchedulePolicy.LEAST_LOADED)
+        total = sum(server_capacity(s) for s in self.servers)
+        leases = [scheduler.acquire() for _ in range(total)]
+        self.assertTrue(all(server for server, _ in leases))
+        self.assertEqual(scheduler.acquire(), (None, None))
+
+        server, token = leases[0]
+        scheduler.release(server, token)
+        self.assertEqual(scheduler.acquire()[0].id, server.id)
+
+    def test_expired_lease_is_reclaimed(self):
+        scheduler = RedisJudgeScheduler(policy=SchedulePolicy.LEAST_LOADED, lease_ttl=-1)
+        for _ in range(sum(server_capacity(s) for s in self.servers) + 1):
+            self.assertIsNotNone(scheduler.acquire()[0])
+
+    def test_weighted_policy(self):
+        scheduler = RedisJudgeScheduler(policy=SchedulePolicy.WEIGHTED)
+        for _ in range(4):
+            scheduler.acquire()
+        self.assertEqual(scheduler.load(self.servers[0]), 1)
+        self.assertEqual(scheduler.load(self.servers[1]), 3)
+
+    def test_sticky_policy(self):
+        scheduler = RedisJudgeScheduler(policy=SchedulePolicy.STICKY)
+        first, _ = scheduler.acquire(test_case_id="499b26290cc7994e0b497212e842ea85")
+        second, _ = scheduler.acquire(test_case_id="499b26290cc7994e0b497212e842ea85")
+        self.assertEqual(first.id, second.id)
+
+    def test_disabled_server_is_skipped(self):
+        JudgeServer.objects.filter(id=self.servers[0].id).update(is_disabled=True)
+        JudgeServer.objects.filter(id=self.servers[1].id).update(last_heartbeat=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(RedisJudgeScheduler().acquire(), (None, None))
+
+
+@mock.patch("judge.client.time.sleep")
+class JudgeServerClientTest(TestCase):
+    def setUp(self):
+        self.server = JudgeServer.objects.create(hostname="judge", judger_version="2.0.1", cpu_core=2,
+                                                 memory_usage=0, cpu_usage=0, service_url="http://judge:8080",
+                                                 last_heartbeat=timezone.now())
+
+    def tearDown(self):
+        cache.delete_many([JudgeServerClient._failure_key(self.server), JudgeServerClient._circuit_key(self.server),
+                           JudgeServerClient._latency_key(self.server)])
+
+    @mock.patch("requests.Session.post", side_effect=requests.ConnectTimeout)
+    def test_connect_timeout_is_retried(self, post, sleep):
+        with self.assertRaises(requests.ConnectTimeout):
+            JudgeServerClient.post(self.server, "/judge", data={}, headers={})
+        self.assertEqual(post.call_count, MAX_RETRIES + 1)
+
+    @mock.patch("requests.Session.post", side_effect=requests.ReadTimeout)
+    def test_read_timeout_is_not_retried_for_judge(self, post, sleep):
+        with self.assertRaises(requests.ReadTimeout):
+            JudgeServerClient.post(self.server, "/judge", data={}, headers={})
+        self.assertEqual(post.call_count, 1)
+
+    @mock.patch("requests.Session.post", side_effect=requests.ConnectionError)
+    def test_circuit_breaker(self, post, sleep):
+        for _ in range(CIRCUIT_FAILURE_THRESHOLD):
+            with self.assertRaises(requests.ConnectionError):
+                JudgeServerClient.post(self.server, "/judge", data={}, headers={})
+        self.assertEqual(JudgeServerClient.filter_available([self.server]), [])
+        self.assertEqual(RedisJudgeScheduler().acquire(), (None, None))
+
+    def test_latency_histogram(self, sleep):
+        resp = mock.Mock()
+        resp.json.return_value = {"err": None, "data": []}
+        with mock.patch("requests.Session.post", return_value=resp):
+            JudgeServerClient.post(self.server, "/judge", data={}, headers={})
+        self.assertEqual(JudgeServerClient.latency_histogram(self.server)["count"], 1)
+
+
+@override_settings(JUDGE_USER_INFLIGHT_LIMIT=1)
+class JudgeQueueTest(TestCase):
+    def tearDown(self):
+        cache.delete_many([CacheKey.judge_pending_queue, CacheKey.judge_queue_stats,
+                           JudgeQueue._user_key(1), JudgeQueue._user_key(2)])
+
+    def test_competition_outranks_practice(self):
+        JudgeQueue.push("practice", 1, user_id=1, priority=JudgePriority.PRACTICE)
+        JudgeQueue.push("competition", 1, user_id=2, priority=JudgePriority.COMPETITION)
+        self.assertEqual([item["submission_id"] for item in JudgeQueue.pop_batch(2)], ["competition", "practice"])
+
+    def test_user_inflight_limit(self):
+        for i in range(3):
+            JudgeQueue.push(f"spam_{i}", 1, user_id=1)
+        JudgeQueue.push("other", 1, user_id=2)
+        self.assertEqual([item["submission_id"] for item in JudgeQueue.pop_batch(10)], ["spam_0", "other"])
+
+        self.assertTrue(JudgeQueue.acquire_user_slot(1, "token"))
+        self.assertFalse(JudgeQueue.acquire_user_slot(1, "token2"))
+        self.assertEqual(JudgeQueue.pop_batch(10), [])
+        JudgeQueue.release_user_slot(1, "token")
+        self.assertEqual([item["submission_id"] for item in JudgeQueue.pop_batch(10)], ["spam_1"])
+
+    def test_metrics(self):
+        JudgeQueue.push("a", 1, user_id=1, priority=JudgePriority.COMPETITION)
+        JudgeQueue.push("b", 1, user_id=2, priority=JudgePriority.PRACTICE)
+        metrics = JudgeQueue.metrics()
+        self.assertEqual(metrics["depth"], 2)
+        self.assertEqual(metrics["depth_by_priority"], {"competition": 1, "assignment": 0, "practice": 1})
+        JudgeQueue.pop_batch(2)
+        self.assertEqual(JudgeQueue.metrics()["dispatched"], 2)
@@ -0,0 +1,82 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('contest', '0006_auto_20220407_0910'),
+        ('lecture', '0004_lecture_aihelper_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LectureScoreSummary',
+            fields=[
+                ('signup', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='lecture.signup_class')),
+                ('total_practice', models.IntegerField(default=0)),
+                ('sub_practice', models.IntegerField(default=0)),
+                ('solve_practice', models.IntegerField(default=0)),
+                ('total_assign', models.IntegerField(default=0)),
+                ('sub_assign', models.IntegerField(default=0)),
+                ('solve_assign', models.IntegerField(default=0)),
+                ('try_problem', models.IntegerField(default=0)),
+                ('solve_problem', models.IntegerField(default=0)),
+                ('total_problem', models.IntegerField(default=0)),
+                ('total_score', models.IntegerField(default=0)),
+                ('max_score', models.IntegerField(default=0)),
+                ('avg_score', models.FloatField(default=0)),
+                ('progress', models.FloatField(default=0)),
+                ('last_update_time', models.DateTimeField(auto_now=True)),
+                ('lecture', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='lecture.Lecture')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'lecture_score_summary',
+            },
+        ),
+        migrations.CreateModel(
+            name='ContestScoreSummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_problem', models.IntegerField(default=0)),
+                ('sub_problem', models.IntegerField(default=0)),
+                ('solve_problem', models.IntegerField(default=0)),
+                ('score', models.IntegerField(default=0)),
+                ('max_score', models.IntegerField(default=0)),
+                ('avg_score', models.FloatField(default=0)),
+                ('progress', models.FloatField(default=0)),
+                ('is_submitted', models.BooleanField(default=False)),
+                ('is_passed', models.BooleanField(default=False)),
+                ('last_update_time', models.DateTimeField(auto_now=True)),
+                ('contest', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contest.Contest')),
+                ('signup', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='contest_summaries', to='lecture.signup_class')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'contest_score_summary',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='contestscoresummary',
+            unique_together={('signup', 'contest')},
+        ),
+        migrations.AddIndex(
+            model_name='lecturescoresummary',
+            index=models.Index(fields=['lecture', 'total_score'], name='lecture_summary_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lecturescoresummary',
+            index=models.Index(fields=['lecture', 'avg_score'], name='lecture_summary_avg_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lecturescoresummary',
+            index=models.Index(fields=['lecture', 'progress'], name='lecture_summary_progress_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contestscoresummary',
+            index=models.Index(fields=['contest', 'score'], name='contest_summary_score_idx'),
+        ),
+    ]
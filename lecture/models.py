@@ -54,3 +54,57 @@ class ta_admin_class(models.Model):
             checklist.append(PermitTA.SCORE)
 
         return checklist
+
+
+class LectureScoreSummary(models.Model):
+    """
+    signup_class.score 에서 교수용 성적표에 필요한 값만 뽑아 둔 표, 제출이 반영될 때마다 같이 갱신된다
+    """
+    signup = models.OneToOneField(signup_class, primary_key=True, on_delete=models.CASCADE, related_name="summary")
+    lecture = models.ForeignKey(Lecture, null=True, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, null=True, on_delete=models.CASCADE)
+    total_practice = models.IntegerField(default=0)
+    sub_practice = models.IntegerField(default=0)
+    solve_practice = models.IntegerField(default=0)
+    total_assign = models.IntegerField(default=0)
+    sub_assign = models.IntegerField(default=0)
+    solve_assign = models.IntegerField(default=0)
+    try_problem = models.IntegerField(default=0)
+    solve_problem = models.IntegerField(default=0)
+    total_problem = models.IntegerField(default=0)
+    total_score = models.IntegerField(default=0)
+    max_score = models.IntegerField(default=0)
+    avg_score = models.FloatField(default=0)
+    progress = models.FloatField(default=0)
+    last_update_time = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "lecture_score_summary"
+        indexes = [
+            models.Index(fields=["lecture", "total_score"], name="lecture_summary_score_idx"),
+            models.Index(fields=["lecture", "avg_score"], name="lecture_summary_avg_idx"),
+            models.Index(fields=["lecture", "progress"], name="lecture_summary_progress_idx"),
+        ]
+
+
+class ContestScoreSummary(models.Model):
+    signup = models.ForeignKey(signup_class, on_delete=models.CASCADE, related_name="contest_summaries")
+    contest = models.ForeignKey('contest.Contest', on_delete=models.CASCADE)
+    user = models.ForeignKey(User, null=True, on_delete=models.CASCADE)
+    total_problem = models.IntegerField(default=0)
+    sub_problem = models.IntegerField(default=0)
+    solve_problem = models.IntegerField(default=0)
+    score = models.IntegerField(default=0)
+    max_score = models.IntegerField(default=0)
+    avg_score = models.FloatField(default=0)
+    progress = models.FloatField(default=0)
+    is_submitted = models.BooleanField(default=False)
+    is_passed = models.BooleanField(default=False)
+    last_update_time = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "contest_score_summary"
+        unique_together = (("signup", "contest"),)
+        indexes = [
+            models.Index(fields=["contest", "score"], name="contest_summary_score_idx"),
+        ]
@@ -3,6 +3,21 @@ from utils.api import UsernameSerializer, serializers
 from .models import Lecture, signup_class, ta_admin_class
 
 
+class ScoreField(serializers.Field):
+    """
+    signup_class.score 는 compact 형식으로 저장될 수 있으므로, 응답에는 항상 이전 dict 형식으로 내보낸다
+    """
+    def __init__(self, **kwargs):
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        from .views.LectureScoreTree import ScoreTree
+        if ScoreTree.isCompact(value):
+            return ScoreTree.load(value).toDict()
+        return value
+
+
 class CreateLectureSerializer(serializers.Serializer):
     title = serializers.CharField(max_length=128)
     description = serializers.CharField()
@@ -53,6 +68,7 @@ class SimpleLectureSerializer(serializers.ModelSerializer):
 
 class SignupClassSerializer(serializers.ModelSerializer):
     lecture = LectureSerializer()
+    score = ScoreField()
     class Meta:
         model = signup_class
         fields = "__all__"
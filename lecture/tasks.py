@@ -0,0 +1,29 @@
+import dramatiq
+
+from contest.models import Contest
+from problem.models import Problem
+from utils.shortcuts import DRAMATIQ_WORKER_ARGS
+from .views.LectureBuilder import LectureBatch, BatchStatus, ProblemBuilder, ContestBuilder, TaskType
+
+BUILDERS = {
+    ProblemBuilder.contentType: (ProblemBuilder, Problem.objects.select_related("contest")),
+    ContestBuilder.contentType: (ContestBuilder, Contest.objects.all()),
+}
+
+
+@dramatiq.actor(**DRAMATIQ_WORKER_ARGS())
+def lecture_score_task(lecture_id, tasktype, content_type=None, content_id=None):
+    batch = LectureBatch(lecture_id)
+    if content_type is None:
+        batch.rebuild()
+        return
+
+    builder_class, queryset = BUILDERS[content_type]
+    try:
+        content = queryset.get(id=content_id)
+    except (Problem.DoesNotExist, Contest.DoesNotExist):
+        # 작업이 실행되기 전에 삭제된 경우, 삭제할 때 이미 score 에서 빠졌다
+        batch.setProgress(status=BatchStatus.FINISHED)
+        return
+    builder = builder_class(content)
+    batch.run(builder.doMigrateTask if tasktype == TaskType.MIGRATE else builder.doDeleteTask)
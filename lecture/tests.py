@@ -1,3 +1,147 @@
-from django.test import TestCase
+import copy
+import json
+from types import SimpleNamespace
 
-# Create your tests here.
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from contest.models import Contest
+from contest.tests import DEFAULT_CONTEST_DATA
+from problem.models import Problem
+from problem.tests import DEFAULT_PROBLEM_DATA
+from submission.models import JudgeStatus, Submission
+from utils.api.tests import APITestCase
+from utils.cache import cache
+
+from .models import Lecture, signup_class, LectureScoreSummary, ContestScoreSummary
+from .views.LectureAnalysis import ContestType, LectureDictionaryKeys, lecDispatcher
+from .views.LectureBuilder import LectureBatch, BatchStatus, ProblemBuilder, UserBuilder, SubmitBuilder
+from .views.LectureSummary import annotateSummary
+from .views.LectureScoreTree import ScoreTree
+
+
+@override_settings(LECTURE_SCORE_MODE="sync")
+class LectureBatchTest(APITestCase):
+    def setUp(self):
+        admin = self.create_admin(login=False)
+        self.lecture = Lecture.objects.create(title="lecture", description="", created_by=admin, year=2020,
+                                              semester=1, status=True, password="")
+        self.contest = Contest.objects.create(created_by=admin, lecture=self.lecture, **DEFAULT_CONTEST_DATA)
+        self.students = [signup_class.objects.create(lecture=self.lecture, isallow=True,
+                                                     user=self.create_user(f"user{i}", "test123", login=False))
+                         for i in range(3)]
+        self.problem = self.create_problem("A-1")
+
+    def tearDown(self):
+        cache.delete(LectureBatch.progressKey(self.lecture.id))
+
+    def create_problem(self, _id):
+        data = copy.deepcopy(DEFAULT_PROBLEM_DATA)
+        data.pop("tags")
+        data["_id"] = _id
+        return Problem.objects.create(contest=self.contest, created_by=self.contest.created_by, **data)
+
+    def problem_ids(self, student):
+        student.refresh_from_db()
+        contests = ScoreTree.load(student.score).toDict()[LectureDictionaryKeys.CONTESTANALYSIS][ContestType.PRACTICE][LectureDictionaryKeys.CONTESTS]
+        return set(contests[str(self.contest.id)][LectureDictionaryKeys.PROBLEMS].keys())
+
+    def test_migrate_and_delete_problem(self):
+        ProblemBuilder(self.problem).MigrateContent()
+        for student in self.students:
+            self.assertEqual(self.problem_ids(student), {str(self.problem.id)})
+        progress = LectureBatch.progress(self.lecture.id)
+        self.assertEqual(progress["status"], BatchStatus.FINISHED)
+        self.assertEqual(progress["done"], 3)
+
+        ProblemBuilder(self.problem).DeleteContent()
+        for student in self.students:
+            self.assertEqual(self.problem_ids(student), set())
+
+    def test_rebuild_queries(self):
+        other = self.create_problem("A-2")
+        batch = LectureBatch(self.lecture.id, chunk_size=2)
+        batch.problems()
+        with CaptureQueriesContext(connection) as context:
+            batch.rebuild()
+        # 학생마다 저장하지 않고 chunk 마다 UPDATE 한 번
+        self.assertEqual(len([q for q in context.captured_queries if q["sql"].startswith("UPDATE")]), 2)
+        for student in self.students:
+            self.assertEqual(self.problem_ids(student), {str(self.problem.id), str(other.id)})
+
+    def test_summary_follows_submission(self):
+        ProblemBuilder(self.problem).MigrateContent()
+        summary = LectureScoreSummary.objects.get(signup=self.students[0])
+        self.assertEqual((summary.total_problem, summary.max_score, summary.total_practice), (1, 0, 1))
+
+        submission = Submission.objects.create(contest=self.contest, problem=self.problem, lecture=self.lecture,
+                                               user=self.students[0].user, username="user0", code="", language="C",
+                                               result=JudgeStatus.ACCEPTED, info={"data": [{"score": 0}]})
+        SubmitBuilder(submission).LectureSubmit()
+        summary.refresh_from_db()
+        self.assertEqual((summary.try_problem, summary.solve_problem, summary.solve_practice), (1, 1, 1))
+        contest_summary = ContestScoreSummary.objects.get(signup=self.students[0], contest=self.contest)
+        self.assertTrue(contest_summary.is_passed)
+
+        ranked = annotateSummary(signup_class.objects.filter(lecture=self.lecture), order_by="-solveProblem")
+        self.assertEqual(ranked[0].id, self.students[0].id)
+        self.assertEqual(ranked[1].solveProblem, 0)
+
+    def test_build_lecture_by_user(self):
+        UserBuilder(None).buildLecturebyUser(self.students[0].user)
+        self.assertEqual(self.problem_ids(self.students[0]), {str(self.problem.id)})
+
+
+class ScoreTreeTest(TestCase):
+    def setUp(self):
+        contests = [SimpleNamespace(id=cid, title=f"contest {cid}", visible=True, lecture_contest_type=ctype)
+                    for cid, ctype in enumerate(ContestType.cTypeList + [ContestType.PRACTICE], start=1)]
+        self.problems = [SimpleNamespace(id=pid, title=f"problem {pid}", visible=True, total_score=pid * 10,
+                                         contest=contests[pid % len(contests)]) for pid in range(1, 13)]
+
+    def submission(self, problem, score):
+        return SimpleNamespace(contest=problem.contest, problem=problem, problem_id=problem.id,
+                               result=JudgeStatus.ACCEPTED if score else JudgeStatus.WRONG_ANSWER,
+                               info={"data": [{"score": score}]} if score else {})
+
+    def normalize(self, data):
+        return json.loads(json.dumps(data))
+
+    def test_same_result_as_lec_dispatcher(self):
+        legacy, tree = lecDispatcher(), ScoreTree()
+        for problem in self.problems:
+            legacy.migrateProblem(problem)
+            tree.migrateProblem(problem)
+        for problem, score in zip(self.problems[::2], [0, 10, 30, 0, 50, 60]):
+            legacy.associateSubmission(self.submission(problem, score))
+            tree.associateSubmission(self.submission(problem, score))
+            self.assertEqual(self.normalize(tree.toDict()), self.normalize(legacy.toDict()))
+
+    def test_round_trip(self):
+        legacy = lecDispatcher()
+        for problem in self.problems:
+            legacy.migrateProblem(problem)
+        legacy.associateSubmission(self.submission(self.problems[0], 7))
+        data = self.normalize(legacy.toDict())
+
+        blob = self.normalize(ScoreTree.fromDict(data).dump())
+        self.assertTrue(ScoreTree.isCompact(blob))
+        self.assertEqual(self.normalize(ScoreTree.load(blob).toDict()), data)
+        restored = lecDispatcher()
+        restored.fromDict(blob)
+        self.assertEqual(self.normalize(restored.toDict()), data)
+
+    def test_incremental_update_matches_recalculate(self):
+        tree = ScoreTree()
+        for problem in self.problems:
+            tree.migrateProblem(problem)
+        tree.associateSubmission(self.submission(self.problems[1], 20))
+        tree.deleteProblem(self.problems[2])
+        contest = self.problems[3].contest
+        contest.lecture_contest_type = ContestType.CONTEST if contest.lecture_contest_type != ContestType.CONTEST else ContestType.ASSIGN
+        tree.migrateContest(contest)
+
+        recalculated = ScoreTree.load(self.normalize(tree.dump()))
+        recalculated.recalculate()
+        self.assertEqual(self.normalize(recalculated.toDict()), self.normalize(tree.toDict()))
@@ -2,7 +2,7 @@ from django.conf.urls import url
 
 from django.contrib import admin
 
-from ..views.admin import LectureAPI, AdminLectureApplyAPI, WaitStudentAddAPI, TAAdminLectureAPI
+from ..views.admin import LectureAPI, AdminLectureApplyAPI, WaitStudentAddAPI, TAAdminLectureAPI, LectureScoreProgressAPI
 
 urlpatterns = [
     url(r"^lecture/?$", LectureAPI.as_view(), name="lecture_admin_api"),
@@ -10,5 +10,6 @@ urlpatterns = [
     url(r"^tauser/?$", TAAdminLectureAPI.as_view(), name="ta_admin_api"),
     url(r"migratelecture/?$", AdminLectureApplyAPI.as_view(), name="migratelecture_admin_api"),
     url(r"^waitstudent/?$", WaitStudentAddAPI.as_view(), name="waitstudent_admin_api"),
+    url(r"^lecture_score_progress/?$", LectureScoreProgressAPI.as_view(), name="lecture_score_progress_admin_api"),
     #url(r"^test/", admin.site.urls),
 ]
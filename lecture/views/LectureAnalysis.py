@@ -404,6 +404,11 @@ class lecDispatcher(LectureAnalysis):
         if dicdata is None or len(dicdata) == 0:
             return
 
+        # compact 형식(LectureScoreTree)으로 저장된 경우 dict 형식으로 바꿔서 읽는다
+        from lecture.views.LectureScoreTree import ScoreTree
+        if ScoreTree.isCompact(dicdata):
+            dicdata = ScoreTree.load(dicdata).toDict()
+
         self.Info.data = dicdata[LectureDictionaryKeys.INFO]
 
         for contA in dicdata[LectureDictionaryKeys.CONTESTANALYSIS].keys():
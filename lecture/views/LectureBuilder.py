@@ -1,16 +1,159 @@
+import time
 from abc import ABCMeta, abstractmethod
 from problem.models import Problem
 from submission.models import Submission
 from lecture.models import signup_class
-from lecture.views.LectureAnalysis import lecDispatcher, DataType
-from django.db.models import Max
+from lecture.views.LectureScoreTree import ScoreTree
+from lecture.views.LectureSummary import saveSummary, bulkSaveSummary
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Case, When, Value, QuerySet
+from django.db.models.functions import Cast
 from account.models import AdminType
+from utils.cache import cache
+from utils.constants import CacheKey
+from utils.models import JSONField
+
+# 한 번에 읽고 UPDATE 하는 학생 수
+BATCH_CHUNK_SIZE = 200
+PROGRESS_TTL = 24 * 60 * 60
 
 class TaskType:
     MIGRATE = 1
     DELETE = 2
 
+class BatchStatus:
+    QUEUED = "queued"
+    RUNNING = "running"
+    FINISHED = "finished"
+    FAILED = "failed"
+
+
+def bulk_update_score(rows, batch_size=BATCH_CHUNK_SIZE):
+    '''
+        signup_class 의 score 를 한 번의 UPDATE 로 저장 (Django 2.1 에는 QuerySet.bulk_update 가 없어서 같은 방식으로 CASE WHEN 을 만든다)
+
+        @param rows : score 가 수정된 signup_class list
+    '''
+    if not rows:
+        return
+    with transaction.atomic():
+        for start in range(0, len(rows), batch_size):
+            chunk = rows[start:start + batch_size]
+            cases = [When(id=row.id, then=Value(row.score, output_field=JSONField())) for row in chunk]
+            signup_class.objects.filter(id__in=[row.id for row in chunk]) \
+                .update(score=Cast(Case(*cases, output_field=JSONField()), output_field=JSONField()))
+
+
+def saveScores(pairs, batch_size=BATCH_CHUNK_SIZE):
+    '''
+        score 와 성적표 summary 를 함께 저장
+
+        @param pairs : [(signup_class, ScoreTree), ...]
+    '''
+    if not pairs:
+        return
+    for row, tree in pairs:
+        row.score = tree.dump()
+    with transaction.atomic():
+        bulk_update_score([row for row, _ in pairs], batch_size)
+        bulkSaveSummary(pairs)
+
+
+class LectureBatch:
+    '''
+        Lecture 에 등록된 전체 학생의 score 를 한 번에 수정하는 batch
+        문제 목록은 한 번만 조회하고, 학생 score 는 chunk 단위로 잠가서 다시 읽고 메모리에서 수정한 뒤 bulk_update_score 로 저장한다.
+        채점 worker 의 LectureSubmit 도 같은 row 를 잠그므로 그 사이에 저장된 제출 결과를 덮어쓰지 않는다.
+        진행 상황은 redis hash 에 기록하여 LectureScoreProgressAPI 에서 조회한다.
+
+        @param lecture_id : 대상 Lecture id (None 이면 강의에 속하지 않은 대회의 신청 목록)
+    '''
+    def __init__(self, lecture_id, chunk_size=BATCH_CHUNK_SIZE):
+        self.lecture_id = lecture_id
+        self.chunk_size = chunk_size
+        self._problems = None
+
+    @staticmethod
+    def progressKey(lecture_id):
+        return f"{CacheKey.lecture_score_progress}:{lecture_id}"
+
+    @classmethod
+    def progress(cls, lecture_id):
+        data = {k.decode("utf-8"): v.decode("utf-8") for k, v in cache.hgetall(cls.progressKey(lecture_id)).items()}
+        for field in ("total", "done"):
+            if field in data:
+                data[field] = int(data[field])
+        return data
+
+    def setProgress(self, **kwargs):
+        key = self.progressKey(self.lecture_id)
+        pipe = cache.pipeline()
+        pipe.hmset(key, dict(kwargs, updated_at=time.time()))
+        pipe.expire(key, PROGRESS_TTL)
+        pipe.execute()
+
+    def problems(self):
+        if self._problems is None:
+            self._problems = list(Problem.objects.filter(contest__lecture=self.lecture_id).select_related("contest"))
+        return self._problems
+
+    def students(self, skip_admin=False):
+        students = signup_class.objects.filter(isallow=True, lecture=self.lecture_id) \
+            .only("id", "lecture_id", "user_id", "score").order_by("id")
+        if skip_admin:
+            students = students.exclude(user__admin_type__in=[AdminType.SUPER_ADMIN, AdminType.ADMIN])
+        return students
+
+    '''
+        전체 학생의 score 에 task 를 적용
+
+        @param task : ScoreTree 를 받아 수정하는 함수 (LectureBuilder.doMigrateTask 등)
+        @param skip_admin : 관리자의 score 는 수정하지 않는다
+    '''
+    def run(self, task, skip_admin=False):
+        students = self.students(skip_admin)
+        total = students.count()
+        done = 0
+        self.setProgress(status=BatchStatus.RUNNING, total=total, done=done, error="")
+        try:
+            last_id = 0
+            while True:
+                ids = list(students.filter(id__gt=last_id).values_list("id", flat=True)[:self.chunk_size])
+                if not ids:
+                    break
+                last_id = ids[-1]
+                with transaction.atomic():
+                    # 잠근 뒤에 score 를 다시 읽어서, 읽은 뒤 저장하기 전에 들어온 제출 결과를 잃지 않는다
+                    chunk = []
+                    for student in signup_class.objects.select_for_update().filter(id__in=ids) \
+                            .only("id", "lecture_id", "user_id", "score").order_by("id"):
+                        tree = ScoreTree.load(student.score)
+                        task(tree)
+                        chunk.append((student, tree))
+                    saveScores(chunk, self.chunk_size)
+                done += len(ids)
+                self.setProgress(done=done)
+            self.setProgress(status=BatchStatus.FINISHED, done=total)
+        except Exception as e:
+            self.setProgress(status=BatchStatus.FAILED, error=str(e))
+            raise
+
+    '''
+        Lecture 의 전체 문제로 score 를 다시 만든다
+    '''
+    def rebuild(self):
+        problems = self.problems()
+
+        def migrateAll(linfo):
+            for p in problems:
+                linfo.migrateProblem(p)
+        self.run(migrateAll, skip_admin=True)
+
 class LectureBuilder(metaclass=ABCMeta):
+    # lecture_score_task 에서 MainQuery 를 다시 조회할 때 사용 ("problem", "contest")
+    contentType = None
+
     def __init__(self, mainQuery):
         self.MainQuery = mainQuery
 
@@ -29,15 +172,16 @@ class LectureBuilder(metaclass=ABCMeta):
     #Need to update as like doTask()
     def LectureSubmit(self):
         try:
-            lectures = signup_class.objects.filter(isallow=True
-                                                  , user=self.MainQuery.user_id
-                                                  , lecture=self.getLecture()).select_related('lecture')
-            for lec in lectures:
-                LectureInfo = lecDispatcher()
-                LectureInfo.fromDict(lec.score)
-                LectureInfo.associateSubmission(self.MainQuery)
-                lec.score = LectureInfo.toDict()
-                lec.save()
+            # LectureBatch 와 같은 row 를 수정하므로 잠근 뒤에 읽는다
+            with transaction.atomic():
+                lectures = signup_class.objects.select_for_update(of=("self",)) \
+                    .filter(isallow=True, user=self.MainQuery.user_id, lecture=self.getLecture()).select_related('lecture')
+                for lec in lectures:
+                    LectureInfo = ScoreTree.load(lec.score)
+                    LectureInfo.associateSubmission(self.MainQuery)
+                    lec.score = LectureInfo.dump()
+                    lec.save(update_fields=["score"])
+                    saveSummary(lec, LectureInfo, contest_ids=[self.MainQuery.contest_id])
         except Exception as e:
             print("Exception :",e)
 
@@ -47,53 +191,49 @@ class LectureBuilder(metaclass=ABCMeta):
     def DeleteContent(self):
         self.doTask(TaskType.DELETE)
 
+    '''
+        MIGRATE 는 commit 이후 lecture_score_task 로 worker 에서 수행한다.
+        DELETE 는 요청이 끝나면 대상이 DB 에서 지워지므로 바로 수행한다.
+    '''
     def doTask(self, tasktype):
-        try:
-            students = signup_class.objects.filter(isallow=True
-                                                  , lecture=self.getLecture()).select_related('lecture')
-
-            for student in students:
-                linfo = lecDispatcher()
-                linfo.fromDict(student.score)
-                #do task by tasktype
-
-                if tasktype == TaskType.MIGRATE:
-                    self.doMigrateTask(linfo)
-
-                elif tasktype == TaskType.DELETE:
-                    self.doDeleteTask(linfo)
-
-                student.score = linfo.toDict()
-                student.save()
+        lecture = self.getLecture()
+        lecture_id = lecture.id if lecture is not None else None
+        if tasktype == TaskType.MIGRATE and settings.LECTURE_SCORE_MODE == "async":
+            from lecture.tasks import lecture_score_task
+            LectureBatch(lecture_id).setProgress(status=BatchStatus.QUEUED)
+            transaction.on_commit(lambda: lecture_score_task.send(lecture_id, tasktype, self.contentType, self.MainQuery.id))
+            return
 
+        try:
+            if tasktype == TaskType.MIGRATE:
+                LectureBatch(lecture_id).run(self.doMigrateTask)
+            elif tasktype == TaskType.DELETE:
+                LectureBatch(lecture_id).run(self.doDeleteTask)
         except Exception as e:
             print(tasktype,"-",self.MainQuery," Exception :",e)
 
     def buildLectureforAllUser(self, lecture):
-        try:
-            lectures = signup_class.objects.filter(isallow=True, lecture_id=lecture.id).select_related('lecture').order_by('lecture')
-        except Exception as e:
-            print("exception", e)
-        self.buildLecture(lectures)
+        LectureBatch(lecture.id).rebuild()
 
     def buildLecture(self, lectures):
-        lid = -1
+        if isinstance(lectures, QuerySet):
+            lectures = lectures.select_related("user")
+        plists = dict()  # lecture id 별 문제 목록, 학생마다 다시 조회하지 않는다
+        rows = []
         for lec in lectures:
             if lec.user.admin_type == AdminType.SUPER_ADMIN or lec.user.admin_type == AdminType.ADMIN:
                 continue
 
-            plist = Problem.objects.filter(contest__lecture=lec.lecture_id).prefetch_related('contest')
-
-            # test
+            if lec.lecture_id not in plists:
+                plists[lec.lecture_id] = LectureBatch(lec.lecture_id).problems()
 
-            LectureInfo = lecDispatcher()
-            LectureInfo.fromDict(lec.score)
+            LectureInfo = ScoreTree.load(lec.score)
 
-            for p in plist:
+            for p in plists[lec.lecture_id]:
                 LectureInfo.migrateProblem(p)
 
-            lec.score = LectureInfo.toDict()
-            lec.save()
+            rows.append((lec, LectureInfo))
+        saveScores(rows)
         print("Lecture Re build finished")
 
 class SubmitBuilder(LectureBuilder):
@@ -110,6 +250,8 @@ class SubmitBuilder(LectureBuilder):
         pass
 
 class ProblemBuilder(LectureBuilder):
+    contentType = "problem"
+
     def __init__(self, prob):
         LectureBuilder.__init__(self, prob)
 
@@ -123,6 +265,8 @@ class ProblemBuilder(LectureBuilder):
         lecDispatcher.deleteProblem(self.MainQuery)
 
 class ContestBuilder(LectureBuilder):
+    contentType = "contest"
+
     def __init__(self, cont):
         LectureBuilder.__init__(self, cont)
 
@@ -0,0 +1,377 @@
+import base64
+import sys
+import zlib
+from array import array
+
+from submission.models import JudgeStatus
+from lecture.views.LectureAnalysis import DataType, ContestType, LectureDictionaryKeys
+
+'''
+    signup_class.score 의 compact 저장 형식 (version 2)
+
+    {"version": 2,
+     "contests": [[type index, contest id, title, contest type, solveCount, isSubmitted, [problem id, ...]], ...],
+     "cols": base64(zlib(float64 array))}
+
+    cols 는 node 마다 DataType.dataTypeList 순서의 고정 폭(WIDTH) 값을 가진다.
+    row 순서는 lecture, 실습/과제/대회(ContestType.cTypeList 순서), 이후 contest 마다 contest row 다음에 그 contest 의 problem row.
+'''
+SCORE_TREE_VERSION = 2
+VERSION_KEY = "version"
+
+FIELDS = DataType.dataTypeList
+WIDTH = len(FIELDS)
+COL = {dtype: index for index, dtype in enumerate(FIELDS)}
+BOOLEAN_COLS = {COL[dtype] for dtype in DataType.booleanTypeList}
+# 평균/진행률은 0 일 때만 정수로 돌려준다 (이전 형식과 같은 값)
+FLOAT_COLS = {COL[DataType.AVERAGE], COL[DataType.PROGRESS]}
+
+# 자식 node 가 부모 node 에 더하는 값: 합계 5 개 + (공개, 제출, 통과) 개수
+SUM_TYPES = [DataType.POINT, DataType.NUMOFTOTALPROBLEMS, DataType.SCORE,
+             DataType.NUMOFTOTALSOLVEDPROBLEMS, DataType.NUMOFTOTALSUBPROBLEMS]
+COUNT_TYPES = [DataType.NUMOFCONTENTS, DataType.NUMOFSUBCONTENTS, DataType.NUMOFSOLVEDCONTENTS]
+TARGET_COLS = [COL[dtype] for dtype in SUM_TYPES + COUNT_TYPES]
+NO_CONTRIBUTION = (0,) * len(TARGET_COLS)
+
+LECTURE, TYPE, CONTEST, PROBLEM = range(4)
+
+
+class ScoreNode:
+    '''
+        lecture / 실습,과제,대회 / contest / problem node, 값은 ScoreTree.cols 의 row 에 있다
+    '''
+    __slots__ = ("kind", "id", "row", "parent", "children", "title", "contestType", "solveCount", "isSubmitted")
+
+    def __init__(self, kind, id, row, parent):
+        self.kind = kind
+        self.id = id
+        self.row = row
+        self.parent = parent
+        self.children = dict()
+        self.title = ""
+        self.contestType = None
+        self.solveCount = 0
+        self.isSubmitted = False
+
+
+class ScoreTree:
+    '''
+        lecDispatcher 와 같은 method(migrateProblem, deleteProblem, migrateContest, deleteContest, associateSubmission,
+        cleanDataForScorebard)를 제공하는 배열 기반 score tree.
+        problem 값이 바뀌면 부모 node 의 합계를 차이만큼만 고치므로 갱신 비용은 O(depth) 이다.
+        부모 값은 항상 공개된 자식 값의 합계와 같다 (이전 구조의 reCalInfo 결과와 같음).
+    '''
+    def __init__(self):
+        self.cols = array("d")
+        self.lecture = self._newNode(LECTURE, None, None)
+        self.types = dict()
+        for ctype in ContestType.cTypeList:
+            self.types[ctype] = self._newNode(TYPE, ctype, self.lecture)
+            self._update(self.types[ctype], ISVISIBLE=1)
+
+    def _newNode(self, kind, id, parent):
+        node = ScoreNode(kind, id, len(self.cols) // WIDTH, parent)
+        self.cols.extend([0] * WIDTH)
+        if parent is not None:
+            parent.children[id] = node
+        return node
+
+    def get(self, node, dtype):
+        value = self.cols[node.row * WIDTH + COL[dtype]]
+        return bool(value) if COL[dtype] in BOOLEAN_COLS else value
+
+    def set(self, node, dtype, value):
+        self.cols[node.row * WIDTH + COL[dtype]] = value
+
+    def info(self, ctype=None):
+        '''
+            lecture(ctype 이 None) 또는 실습/과제/대회의 Info dict
+        '''
+        return self._infoDict(self.lecture if ctype is None else self.types[ctype])
+
+    def contestInfos(self):
+        '''
+            {contest id: contest 의 Info dict}
+        '''
+        return {cid: self._infoDict(cnode) for tnode in self.types.values() for cid, cnode in tnode.children.items()}
+
+    def _infoDict(self, node):
+        base = node.row * WIDTH
+        data = dict()
+        for index, dtype in enumerate(FIELDS):
+            value = self.cols[base + index]
+            if index in BOOLEAN_COLS:
+                data[dtype] = bool(value)
+            elif index in FLOAT_COLS:
+                data[dtype] = value if value else 0
+            else:
+                data[dtype] = int(value) if value.is_integer() else value
+        return data
+
+    def _loadInfo(self, node, data):
+        base = node.row * WIDTH
+        for index, dtype in enumerate(FIELDS):
+            self.cols[base + index] = float(data.get(dtype) or 0)
+
+    '''
+        부모 node 에 더해지는 값, 공개되지 않은 node 는 더하지 않는다
+    '''
+    def _contribution(self, node):
+        base = node.row * WIDTH
+        cols = self.cols
+        if not cols[base + COL[DataType.ISVISIBLE]]:
+            return NO_CONTRIBUTION
+        return (cols[base + COL[DataType.POINT]], cols[base + COL[DataType.NUMOFTOTALPROBLEMS]],
+                cols[base + COL[DataType.SCORE]], cols[base + COL[DataType.NUMOFTOTALSOLVEDPROBLEMS]],
+                cols[base + COL[DataType.NUMOFTOTALSUBPROBLEMS]], 1,
+                1 if cols[base + COL[DataType.ISSUBMITTED]] else 0, 1 if cols[base + COL[DataType.ISPASSED]] else 0)
+
+    def _derive(self, node):
+        base = node.row * WIDTH
+        cols = self.cols
+        contents = cols[base + COL[DataType.NUMOFCONTENTS]]
+        point = cols[base + COL[DataType.POINT]]
+        total = cols[base + COL[DataType.NUMOFTOTALPROBLEMS]]
+        cols[base + COL[DataType.ISSUBMITTED]] = 1 if cols[base + COL[DataType.NUMOFSUBCONTENTS]] else 0
+        cols[base + COL[DataType.ISPASSED]] = 1 if contents and cols[base + COL[DataType.NUMOFSOLVEDCONTENTS]] == contents else 0
+        cols[base + COL[DataType.AVERAGE]] = round(cols[base + COL[DataType.SCORE]] * 100 / point, 2) if point else 0
+        cols[base + COL[DataType.PROGRESS]] = round(cols[base + COL[DataType.NUMOFTOTALSUBPROBLEMS]] / total * 100, 2) if total else 0
+
+    '''
+        자식 node 의 값이 before 에서 after 로 바뀌었을 때 부모 쪽으로 차이만 반영한다
+    '''
+    def _propagate(self, parent, before, after):
+        while parent is not None and before != after:
+            parentBefore = self._contribution(parent)
+            base = parent.row * WIDTH
+            for col, old, new in zip(TARGET_COLS, before, after):
+                self.cols[base + col] += new - old
+            self._derive(parent)
+            before, after = parentBefore, self._contribution(parent)
+            parent = parent.parent
+
+    def _update(self, node, **values):
+        before = self._contribution(node)
+        for dtype, value in values.items():
+            self.set(node, getattr(DataType, dtype), value)
+        self._propagate(node.parent, before, self._contribution(node))
+
+    def _detach(self, node):
+        self._update(node, ISVISIBLE=0)
+        node.parent.children.pop(node.id)
+
+    def _attach(self, node, parent, visible):
+        node.parent = parent
+        parent.children[node.id] = node
+        self._update(node, ISVISIBLE=1 if visible else 0)
+
+    def typeSelector(self, dbtype):
+        return dbtype if dbtype in self.types else None
+
+    def findContest(self, contest):
+        ctype = self.typeSelector(contest.lecture_contest_type)
+        if ctype is None:
+            return None
+        return self.types[ctype].children.get(contest.id)
+
+    def migrateProblem(self, problem):
+        contest = problem.contest
+        ctype = self.typeSelector(contest.lecture_contest_type)
+        if ctype is None:
+            return
+        cnode = self.types[ctype].children.get(contest.id)
+        if cnode is None:
+            cnode = self._newNode(CONTEST, contest.id, self.types[ctype])
+            cnode.title = contest.title
+            cnode.contestType = ctype
+            self._update(cnode, ISVISIBLE=1 if contest.visible else 0)
+
+        # 공개되지 않은 문제는 추가, 수정하지 않는다
+        if problem.visible is not True:
+            return
+        pnode = cnode.children.get(problem.id)
+        if pnode is None:
+            pnode = self._newNode(PROBLEM, problem.id, cnode)
+            cnode.solveCount += 1
+        self._update(pnode, POINT=problem.total_score, ISVISIBLE=1, NUMOFCONTENTS=1, NUMOFTOTALPROBLEMS=1)
+
+    def deleteProblem(self, problem):
+        cnode = self.findContest(problem.contest)
+        if cnode is not None and problem.id in cnode.children:
+            self._detach(cnode.children[problem.id])
+
+    def migrateContest(self, contest):
+        ctype = self.typeSelector(contest.lecture_contest_type)
+        if ctype is None:
+            return
+        cnode = self.types[ctype].children.get(contest.id)
+        if cnode is None:
+            # 실습/과제/대회 분류가 바뀐 경우 기존 위치에서 옮긴다
+            for other in self.types.values():
+                if contest.id in other.children:
+                    cnode = other.children[contest.id]
+                    self._detach(cnode)
+                    self._attach(cnode, self.types[ctype], contest.visible)
+                    break
+            else:
+                return
+        cnode.title = contest.title
+        cnode.contestType = ctype
+        self._update(cnode, ISVISIBLE=1 if contest.visible else 0)
+
+    def deleteContest(self, contest):
+        cnode = self.findContest(contest)
+        if cnode is not None:
+            self._detach(cnode)
+
+    def associateSubmission(self, submission):
+        contest = submission.contest
+        if contest is None:
+            return
+        cnode = self.findContest(contest)
+        pnode = cnode.children.get(submission.problem_id) if cnode is not None else None
+        if pnode is None:
+            return
+
+        values = dict()
+        if submission.result == JudgeStatus.ACCEPTED or submission.result == JudgeStatus.PARTIALLY_ACCEPTED:
+            score = 0
+            if submission.info:
+                for jsondata in submission.info["data"]:
+                    score += jsondata["score"]
+            values.update(SCORE=score, ISPASSED=1, NUMOFSOLVEDCONTENTS=1, NUMOFTOTALSOLVEDPROBLEMS=1)
+        else:
+            values.update(SCORE=0, ISPASSED=0, NUMOFSOLVEDCONTENTS=0, NUMOFTOTALSOLVEDPROBLEMS=0)
+        if not self.get(pnode, DataType.ISSUBMITTED):
+            values.update(NUMOFTOTALSUBPROBLEMS=1, NUMOFSUBCONTENTS=1, ISSUBMITTED=1)
+        self._update(pnode, **values)
+
+    def nodes(self):
+        '''
+            compact 형식의 row 순서: lecture, 실습/과제/대회, 이후 contest 마다 contest 와 그 problem 들
+        '''
+        yield self.lecture
+        yield from self.types.values()
+        for tnode in self.types.values():
+            for cnode in tnode.children.values():
+                yield cnode
+                yield from cnode.children.values()
+
+    def cleanDataForScorebard(self):
+        clearCols = [COL[dtype] for dtype in DataType.ScoreBoardClearList]
+        for node in self.nodes():
+            base = node.row * WIDTH
+            for col in clearCols:
+                self.cols[base + col] = 0
+            if node.kind == CONTEST:
+                node.isSubmitted = False
+                node.solveCount = len(node.children)
+
+    '''
+        저장된 값과 관계없이 problem 값으로부터 모든 합계를 다시 계산한다
+    '''
+    def recalculate(self):
+        def sumChildren(node):
+            base = node.row * WIDTH
+            for col in TARGET_COLS:
+                self.cols[base + col] = 0
+            for child in node.children.values():
+                if child.kind != PROBLEM:
+                    sumChildren(child)
+                for col, value in zip(TARGET_COLS, self._contribution(child)):
+                    self.cols[base + col] += value
+            self._derive(node)
+        sumChildren(self.lecture)
+
+    def toDict(self):
+        '''
+            lecDispatcher.toDict 와 같은 dict 형식
+        '''
+        CASdict = dict()
+        for ctype, tnode in self.types.items():
+            contsdict = dict()
+            for cid, cnode in tnode.children.items():
+                probsdict = {pid: {LectureDictionaryKeys.INFO: self._infoDict(pnode)}
+                             for pid, pnode in cnode.children.items()}
+                contsdict[cid] = {LectureDictionaryKeys.CONTEST_TITLE: cnode.title,
+                                  LectureDictionaryKeys.INFO: self._infoDict(cnode),
+                                  LectureDictionaryKeys.CONTEST_TYPE: cnode.contestType,
+                                  LectureDictionaryKeys.CONTEST_SOLVE_CNT: cnode.solveCount,
+                                  LectureDictionaryKeys.CONTEST_IS_SUBMIT: cnode.isSubmitted,
+                                  LectureDictionaryKeys.PROBLEMS: probsdict}
+            CASdict[ctype] = {LectureDictionaryKeys.INFO: self._infoDict(tnode),
+                              LectureDictionaryKeys.CONTESTS: contsdict}
+        return {LectureDictionaryKeys.INFO: self._infoDict(self.lecture),
+                LectureDictionaryKeys.CONTESTANALYSIS: CASdict}
+
+    @classmethod
+    def fromDict(cls, dicdata):
+        '''
+            lecDispatcher.toDict 형식의 dict 에서 만든다, 저장된 합계는 다시 계산하지 않고 그대로 쓴다
+        '''
+        tree = cls()
+        if not dicdata:
+            return tree
+        tree._loadInfo(tree.lecture, dicdata[LectureDictionaryKeys.INFO])
+        for ctype, dicContA in dicdata[LectureDictionaryKeys.CONTESTANALYSIS].items():
+            tnode = tree.types[ctype]
+            tree._loadInfo(tnode, dicContA[LectureDictionaryKeys.INFO])
+            for contestkey, contDict in dicContA[LectureDictionaryKeys.CONTESTS].items():
+                cnode = tree._newNode(CONTEST, int(contestkey), tnode)
+                cnode.title = contDict[LectureDictionaryKeys.CONTEST_TITLE]
+                cnode.contestType = contDict[LectureDictionaryKeys.CONTEST_TYPE]
+                cnode.solveCount = contDict[LectureDictionaryKeys.CONTEST_SOLVE_CNT]
+                cnode.isSubmitted = contDict[LectureDictionaryKeys.CONTEST_IS_SUBMIT]
+                tree._loadInfo(cnode, contDict[LectureDictionaryKeys.INFO])
+                for probkey, probDict in contDict[LectureDictionaryKeys.PROBLEMS].items():
+                    tree._loadInfo(tree._newNode(PROBLEM, int(probkey), cnode), probDict[LectureDictionaryKeys.INFO])
+        return tree
+
+    @staticmethod
+    def isCompact(score):
+        return isinstance(score, dict) and score.get(VERSION_KEY) == SCORE_TREE_VERSION
+
+    def dump(self):
+        '''
+            signup_class.score 에 저장할 compact dict, 삭제된 node 의 row 는 여기서 빠진다
+        '''
+        typeIndex = {ctype: index for index, ctype in enumerate(self.types)}
+        cols = array("d")
+        contests = []
+        for node in self.nodes():
+            base = node.row * WIDTH
+            cols.extend(self.cols[base:base + WIDTH])
+            if node.kind == CONTEST:
+                contests.append([typeIndex[node.parent.id], node.id, node.title, node.contestType, node.solveCount,
+                                 node.isSubmitted, list(node.children.keys())])
+        if sys.byteorder == "big":
+            cols.byteswap()
+        return {VERSION_KEY: SCORE_TREE_VERSION,
+                "contests": contests,
+                "cols": base64.b64encode(zlib.compress(cols.tobytes())).decode("ascii")}
+
+    @classmethod
+    def load(cls, score):
+        '''
+            signup_class.score 를 읽는다, compact 형식과 이전 dict 형식 모두 읽을 수 있다
+        '''
+        if not cls.isCompact(score):
+            return cls.fromDict(score)
+
+        cols = array("d")
+        cols.frombytes(zlib.decompress(base64.b64decode(score["cols"])))
+        if sys.byteorder == "big":
+            cols.byteswap()
+
+        tree = cls()
+        types = list(tree.types.values())
+        for index, cid, title, contestType, solveCount, isSubmitted, problemIds in score["contests"]:
+            cnode = tree._newNode(CONTEST, cid, types[index])
+            cnode.title = title
+            cnode.contestType = contestType
+            cnode.solveCount = solveCount
+            cnode.isSubmitted = isSubmitted
+            for pid in problemIds:
+                tree._newNode(PROBLEM, pid, cnode)
+        tree.cols = cols
+        return tree
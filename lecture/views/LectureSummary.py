@@ -0,0 +1,109 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+
+from contest.models import Contest
+from lecture.models import LectureScoreSummary, ContestScoreSummary
+from lecture.views.LectureAnalysis import DataType, ContestType
+
+'''
+    ScoreTree(signup_class.score) 에서 LectureScoreSummary / ContestScoreSummary 에 저장할 값을 뽑는다
+    성적표 조회는 score 를 다시 읽지 않고 이 표만 조회한다.
+'''
+
+
+def lectureSummaryValues(tree):
+    info = tree.info()
+    practice = tree.info(ContestType.PRACTICE)
+    assign = tree.info(ContestType.ASSIGN)
+    return {"total_practice": practice[DataType.NUMOFCONTENTS],
+            "sub_practice": practice[DataType.NUMOFSUBCONTENTS],
+            "solve_practice": practice[DataType.NUMOFSOLVEDCONTENTS],
+            "total_assign": assign[DataType.NUMOFCONTENTS],
+            "sub_assign": assign[DataType.NUMOFSUBCONTENTS],
+            "solve_assign": assign[DataType.NUMOFSOLVEDCONTENTS],
+            "try_problem": info[DataType.NUMOFTOTALSUBPROBLEMS],
+            "solve_problem": info[DataType.NUMOFTOTALSOLVEDPROBLEMS],
+            "total_problem": info[DataType.NUMOFTOTALPROBLEMS],
+            "total_score": int(info[DataType.SCORE]),
+            "max_score": int(info[DataType.POINT]),
+            "avg_score": info[DataType.AVERAGE],
+            "progress": info[DataType.PROGRESS]}
+
+
+def contestSummaryValues(info):
+    return {"total_problem": info[DataType.NUMOFTOTALPROBLEMS],
+            "sub_problem": info[DataType.NUMOFTOTALSUBPROBLEMS],
+            "solve_problem": info[DataType.NUMOFTOTALSOLVEDPROBLEMS],
+            "score": int(info[DataType.SCORE]),
+            "max_score": int(info[DataType.POINT]),
+            "avg_score": info[DataType.AVERAGE],
+            "progress": info[DataType.PROGRESS],
+            "is_submitted": info[DataType.ISSUBMITTED],
+            "is_passed": info[DataType.ISPASSED]}
+
+
+def saveSummary(signup, tree, contest_ids=()):
+    '''
+        한 학생의 summary 갱신 (제출 반영 시)
+
+        @param signup : signup_class
+        @param tree : signup.score 의 ScoreTree
+        @param contest_ids : 값이 바뀐 contest id 목록
+    '''
+    LectureScoreSummary.objects.update_or_create(
+        signup=signup, defaults=dict(lecture_id=signup.lecture_id, user_id=signup.user_id, **lectureSummaryValues(tree)))
+    contestInfos = tree.contestInfos()
+    for cid in contest_ids:
+        if cid in contestInfos:
+            ContestScoreSummary.objects.update_or_create(
+                signup=signup, contest_id=cid,
+                defaults=dict(user_id=signup.user_id, **contestSummaryValues(contestInfos[cid])))
+        else:
+            ContestScoreSummary.objects.filter(signup=signup, contest_id=cid).delete()
+
+
+def bulkSaveSummary(pairs):
+    '''
+        여러 학생의 summary 를 한 번에 다시 만든다 (LectureBatch, 재계산 시)
+
+        @param pairs : [(signup_class, ScoreTree), ...]
+    '''
+    if not pairs:
+        return
+    signupIds = [signup.id for signup, _ in pairs]
+    contestInfos = [(signup, tree.contestInfos()) for signup, tree in pairs]
+    # 삭제된 contest 가 score 에 남아 있을 수 있으므로 존재하는 contest 만 저장한다
+    existing = set(Contest.objects.filter(id__in={cid for _, infos in contestInfos for cid in infos})
+                   .values_list("id", flat=True))
+    with transaction.atomic():
+        LectureScoreSummary.objects.filter(signup_id__in=signupIds).delete()
+        ContestScoreSummary.objects.filter(signup_id__in=signupIds).delete()
+        LectureScoreSummary.objects.bulk_create(
+            [LectureScoreSummary(signup_id=signup.id, lecture_id=signup.lecture_id, user_id=signup.user_id,
+                                 **lectureSummaryValues(tree)) for signup, tree in pairs])
+        ContestScoreSummary.objects.bulk_create(
+            [ContestScoreSummary(signup_id=signup.id, contest_id=cid, user_id=signup.user_id, **contestSummaryValues(info))
+             for signup, infos in contestInfos for cid, info in infos.items() if cid in existing])
+
+
+# 성적표 응답(SignupSerializer)의 field 이름 -> LectureScoreSummary 의 column
+SIGNUP_SUMMARY_FIELDS = {"totalPractice": "total_practice", "subPractice": "sub_practice",
+                         "solvePractice": "solve_practice", "totalAssign": "total_assign",
+                         "subAssign": "sub_assign", "solveAssign": "solve_assign",
+                         "tryProblem": "try_problem", "solveProblem": "solve_problem",
+                         "totalProblem": "total_problem", "totalScore": "total_score",
+                         "maxScore": "max_score", "avgScore": "avg_score", "progress": "progress"}
+
+
+def annotateSummary(queryset, order_by=None):
+    '''
+        signup_class queryset 에 LectureScoreSummary 값을 붙인다 (JOIN 한 번), summary 가 없으면 0
+
+        @param order_by : SIGNUP_SUMMARY_FIELDS 의 이름 또는 realname, 앞에 "-" 를 붙이면 내림차순
+    '''
+    queryset = queryset.annotate(**{name: Coalesce(F(f"summary__{column}"), 0)
+                                    for name, column in SIGNUP_SUMMARY_FIELDS.items()})
+    if order_by and order_by.lstrip("-") in SIGNUP_SUMMARY_FIELDS.keys() | {"realname"}:
+        queryset = queryset.order_by(order_by, "id")
+    return queryset
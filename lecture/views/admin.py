@@ -6,14 +6,15 @@ from ipaddress import ip_network
 import dateutil.parser
 from django.http import FileResponse
 
-from account.decorators import ensure_created_by
+from account.decorators import ensure_created_by, admin_role_required
 from problem.models import Problem
 from submission.models import Submission
 from utils.api import APIView, validate_serializer
 from django.db.models import Q, Max
 
-from .LectureAnalysis import lecDispatcher
-from .LectureBuilder import UserBuilder
+from .LectureScoreTree import ScoreTree
+from .LectureSummary import bulkSaveSummary
+from .LectureBuilder import UserBuilder, LectureBatch, BatchStatus
 from contest.models import Contest
 from ..models import Lecture, signup_class, ta_admin_class
 from ..serializers import (CreateLectureSerializer, EditLectureSerializer, LectureAdminSerializer, LectureSerializer, TAAdminSerializer, EditTAuserSerializer, PermitTA, )
@@ -206,7 +207,7 @@ class AdminLectureApplyAPI(APIView):
                     plist = Problem.objects.filter(contest__lecture=lec.lecture_id).prefetch_related('contest')
 
                     # test
-                    LectureInfo = lecDispatcher()
+                    LectureInfo = ScoreTree()
                     for p in plist:
                         LectureInfo.migrateProblem(p)
 
@@ -221,8 +222,9 @@ class AdminLectureApplyAPI(APIView):
                 for submit in sdata:
                     LectureInfo.associateSubmission(submit)
 
-                lec.score = LectureInfo.toDict()
+                lec.score = LectureInfo.dump()
                 lec.save()
+                bulkSaveSummary([(lec, LectureInfo)])
 
                 print("(", cnt, "/", total, ")", lec.lecture_id, lec.id, lec.user.realname, lec.user.username,
                       lec.lecture.title, 'Completedd')
@@ -330,3 +332,25 @@ class WaitStudentAddAPI(APIView):
                             print("no matching user")
 
         return self.success()
+
+
+class LectureScoreProgressAPI(APIView):
+    @admin_role_required
+    def get(self, request):
+        lecture_id = request.GET.get("lecture_id")
+        if not lecture_id:
+            return self.error("Invalid parameter, lecture_id is required")
+        return self.success(LectureBatch.progress(lecture_id))
+
+    # 강의 전체 학생의 score 를 다시 만든다
+    @admin_role_required
+    def post(self, request):
+        from lecture.tasks import lecture_score_task
+        try:
+            lecture = Lecture.objects.get(id=request.data.get("lecture_id"))
+        except Lecture.DoesNotExist:
+            return self.error("no lecture exist")
+        ensure_created_by(lecture, request.user)
+        LectureBatch(lecture.id).setProgress(status=BatchStatus.QUEUED)
+        lecture_score_task.send(lecture.id, None)
+        return self.success()
@@ -57,7 +57,9 @@ LOCAL_APPS = [
 ]
 
 CRONJOBS = [
-    ('0 5 * * *', 'utils.DBTasks.migrateLecture', '>> /mnt/log/cron_log.log')
+    ('0 5 * * *', 'utils.DBTasks.migrateLecture.migrate', '>> /mnt/log/cron_log.log'),
+    # 전체 순위표(Redis)와 rank point 를 DB 와 맞춘다
+    ('*/30 * * * *', 'account.leaderboard.reconcile_leaderboards', '>> /mnt/log/cron_log.log')
 ]
 
 INSTALLED_APPS = VENDOR_APPS + LOCAL_APPS
@@ -133,6 +135,16 @@ STATIC_URL = '/public/'
 AUTH_USER_MODEL = 'account.User'
 
 TEST_CASE_DIR = os.path.join(DATA_DIR, "test_case")
+# test case 다운로드용 zip 캐시, judge server 로 rsync 되지 않도록 TEST_CASE_DIR 밖에 둔다
+TEST_CASE_ARCHIVE_DIR = os.path.join(DATA_DIR, "test_case_archive")
+# 표절 검사 결과 zip 과 작업 디렉터리
+PLAGIARISM_RESULT_DIR = os.path.join(DATA_DIR, "plagiarism")
+# worker 에서 만든 대회 제출 코드 zip
+CONTEST_EXPORT_DIR = os.path.join(DATA_DIR, "contest_export")
+# worker 에서 만든 문제 내보내기 zip
+PROBLEM_EXPORT_DIR = os.path.join(DATA_DIR, "problem_export")
+# 문제 가져오기로 올린 파일, worker 가 문제를 다 만들면 지운다
+PROBLEM_IMPORT_DIR = os.path.join(DATA_DIR, "problem_import")
 LOG_PATH = os.path.join(DATA_DIR, "log")
 
 AVATAR_URI_PREFIX = "/public/avatar"
@@ -251,3 +263,39 @@ RAVEN_CONFIG = {
 }
 
 IP_HEADER = "HTTP_X_REAL_IP"
+
+# 채점 방식: "async" 는 judge_task 로 dramatiq worker 에 넘기고 바로 응답한다.
+# "sync" 는 요청 처리 중에 직접 채점하므로 로컬 디버그 용도로만 사용한다.
+JUDGE_MODE = get_env("JUDGE_MODE", "async")
+
+# judge server 선택 방식: "redis" (lease 기반) 또는 "db" (이전의 select_for_update 방식)
+JUDGE_SCHEDULER = get_env("JUDGE_SCHEDULER", "redis")
+# least_loaded, weighted (cpu_core 비례), sticky (test case 별 고정) 중 하나
+JUDGE_SCHEDULE_POLICY = get_env("JUDGE_SCHEDULE_POLICY", "least_loaded")
+# lease 만료 시간(초), 채점 도중 worker 가 죽어도 이 시간이 지나면 slot 이 반환된다
+JUDGE_LEASE_TTL = int(get_env("JUDGE_LEASE_TTL", "600"))
+# 한 사용자가 동시에 채점받을 수 있는 제출 수, 넘으면 대기 queue 로 보낸다
+JUDGE_USER_INFLIGHT_LIMIT = int(get_env("JUDGE_USER_INFLIGHT_LIMIT", "2"))
+
+# 문제/대회 수정 시 학생 score 갱신 방식: "async" 는 lecture_score_task 로 worker 에서 처리, "sync" 는 요청 중에 처리
+LECTURE_SCORE_MODE = get_env("LECTURE_SCORE_MODE", "async")
+
+# test case 다운로드 zip 캐시의 최대 크기(MB), 넘으면 오래 사용하지 않은 것부터 지운다
+TEST_CASE_ARCHIVE_CACHE_SIZE = int(get_env("TEST_CASE_ARCHIVE_CACHE_MB", "2048")) * 1024 * 1024
+# "1" 이면 test case 를 올릴 때 worker 에서 다운로드 zip 을 미리 만든다
+TEST_CASE_ARCHIVE_PREBUILD = get_env("TEST_CASE_ARCHIVE_PREBUILD", "0") == "1"
+# nginx 가 zip 을 직접 보내게 할 internal location (예: /internal/test_case_archive), 비어 있으면 django 가 보낸다
+TEST_CASE_ARCHIVE_ACCEL_PREFIX = get_env("TEST_CASE_ARCHIVE_ACCEL_PREFIX", "")
+
+# 표절 검사에서 쌍 점수를 계산하는 process 수
+PLAGIARISM_WORKERS = int(get_env("PLAGIARISM_WORKERS", "4"))
+# 동시에 실행하는 표절 검사 작업 수
+PLAGIARISM_MAX_JOBS = int(get_env("PLAGIARISM_MAX_JOBS", "2"))
+# 대회 제출 코드 다운로드에서 AC 제출이 이보다 많으면 바로 보내지 않고 worker 에서 zip 을 만든다
+CONTEST_EXPORT_STREAM_LIMIT = int(get_env("CONTEST_EXPORT_STREAM_LIMIT", "20000"))
+# 문제 내보내기에서 test case 파일 목록과 압축률을 미리 확인하는 thread 수
+PROBLEM_EXPORT_WORKERS = int(get_env("PROBLEM_EXPORT_WORKERS", "4"))
+# 문제 내보내기 zip 을 지우기 전까지의 시간(초)
+PROBLEM_EXPORT_TTL = int(get_env("PROBLEM_EXPORT_TTL", "3600"))
+# 문제 가져오기에서 여러 문제의 test case 를 동시에 푸는 thread 수
+PROBLEM_IMPORT_WORKERS = int(get_env("PROBLEM_IMPORT_WORKERS", "4"))
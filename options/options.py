@@ -1,14 +1,20 @@
+import copy
 import functools
+import logging
 import os
 import threading
 import time
 
-from django.db import transaction, IntegrityError
+from django.db import connection, transaction, IntegrityError
 
+from utils.cache import cache
+from utils.constants import CacheKey
 from utils.shortcuts import rand_str
 from judge.languages import languages
 from .models import SysOptions as SysOptionsModel
 
+logger = logging.getLogger(__name__)
+
 
 class my_property:
     """
@@ -85,6 +91,8 @@ class my_property:
 
 
 DEFAULT_SHORT_TTL = 2
+# pub/sub 을 구독하고 있을 때의 캐시 시간, 메시지를 놓쳤을 때를 대비한 상한
+OPTIONS_CACHE_MAX_AGE = 60
 
 
 def default_token():
@@ -114,11 +122,114 @@ class OptionDefaultValue:
     submission_list_show_all = True
     smtp_config = {}
     judge_server_token = default_token
-    throttling = {"ip": {"capacity": 100, "fill_rate": 0.1, "default_capacity": 50},
-                  "user": {"capacity": 20, "fill_rate": 0.03, "default_capacity": 10}}
+    throttling = {"ip": {"enabled": False, "capacity": 100, "fill_rate": 0.1, "default_capacity": 50},
+                  "user": {"capacity": 20, "fill_rate": 0.03, "default_capacity": 10},
+                  "contest": {"capacity": 10, "fill_rate": 0.03, "default_capacity": 10}}
     languages = languages
 
 
+class OptionsCache:
+    """
+    프로세스 안의 모든 thread 가 함께 쓰는 SysOptions 캐시
+     - 처음 접근할 때 OptionKeys 전체를 한 번의 query 로 읽는다
+     - 값이 바뀌면 CacheKey.options_invalidate 채널로 알리고, 각 프로세스의 listener thread 가 캐시를 비운다
+     - 구독하지 못하면 DEFAULT_SHORT_TTL 초 동안만 캐시한다
+     - 트랜잭션 안에서 읽은 값은 commit 되지 않았을 수 있으므로 캐시하지 않는다
+    """
+    channel = CacheKey.options_invalidate
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.lock = threading.Lock()
+        self.values = None
+        self.expire_at = 0
+        # invalidate 될 때마다 늘어난다, 읽는 도중에 바뀌었으면 읽은 값을 캐시하지 않는다
+        self.generation = 0
+        self.pid = None
+        self.listener = None
+
+    def get(self, key):
+        value = self.snapshot()[key]
+        # 호출하는 쪽에서 dict 를 고쳐도 (SMTPAPI 등) 캐시는 바뀌지 않도록 복사해서 준다
+        if isinstance(value, (dict, list)):
+            return copy.deepcopy(value)
+        return value
+
+    def snapshot(self):
+        """
+        옵션 값과 미리 계산한 language map, 읽기 전용으로 써야 한다
+        """
+        values = self.values
+        if values is not None and time.time() < self.expire_at and self.pid == os.getpid():
+            return values
+        if connection.in_atomic_block:
+            return self._load()
+        with self.lock:
+            if self.values is None or time.time() >= self.expire_at or self.pid != os.getpid():
+                # fork 된 프로세스에는 부모의 listener thread 가 없다
+                if self.pid != os.getpid():
+                    self.pid = os.getpid()
+                    self.listener = None
+                listening = self._listen()
+                generation = self.generation
+                values = self._load()
+                if generation != self.generation:
+                    return values
+                self.values = values
+                self.expire_at = time.time() + (OPTIONS_CACHE_MAX_AGE if listening else DEFAULT_SHORT_TTL)
+            return self.values
+
+    def _load(self):
+        values = dict(SysOptionsModel.objects.filter(key__in=self.keys).values_list("key", "value"))
+        if len(values) < len(self.keys):
+            _SysOptionsMeta._init_option()
+            values = dict(SysOptionsModel.objects.filter(key__in=self.keys).values_list("key", "value"))
+        languages = values[OptionKeys.languages]
+        values.update({
+            "spj_languages": [item for item in languages if "spj" in item],
+            "language_names": [item["name"] for item in languages],
+            "spj_language_names": [item["name"] for item in languages if "spj" in item],
+            "language_map": {item["name"]: item for item in languages},
+            "spj_language_map": {item["name"]: item for item in languages if "spj" in item},
+        })
+        return values
+
+    def invalidate(self):
+        self.generation += 1
+        self.values = None
+
+    def publish(self):
+        self.invalidate()
+        try:
+            cache.publish(self.channel, "invalidate")
+        except Exception as e:
+            logger.exception(e)
+
+    def _listen(self):
+        if self.listener is not None and self.listener.is_alive():
+            return True
+        try:
+            # 읽기 전에 구독해야 그 사이의 변경을 놓치지 않는다
+            pubsub = cache.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(self.channel)
+        except Exception as e:
+            logger.exception(e)
+            return False
+        self.listener = threading.Thread(target=self._run, args=(pubsub,), name="sys-options-listener", daemon=True)
+        self.listener.start()
+        return True
+
+    def _run(self, pubsub):
+        try:
+            for _ in pubsub.listen():
+                self.invalidate()
+        except Exception as e:
+            logger.exception(e)
+        finally:
+            # 연결이 끊기면 다음 접근에서 다시 구독하고 새로 읽는다
+            self.invalidate()
+
+
 class _SysOptionsMeta(type):
     @classmethod
     def _get_keys(cls):
@@ -138,13 +249,7 @@ class _SysOptionsMeta(type):
 
     @classmethod
     def _get_option(mcs, option_key):
-        try:
-            option = SysOptionsModel.objects.get(key=option_key)
-            value = option.value
-            return value
-        except SysOptionsModel.DoesNotExist:
-            mcs._init_option()
-            return mcs._get_option(option_key)
+        return options_cache.get(option_key)
 
     @classmethod
     def _set_option(mcs, option_key: str, option_value):
@@ -156,6 +261,9 @@ class _SysOptionsMeta(type):
         except SysOptionsModel.DoesNotExist:
             mcs._init_option()
             mcs._set_option(option_key, option_value)
+            return
+        options_cache.invalidate()
+        transaction.on_commit(options_cache.publish)
 
     @classmethod
     def _increment(mcs, option_key):
@@ -168,6 +276,8 @@ class _SysOptionsMeta(type):
         except SysOptionsModel.DoesNotExist:
             mcs._init_option()
             return mcs._increment(option_key)
+        options_cache.invalidate()
+        transaction.on_commit(options_cache.publish)
 
     @classmethod
     def set_options(mcs, options):
@@ -181,7 +291,7 @@ class _SysOptionsMeta(type):
             result[key] = mcs._get_option(key)
         return result
 
-    @my_property(ttl=DEFAULT_SHORT_TTL)
+    @my_property
     def website_base_url(cls):
         return cls._get_option(OptionKeys.website_base_url)
 
@@ -189,7 +299,7 @@ class _SysOptionsMeta(type):
     def website_base_url(cls, value):
         cls._set_option(OptionKeys.website_base_url, value)
 
-    @my_property(ttl=DEFAULT_SHORT_TTL)
+    @my_property
     def website_name(cls):
         return cls._get_option(OptionKeys.website_name)
 
@@ -197,7 +307,7 @@ class _SysOptionsMeta(type):
     def website_name(cls, value):
         cls._set_option(OptionKeys.website_name, value)
 
-    @my_property(ttl=DEFAULT_SHORT_TTL)
+    @my_property
     def website_name_shortcut(cls):
         return cls._get_option(OptionKeys.website_name_shortcut)
 
@@ -205,7 +315,7 @@ class _SysOptionsMeta(type):
     def website_name_shortcut(cls, value):
         cls._set_option(OptionKeys.website_name_shortcut, value)
 
-    @my_property(ttl=DEFAULT_SHORT_TTL)
+    @my_property
     def website_footer(cls):
         return cls._get_option(OptionKeys.website_footer)
 
@@ -221,7 +331,7 @@ class _SysOptionsMeta(type):
     def allow_register(cls, value):
         cls._set_option(OptionKeys.allow_register, value)
 
-    @my_property(ttl=DEFAULT_SHORT_TTL)
+    @my_property
     def submission_list_show_all(cls):
         return cls._get_option(OptionKeys.submission_list_show_all)
 
@@ -253,7 +363,7 @@ class _SysOptionsMeta(type):
     def throttling(cls, value):
         cls._set_option(OptionKeys.throttling, value)
 
-    @my_property(ttl=DEFAULT_SHORT_TTL)
+    @my_property
     def languages(cls):
         return cls._get_option(OptionKeys.languages)
 
@@ -261,21 +371,33 @@ class _SysOptionsMeta(type):
     def languages(cls, value):
         cls._set_option(OptionKeys.languages, value)
 
-    @my_property(ttl=DEFAULT_SHORT_TTL)
+    # 아래는 languages 를 읽을 때 미리 계산해 둔 값이다, 고치지 말고 읽기만 한다
+    @my_property
     def spj_languages(cls):
-        return [item for item in cls.languages if "spj" in item]
+        return options_cache.snapshot()["spj_languages"]
 
-    @my_property(ttl=DEFAULT_SHORT_TTL)
+    @my_property
     def language_names(cls):
-        return [item["name"] for item in cls.languages]
+        return options_cache.snapshot()["language_names"]
 
-    @my_property(ttl=DEFAULT_SHORT_TTL)
+    @my_property
     def spj_language_names(cls):
-        return [item["name"] for item in cls.languages if "spj" in item]
+        return options_cache.snapshot()["spj_language_names"]
+
+    @my_property
+    def language_map(cls):
+        return options_cache.snapshot()["language_map"]
+
+    @my_property
+    def spj_language_map(cls):
+        return options_cache.snapshot()["spj_language_map"]
 
     def reset_languages(cls):
         cls.languages = languages
 
 
+options_cache = OptionsCache(_SysOptionsMeta._get_keys())
+
+
 class SysOptions(metaclass=_SysOptionsMeta):
     pass
@@ -1 +1,44 @@
-# Create your tests here.
+from unittest import mock
+
+from django.test import TransactionTestCase
+
+from utils.constants import CacheKey
+from .options import SysOptions, OptionsCache, options_cache
+
+
+@mock.patch.object(OptionsCache, "_listen", return_value=True)
+@mock.patch("options.options.cache")
+class OptionsCacheTest(TransactionTestCase):
+    def setUp(self):
+        options_cache.invalidate()
+
+    def tearDown(self):
+        options_cache.invalidate()
+
+    def test_load_all_options_in_one_query(self, cache, listen):
+        SysOptions.website_name
+        options_cache.invalidate()
+        with self.assertNumQueries(1):
+            SysOptions.website_name
+            SysOptions.throttling
+            SysOptions.judge_server_token
+            SysOptions.allow_register
+        with self.assertNumQueries(0):
+            SysOptions.smtp_config
+
+    def test_set_option_publishes_invalidation(self, cache, listen):
+        SysOptions.website_name
+        SysOptions.website_name = "new name"
+        cache.publish.assert_called_once_with(CacheKey.options_invalidate, "invalidate")
+        self.assertEqual(SysOptions.website_name, "new name")
+
+    def test_returned_value_does_not_change_cache(self, cache, listen):
+        SysOptions.smtp_config = {"server": "smtp.test.com", "password": "password"}
+        SysOptions.smtp_config.pop("password")
+        self.assertEqual(SysOptions.smtp_config["password"], "password")
+
+    def test_language_map(self, cache, listen):
+        self.assertEqual(list(SysOptions.language_map), SysOptions.language_names)
+        self.assertEqual(list(SysOptions.spj_language_map), SysOptions.spj_language_names)
+        for name, item in SysOptions.spj_language_map.items():
+            self.assertIn("spj", item)
@@ -0,0 +1,158 @@
+import json
+import os
+import time
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from submission.models import JudgeStatus, Submission
+from utils.cache import cache
+from utils.constants import CacheKey
+from utils.shortcuts import rand_str
+from utils.tasks import delete_files
+from .models import Problem
+from .serializers import ExportProblemSerializer
+from .test_case_store import TestCaseStore
+
+PROGRESS_TTL = 24 * 60 * 60
+# 이보다 작은 파일은 압축해도 거의 줄지 않으므로 그대로 저장한다
+STORE_MAX_SIZE = 1024
+# 압축률을 확인할 때 읽는 파일 앞부분의 크기
+SAMPLE_SIZE = 64 * 1024
+# 앞부분을 압축했을 때 이 비율보다 덜 줄면 압축하지 않는다
+DEFLATE_MAX_RATIO = 0.9
+
+
+def choose_compression(path):
+    size = os.path.getsize(path)
+    if size < STORE_MAX_SIZE:
+        return zipfile.ZIP_STORED
+    with open(path, "rb") as f:
+        sample = f.read(SAMPLE_SIZE)
+    if len(zlib.compress(sample, 1)) < len(sample) * DEFLATE_MAX_RATIO:
+        return zipfile.ZIP_DEFLATED
+    return zipfile.ZIP_STORED
+
+
+def test_case_entries(test_case_id, index, store=None):
+    """
+    문제 하나의 test case 파일 목록 [(경로, zip 안의 이름, 압축 방식), ...]
+    """
+    test_case_dir = (store or TestCaseStore()).test_case_dir(test_case_id)
+    with open(os.path.join(test_case_dir, "info"), encoding="utf-8") as f:
+        info = json.load(f)
+    entries = []
+    for item in info["test_cases"].values():
+        names = [item["input_name"]] if info["spj"] else [item["input_name"], item["output_name"]]
+        for name in names:
+            path = os.path.join(test_case_dir, name)
+            entries.append((path, f"{index}/testcase/{name}", choose_compression(path)))
+    return entries
+
+
+def latest_answers(user_id, problems):
+    """
+    {problem.id: [{"language", "code"}, ...]}, 문제의 언어마다 사용자의 가장 최근 AC 제출 하나
+    """
+    answers = {problem.id: {} for problem in problems}
+    rows = (Submission.objects.filter(problem_id__in=answers, user_id=user_id, result=JudgeStatus.ACCEPTED)
+            .order_by("problem_id", "language", "-create_time").distinct("problem_id", "language")
+            .values_list("problem_id", "language", "code"))
+    for problem_id, language, code in rows.iterator():
+        answers[problem_id][language] = code
+    return {problem.id: [{"language": language, "code": answers[problem.id][language]}
+                         for language in problem.languages if language in answers[problem.id]]
+            for problem in problems}
+
+
+class ProblemExportStatus:
+    QUEUED = "queued"
+    RUNNING = "running"
+    FINISHED = "finished"
+    FAILED = "failed"
+
+
+class ProblemExportJob:
+    """
+    문제 내보내기 zip 을 dramatiq worker 에서 PROBLEM_EXPORT_DIR 에 만든다
+     - 답안은 (문제, 언어) 마다 가장 최근 AC 제출을 한 번의 쿼리로 가져온다
+     - 파일마다 크기와 앞부분의 압축률을 보고 압축할지 정한다, 이미 압축된 것 같은 test case 는 그대로 저장한다
+     - zip 에는 한 번에 하나만 쓸 수 있으므로 test case info 읽기와 압축률 확인은 thread 에서 먼저 하고,
+       쓰기는 문제 순서대로 한다
+     - 만든 zip 은 PROBLEM_EXPORT_TTL 뒤에 지운다
+    """
+    def __init__(self, job_id):
+        self.job_id = job_id
+
+    @classmethod
+    def create(cls, user_id, problem_ids):
+        job = cls(rand_str())
+        job.setProgress(status=ProblemExportStatus.QUEUED, user_id=user_id, done=0, total=len(problem_ids),
+                        error="", problem_ids=",".join(map(str, problem_ids)))
+        return job
+
+    @staticmethod
+    def progressKey(job_id):
+        return f"{CacheKey.problem_export_job}:{job_id}"
+
+    @staticmethod
+    def exportPath(job_id):
+        return os.path.join(settings.PROBLEM_EXPORT_DIR, f"{job_id}.zip")
+
+    @classmethod
+    def progress(cls, job_id):
+        data = {k.decode("utf-8"): v.decode("utf-8") for k, v in cache.hgetall(cls.progressKey(job_id)).items()}
+        for field in ("user_id", "total", "done"):
+            if field in data:
+                data[field] = int(data[field])
+        data["job_id"] = job_id
+        return data
+
+    def setProgress(self, **kwargs):
+        key = self.progressKey(self.job_id)
+        pipe = cache.pipeline()
+        pipe.hmset(key, dict(kwargs, updated_at=time.time()))
+        pipe.expire(key, PROGRESS_TTL)
+        pipe.execute()
+
+    def start(self):
+        from .tasks import export_problems_task
+        export_problems_task.send(self.job_id)
+
+    def write(self, zip_file, user_id, problem_ids):
+        problems = list(Problem.objects.filter(id__in=problem_ids).prefetch_related("tags"))
+        answers = latest_answers(user_id, problems)
+        with ThreadPoolExecutor(max_workers=settings.PROBLEM_EXPORT_WORKERS) as executor:
+            test_cases = executor.map(test_case_entries, [problem.test_case_id for problem in problems],
+                                      range(1, len(problems) + 1))
+            for index, (problem, entries) in enumerate(zip(problems, test_cases), 1):
+                info = ExportProblemSerializer(problem).data
+                info["answers"] = answers[problem.id]
+                zip_file.writestr(f"{index}/problem.json", json.dumps(info, indent=4),
+                                  compress_type=zipfile.ZIP_DEFLATED)
+                for path, arcname, compress_type in entries:
+                    zip_file.write(path, arcname, compress_type=compress_type)
+                self.setProgress(done=index)
+
+    def run(self):
+        data = self.progress(self.job_id)
+        if "problem_ids" not in data:
+            return
+        os.makedirs(settings.PROBLEM_EXPORT_DIR, exist_ok=True)
+        path = self.exportPath(self.job_id)
+        temp = f"{path}.tmp"
+        try:
+            self.setProgress(status=ProblemExportStatus.RUNNING, done=0)
+            with zipfile.ZipFile(temp, "w") as zip_file:
+                self.write(zip_file, data["user_id"], [int(item) for item in data["problem_ids"].split(",")])
+            os.replace(temp, path)
+            self.setProgress(status=ProblemExportStatus.FINISHED)
+        except Exception as e:
+            self.setProgress(status=ProblemExportStatus.FAILED, error=str(e))
+            raise
+        finally:
+            if os.path.exists(temp):
+                os.remove(temp)
+        delete_files.send_with_options(args=(path,), delay=settings.PROBLEM_EXPORT_TTL * 1000)
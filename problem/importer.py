@@ -0,0 +1,411 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import transaction
+
+from fps.parser import FPSHelper, FPSStreamParser
+from options.options import SysOptions
+from utils.api import APIError
+from utils.cache import cache
+from utils.constants import CacheKey, Difficulty
+from utils.shortcuts import rand_str, natural_sort_key
+from .models import Problem, ProblemRuleType, ProblemTag
+from .serializers import FPSProblemSerializer, ImportProblemSerializer
+from .test_case_store import TestCaseStore
+from .utils import TEMPLATE_BASE, build_problem_template
+
+PROGRESS_TTL = 24 * 60 * 60
+
+
+class TestCaseZipProcessor(object):
+    def process_zip(self, uploaded_zip_file, spj, dir=""):
+        try:
+            zip_file = zipfile.ZipFile(uploaded_zip_file, "r")
+        except zipfile.BadZipFile:
+            raise APIError("Bad zip file")
+        return self.extract_zip(zip_file, set(zip_file.namelist()), spj, dir)
+
+    def extract_zip(self, zip_file, name_list, spj, dir=""):
+        """
+        이미 연 zip 에서 dir 아래의 test case 를 푼다, 여러 문제가 든 zip 을 한 번만 열고 문제마다 부른다
+        :param name_list: zip_file.namelist() 의 set
+        """
+        test_case_list = self.filter_name_list(name_list, spj=spj, dir=dir)
+        if not test_case_list:
+            raise APIError("Empty file")
+
+        store = TestCaseStore()
+        test_case_id, test_case_dir = store.create_dir()
+
+        try:
+            # 파일을 통째로 메모리에 올리지 않고 chunk 단위로 CRLF 변환, 크기, md5 를 계산한다
+            extracted = store.extract(zip_file, [(f"{dir}{item}", item) for item in test_case_list], test_case_dir,
+                                      stripped_md5=lambda name: name.endswith(".out"))
+            size_cache = {item: size for item, (size, _) in extracted.items()}
+            md5_cache = {item: md5 for item, (_, md5) in extracted.items() if md5}
+            test_case_info = {"spj": spj, "test_cases": {}}
+
+            info = []
+
+            if spj:
+                for index, item in enumerate(test_case_list):
+                    data = {"input_name": item, "input_size": size_cache[item]}
+                    info.append(data)
+                    test_case_info["test_cases"][str(index + 1)] = data
+            else:
+                # ["1.in", "1.out", "2.in", "2.out"] => [("1.in", "1.out"), ("2.in", "2.out")]
+                test_case_list = zip(*[test_case_list[i::2] for i in range(2)])
+                for index, item in enumerate(test_case_list):
+                    data = {"stripped_output_md5": md5_cache[item[1]],
+                            "input_size": size_cache[item[0]],
+                            "output_size": size_cache[item[1]],
+                            "input_name": item[0],
+                            "output_name": item[1]}
+                    info.append(data)
+                    test_case_info["test_cases"][str(index + 1)] = data
+
+            store.write(test_case_dir, "info", json.dumps(test_case_info, indent=4).encode("utf-8"))
+
+            for item in os.listdir(test_case_dir):
+                os.chmod(os.path.join(test_case_dir, item), 0o640)
+        except Exception:
+            # 일부만 풀린 test case 디렉터리를 남기지 않는다
+            shutil.rmtree(test_case_dir, ignore_errors=True)
+            raise
+
+        return info, test_case_id
+
+    def filter_name_list(self, name_list, spj, dir=""):
+        ret = []
+        prefix = 1
+        if spj:
+            while True:
+                in_name = f"{prefix}.in"
+                if f"{dir}{in_name}" in name_list:
+                    ret.append(in_name)
+                    prefix += 1
+                    continue
+                else:
+                    return sorted(ret, key=natural_sort_key)
+        else:
+            while True:
+                in_name = f"{prefix}.in"
+                out_name = f"{prefix}.out"
+                if f"{dir}{in_name}" in name_list and f"{dir}{out_name}" in name_list:
+                    ret.append(in_name)
+                    ret.append(out_name)
+                    prefix += 1
+                    continue
+                else:
+                    return sorted(ret, key=natural_sort_key)
+
+
+class ProblemImporter:
+    """
+    내보내기 zip 이나 FPS 파일의 문제를 한 번에 만든다
+     - zip 은 한 번만 열고, 문제마다 test case 를 PROBLEM_IMPORT_WORKERS 개의 thread 에서 동시에 푼다
+     - tag 는 한 번의 쿼리로 찾고 없는 것만 bulk_create 한다, 문제와 문제-tag 관계도 bulk_create 한다
+     - 잘못된 문제는 건너뛰고 errors 에 {"index", "error"} 로 남긴다, 나머지 문제는 그대로 만든다
+     - thread 에서는 DB 를 쓰지 않는다
+    """
+    problem_json_re = re.compile(r"^(\d+)/problem\.json$")
+
+    def __init__(self, creator_id, progress=None):
+        self.creator_id = creator_id
+        self.languages = SysOptions.language_names
+        self.errors = []
+        self.progress = progress or (lambda **kwargs: None)
+
+    def error(self, index, message):
+        self.errors.append({"index": index, "error": message})
+
+    def _map(self, func, items, total=None):
+        self.progress(stage="extracting", done=0, total=len(items) if total is None else total)
+        results = []
+        with ThreadPoolExecutor(max_workers=settings.PROBLEM_IMPORT_WORKERS) as executor:
+            for done, result in enumerate(executor.map(func, items), 1):
+                results.append(result)
+                self.progress(done=done)
+        return results
+
+    def read_zip(self, zip_file, name_list):
+        """
+        [(index, problem_info), ...], problem.json 이 잘못된 문제는 errors 에 남긴다
+        """
+        language_map = SysOptions.language_map
+        indexes = sorted(int(match.group(1)) for match in map(self.problem_json_re.match, name_list) if match)
+        items = []
+        for index in indexes:
+            try:
+                with zip_file.open(f"{index}/problem.json") as f:
+                    problem_info = json.load(f)
+            except ValueError as e:
+                self.error(index, f"Invalid problem.json, error is {e}")
+                continue
+            serializer = ImportProblemSerializer(data=problem_info)
+            if not serializer.is_valid():
+                self.error(index, f"Invalid problem format, error is {serializer.errors}")
+                continue
+            problem_info = serializer.data
+            unsupported = [item for item in problem_info["template"] if item not in language_map]
+            if unsupported:
+                self.error(index, f"Unsupported language {unsupported[0]}")
+                continue
+            items.append((index, problem_info))
+        return items
+
+    def zip_problem(self, problem_info, test_case_id):
+        spj = problem_info["spj"] is not None
+        test_case_score = problem_info["test_case_score"] or []
+        template = {k: build_problem_template(v["prepend"], v["template"], v["append"])
+                    for k, v in problem_info["template"].items()}
+        return Problem(_id=problem_info["display_id"][:24],
+                       title=problem_info["title"],
+                       description=problem_info["description"]["value"],
+                       input_description=problem_info["input_description"]["value"],
+                       output_description=problem_info["output_description"]["value"],
+                       hint=problem_info["hint"]["value"],
+                       test_case_score=test_case_score,
+                       time_limit=problem_info["time_limit"],
+                       memory_limit=problem_info["memory_limit"],
+                       samples=problem_info["samples"],
+                       template=template,
+                       rule_type=problem_info["rule_type"],
+                       source=problem_info["source"],
+                       spj=spj,
+                       spj_code=problem_info["spj"]["code"] if spj else None,
+                       spj_language=problem_info["spj"]["language"] if spj else None,
+                       spj_version=rand_str(8) if spj else "",
+                       languages=self.languages,
+                       created_by_id=self.creator_id,
+                       visible=False,
+                       difficulty=Difficulty.MID,
+                       total_score=sum(item["score"] for item in test_case_score)
+                       if problem_info["rule_type"] == ProblemRuleType.OI else 0,
+                       test_case_id=test_case_id)
+
+    def import_zip(self, path):
+        """
+        :return: 만든 문제 목록
+        """
+        try:
+            zip_file = zipfile.ZipFile(path, "r")
+        except zipfile.BadZipFile:
+            raise APIError("Bad zip file")
+        with zip_file:
+            name_list = set(zip_file.namelist())
+            items = self.read_zip(zip_file, name_list)
+            processor = TestCaseZipProcessor()
+
+            def extract(item):
+                index, problem_info = item
+                try:
+                    return processor.extract_zip(zip_file, name_list, spj=problem_info["spj"] is not None,
+                                                 dir=f"{index}/testcase/")[1]
+                except APIError as e:
+                    self.error(index, e.msg)
+                except Exception as e:
+                    # 깨진 파일(BadZipFile, CRC 오류) 등은 그 문제만 건너뛴다, 푼 디렉터리는 extract_zip 이 지운다
+                    self.error(index, f"Failed to extract test cases, error is {e!r}")
+
+            test_case_ids = self._map(extract, items)
+        return self.create([(self.zip_problem(problem_info, test_case_id), problem_info["tags"])
+                            for (_, problem_info), test_case_id in zip(items, test_case_ids) if test_case_id])
+
+    def fps_problem(self, problem_data):
+        if problem_data["time_limit"]["unit"] == "ms":
+            time_limit = problem_data["time_limit"]["value"]
+        else:
+            time_limit = problem_data["time_limit"]["value"] * 1000
+        template = {}
+        prepend = {}
+        append = {}
+        for t in problem_data["prepend"]:
+            prepend[t["language"]] = t["code"]
+        for t in problem_data["append"]:
+            append[t["language"]] = t["code"]
+        for t in problem_data["template"]:
+            our_lang = lang = t["language"]
+            if lang == "Python":
+                our_lang = "Python3"
+            template[our_lang] = TEMPLATE_BASE.format(prepend.get(lang, ""), t["code"], append.get(lang, ""))
+        spj = problem_data["spj"] is not None
+        return Problem(_id=f"fps-{rand_str(4)}",
+                       title=problem_data["title"],
+                       description=problem_data["description"],
+                       input_description=problem_data["input"],
+                       output_description=problem_data["output"],
+                       hint=problem_data["hint"],
+                       test_case_score=problem_data["test_case_score"],
+                       time_limit=time_limit,
+                       memory_limit=problem_data["memory_limit"]["value"],
+                       samples=problem_data["samples"],
+                       template=template,
+                       rule_type=ProblemRuleType.ACM,
+                       source=problem_data.get("source", ""),
+                       spj=spj,
+                       spj_code=problem_data["spj"]["code"] if spj else None,
+                       spj_language=problem_data["spj"]["language"] if spj else None,
+                       spj_version=rand_str(8) if spj else "",
+                       visible=False,
+                       languages=self.languages,
+                       created_by_id=self.creator_id,
+                       difficulty=Difficulty.MID,
+                       test_case_id=problem_data["test_case_id"])
+
+    def import_fps(self, path):
+        """
+        :return: 만든 문제 목록
+        """
+        store = TestCaseStore()
+        helper = FPSHelper()
+
+        def save(item):
+            index, problem = item
+            test_case_id, test_case_dir = store.create_dir()
+            try:
+                score = []
+                for case in helper.save_test_case(problem, test_case_dir)["test_cases"].values():
+                    score.append({"score": 0, "input_name": case["input_name"],
+                                  "output_name": case.get("output_name")})
+                problem_data = helper.save_image(problem, settings.UPLOAD_DIR, settings.UPLOAD_PREFIX)
+                s = FPSProblemSerializer(data=problem_data)
+                if not s.is_valid():
+                    raise ValueError(f"Parse FPS file error: {s.errors}")
+            except (OSError, TypeError, ValueError) as e:
+                shutil.rmtree(test_case_dir, ignore_errors=True)
+                self.error(index, str(e))
+                return None
+            problem_data = s.data
+            problem_data["test_case_id"] = test_case_id
+            problem_data["test_case_score"] = score
+            return problem_data
+
+        # test case 와 이미지는 파싱하면서 spool 디렉터리에 쓰고, 문제마다 test case 디렉터리와 UPLOAD_DIR 로 옮긴다
+        os.makedirs(settings.PROBLEM_IMPORT_DIR, exist_ok=True)
+        spool_dir = tempfile.mkdtemp(dir=settings.PROBLEM_IMPORT_DIR)
+        try:
+            # 문제 수는 파일을 다 읽어야 알 수 있으므로 total 은 0 으로 둔다
+            problems = self._map(save, enumerate(FPSStreamParser(path, spool_dir).parse(), 1), total=0)
+        finally:
+            shutil.rmtree(spool_dir, ignore_errors=True)
+        return self.create([(self.fps_problem(problem_data), []) for problem_data in problems if problem_data])
+
+    def create(self, problems):
+        """
+        :param problems: [(저장하지 않은 Problem, [tag 이름, ...]), ...]
+        """
+        self.progress(stage="saving")
+        if not problems:
+            return []
+        names = {name for _, tag_names in problems for name in tag_names}
+        try:
+            with transaction.atomic():
+                tags = {}
+                for tag in ProblemTag.objects.filter(name__in=names).order_by("id"):
+                    tags.setdefault(tag.name, tag)
+                missing = [ProblemTag(name=name) for name in names if name not in tags]
+                ProblemTag.objects.bulk_create(missing)
+                tags.update({tag.name: tag for tag in missing})
+
+                created = Problem.objects.bulk_create([problem for problem, _ in problems])
+                through = Problem.tags.through
+                through.objects.bulk_create([through(problem_id=problem.id, problemtag_id=tags[name].id)
+                                             for problem, (_, tag_names) in zip(created, problems)
+                                             for name in dict.fromkeys(tag_names)])
+        except Exception:
+            # 문제를 만들지 못했으므로 풀어 둔 test case 도 지운다
+            store = TestCaseStore()
+            for problem, _ in problems:
+                shutil.rmtree(store.test_case_dir(problem.test_case_id), ignore_errors=True)
+            raise
+        return created
+
+
+class ProblemImportStatus:
+    QUEUED = "queued"
+    RUNNING = "running"
+    FINISHED = "finished"
+    FAILED = "failed"
+
+
+class ProblemImportJob:
+    """
+    올린 파일을 PROBLEM_IMPORT_DIR 에 저장하고 dramatiq worker 에서 ProblemImporter 로 문제를 만든다
+    진행 상황 (stage, done, total) 과 결과 (import_count, errors) 는 redis 에 둔다
+    """
+    kinds = ("zip", "fps")
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+
+    @classmethod
+    def create(cls, user_id, kind, upload):
+        job = cls(rand_str())
+        os.makedirs(settings.PROBLEM_IMPORT_DIR, exist_ok=True)
+        with open(job.uploadPath(job.job_id), "wb") as f:
+            for chunk in upload.chunks():
+                f.write(chunk)
+        job.setProgress(status=ProblemImportStatus.QUEUED, user_id=user_id, kind=kind, stage="queued", done=0,
+                        total=0, import_count=0, errors="[]", error="")
+        return job
+
+    @staticmethod
+    def progressKey(job_id):
+        return f"{CacheKey.problem_import_job}:{job_id}"
+
+    @staticmethod
+    def uploadPath(job_id):
+        return os.path.join(settings.PROBLEM_IMPORT_DIR, f"{job_id}.upload")
+
+    @classmethod
+    def progress(cls, job_id):
+        data = {k.decode("utf-8"): v.decode("utf-8") for k, v in cache.hgetall(cls.progressKey(job_id)).items()}
+        for field in ("user_id", "total", "done", "import_count"):
+            if field in data:
+                data[field] = int(data[field])
+        if "errors" in data:
+            data["errors"] = json.loads(data["errors"])
+        data["job_id"] = job_id
+        return data
+
+    def setProgress(self, **kwargs):
+        key = self.progressKey(self.job_id)
+        pipe = cache.pipeline()
+        pipe.hmset(key, dict(kwargs, updated_at=time.time()))
+        pipe.expire(key, PROGRESS_TTL)
+        pipe.execute()
+
+    def start(self):
+        from .tasks import import_problems_task
+        import_problems_task.send(self.job_id)
+
+    def run(self):
+        data = self.progress(self.job_id)
+        if data.get("status") != ProblemImportStatus.QUEUED:
+            return
+        path = self.uploadPath(self.job_id)
+        importer = ProblemImporter(data["user_id"], progress=self.setProgress)
+        try:
+            self.setProgress(status=ProblemImportStatus.RUNNING)
+            if data["kind"] == "fps":
+                created = importer.import_fps(path)
+            else:
+                created = importer.import_zip(path)
+            self.setProgress(status=ProblemImportStatus.FINISHED, stage="finished", import_count=len(created),
+                             errors=json.dumps(sorted(importer.errors, key=lambda item: item["index"])))
+        except APIError as e:
+            self.setProgress(status=ProblemImportStatus.FAILED, error=e.msg)
+        except Exception as e:
+            self.setProgress(status=ProblemImportStatus.FAILED, error=str(e))
+            raise
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
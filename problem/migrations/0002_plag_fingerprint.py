@@ -0,0 +1,30 @@
+from django.conf import settings
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('submission', '0002_submission_keyset_indexes'),
+        ('problem', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Plag_Fingerprint',
+            fields=[
+                ('submission', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='submission.Submission')),
+                ('language', models.TextField()),
+                ('hashes', django.contrib.postgres.fields.jsonb.JSONField(default=list)),
+                ('kgrams', django.contrib.postgres.fields.jsonb.JSONField(default=list)),
+                ('lines', django.contrib.postgres.fields.jsonb.JSONField(default=list)),
+                ('length', models.IntegerField(default=0)),
+                ('create_time', models.DateTimeField(auto_now_add=True)),
+                ('problem', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='problem.Problem')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,63 @@
+from django.db import migrations, transaction
+from django.db.models import Min
+
+CHUNK_SIZE = 500
+# submission.models.JudgeStatus.ACCEPTED
+ACCEPTED = 0
+
+
+def legacy_status(profile):
+    ret = {}
+    for problems_status in (profile.acm_problems_status, profile.oi_problems_status):
+        for section in ("problems", "contest_problems"):
+            for problem_id, item in (problems_status or {}).get(section, {}).items():
+                if str(problem_id).isdigit() and item.get("status") is not None:
+                    ret[int(problem_id)] = (item["status"], item.get("score") or 0)
+    return ret
+
+
+def backfill(apps, schema_editor):
+    """
+    UserProfile 의 acm_problems_status, oi_problems_status 를 user_problem_status 로 옮긴다
+    사용자 chunk 마다 따로 commit 하고 이미 있는 (사용자, 문제) 는 건너뛰므로, 중간에 실패해도 다시 실행하면 된다
+    """
+    UserProfile = apps.get_model("account", "UserProfile")
+    Problem = apps.get_model("problem", "Problem")
+    Submission = apps.get_model("submission", "Submission")
+    UserProblemStatus = apps.get_model("problem", "UserProblemStatus")
+    profiles = UserProfile.objects.only("id", "user_id", "acm_problems_status", "oi_problems_status").order_by("id")
+    last_id = 0
+    while True:
+        chunk = list(profiles.filter(id__gt=last_id)[:CHUNK_SIZE])
+        if not chunk:
+            break
+        last_id = chunk[-1].id
+        legacy = {profile.user_id: legacy_status(profile) for profile in chunk}
+        problem_ids = {problem_id for items in legacy.values() for problem_id in items}
+        existing_problems = set(Problem.objects.filter(id__in=problem_ids).values_list("id", flat=True))
+        with transaction.atomic():
+            existing = set(UserProblemStatus.objects.filter(user_id__in=list(legacy))
+                           .values_list("user_id", "problem_id"))
+            first_ac = {(item["user_id"], item["problem_id"]): item["first_ac_time"] for item in
+                        Submission.objects.filter(user_id__in=list(legacy), result=ACCEPTED)
+                        .values("user_id", "problem_id").annotate(first_ac_time=Min("create_time"))}
+            UserProblemStatus.objects.bulk_create([
+                UserProblemStatus(user_id=user_id, problem_id=problem_id, status=status, score=score,
+                                  first_ac_time=first_ac.get((user_id, problem_id)))
+                for user_id, items in legacy.items() for problem_id, (status, score) in items.items()
+                if problem_id in existing_problems and (user_id, problem_id) not in existing])
+
+
+class Migration(migrations.Migration):
+    # 사용자 chunk 마다 commit 한다
+    atomic = False
+
+    dependencies = [
+        ('account', '0004_auto_20230628_0645'),
+        ('submission', '0002_submission_keyset_indexes'),
+        ('problem', '0003_user_problem_status'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
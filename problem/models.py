@@ -109,4 +109,65 @@ class Plag_Result(models.Model):
     problem = models.ForeignKey(Problem, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     plag_summary = models.ForeignKey(Plag_Summary, on_delete=models.CASCADE)
-    result = JSONField(default=list)
\ No newline at end of file
+    result = JSONField(default=list)
+
+
+class Plag_Fingerprint(models.Model):
+    # 표절 검사용 winnowing fingerprint, 제출마다 채점이 끝날 때 한 번 만든다
+    submission = models.OneToOneField("submission.Submission", primary_key=True, on_delete=models.CASCADE)
+    problem = models.ForeignKey(Problem, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    language = models.TextField()
+    # [[hash, token 위치], ...]
+    hashes = JSONField(default=list)
+    kgrams = JSONField(default=list)
+    lines = JSONField(default=list)
+    length = models.IntegerField(default=0)
+    create_time = models.DateTimeField(auto_now_add=True)
+
+
+class UserProblemStatus(models.Model):
+    # 사용자별 문제 풀이 상태, 채점할 때마다 이 행만 고친다
+    # UserProfile 의 acm_problems_status, oi_problems_status 는 이전 기록으로 남겨 두고, migration 0004 에서 이 테이블로 옮긴다
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    problem = models.ForeignKey(Problem, on_delete=models.CASCADE)
+    # 대회가 아닌 문제는 AC 를 받은 뒤에 바뀌지 않는다
+    status = models.IntegerField()
+    # OI 문제의 최고 점수 (OI 대회 문제는 마지막 점수)
+    score = models.IntegerField(default=0)
+    first_ac_time = models.DateTimeField(null=True)
+
+    class Meta:
+        db_table = "user_problem_status"
+        unique_together = (("user", "problem"),)
+
+    @staticmethod
+    def legacy_status(profile):
+        """
+        {problem_id: (status, score)}, UserProfile 의 JSON 에 남아 있는 기록
+        """
+        ret = {}
+        for problems_status in (profile.acm_problems_status, profile.oi_problems_status):
+            for section in ("problems", "contest_problems"):
+                for problem_id, item in (problems_status or {}).get(section, {}).items():
+                    if str(problem_id).isdigit() and item.get("status") is not None:
+                        ret[int(problem_id)] = (item["status"], item.get("score") or 0)
+        return ret
+
+    @classmethod
+    def profile_status(cls, user_id):
+        """
+        UserProfile 의 acm_problems_status, oi_problems_status 와 같은 형태로 돌려준다
+        """
+        acm = {"problems": {}, "contest_problems": {}}
+        oi = {"problems": {}, "contest_problems": {}}
+        rows = cls.objects.filter(user_id=user_id).values_list("problem_id", "problem___id", "problem__rule_type",
+                                                               "problem__contest_id", "problem__contest__rule_type",
+                                                               "status", "score")
+        for problem_id, display_id, rule_type, contest_id, contest_rule_type, status, score in rows:
+            section = "contest_problems" if contest_id else "problems"
+            if (contest_rule_type if contest_id else rule_type) == ProblemRuleType.ACM:
+                acm[section][str(problem_id)] = {"status": status, "_id": display_id}
+            else:
+                oi[section][str(problem_id)] = {"status": status, "_id": display_id, "score": score}
+        return acm, oi
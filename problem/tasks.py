@@ -0,0 +1,44 @@
+import dramatiq
+
+from submission.models import Submission
+from utils.PlagiarismChecker.Plag.plagindex import build_fingerprint, save_fingerprint
+from utils.PlagiarismChecker.Plag.plagjob import PlagJob, RETRY_DELAY
+from utils.shortcuts import DRAMATIQ_WORKER_ARGS
+from .export import ProblemExportJob
+from .importer import ProblemImportJob
+from .models import Plag_Fingerprint
+from .test_case_archive import TestCaseArchiveCache
+
+
+@dramatiq.actor(**DRAMATIQ_WORKER_ARGS(max_age=600_000))
+def build_test_case_archive(test_case_id):
+    TestCaseArchiveCache().get(test_case_id)
+
+
+@dramatiq.actor(**DRAMATIQ_WORKER_ARGS())
+def fingerprint_submission(submission_id):
+    # 재채점이어도 코드는 같으므로 이미 있으면 다시 만들지 않는다
+    if Plag_Fingerprint.objects.filter(submission_id=submission_id).exists():
+        return
+    try:
+        submission = Submission.objects.only("id", "problem_id", "user_id", "language", "code").get(id=submission_id)
+    except Submission.DoesNotExist:
+        return
+    save_fingerprint(build_fingerprint(submission))
+
+
+@dramatiq.actor(**DRAMATIQ_WORKER_ARGS(time_limit=3600_000, max_age=24 * 3600_000))
+def plagiarism_task(job_id, problem_ids):
+    if not PlagJob(job_id, problem_ids).run():
+        # 실행 중인 작업이 많으면 조금 뒤에 다시 시도한다
+        plagiarism_task.send_with_options(args=(job_id, problem_ids), delay=RETRY_DELAY)
+
+
+@dramatiq.actor(**DRAMATIQ_WORKER_ARGS(time_limit=3600_000, max_age=24 * 3600_000))
+def export_problems_task(job_id):
+    ProblemExportJob(job_id).run()
+
+
+@dramatiq.actor(**DRAMATIQ_WORKER_ARGS(time_limit=3600_000, max_age=24 * 3600_000))
+def import_problems_task(job_id):
+    ProblemImportJob(job_id).run()
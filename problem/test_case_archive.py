@@ -0,0 +1,104 @@
+import json
+import os
+import zipfile
+
+from django.conf import settings
+
+from utils.shortcuts import rand_str
+from .test_case_store import TestCaseStore
+
+
+class TestCaseArchiveCache:
+    """
+    test case 다운로드용 zip 을 TEST_CASE_ARCHIVE_DIR 에 한 번만 만들어 두고 다시 쓴다
+     - 파일 이름에 info 파일의 SHA-256 이 들어가므로 test case 가 바뀌면 새 zip 을 만든다
+     - 사용할 때마다 mtime 을 갱신하고, 전체 크기가 budget 을 넘으면 mtime 이 오래된 것부터 지운다 (LRU)
+    """
+    def __init__(self, root=None, budget=None):
+        self.root = root or settings.TEST_CASE_ARCHIVE_DIR
+        self.budget = settings.TEST_CASE_ARCHIVE_CACHE_SIZE if budget is None else budget
+        self.store = TestCaseStore()
+
+    def archive_path(self, test_case_id):
+        info_path = os.path.join(self.store.test_case_dir(test_case_id), "info")
+        fingerprint = TestCaseStore.file_digest(info_path)[:16]
+        return os.path.join(self.root, f"{test_case_id}-{fingerprint}.zip")
+
+    def get(self, test_case_id):
+        """
+        test case 의 zip 경로를 돌려준다, 없으면 만든다
+        test case 가 없으면 FileNotFoundError
+        """
+        path = self.archive_path(test_case_id)
+        try:
+            os.utime(path)
+            return path
+        except FileNotFoundError:
+            pass
+        self.build(test_case_id, path)
+        self.evict(keep=path)
+        return path
+
+    def build(self, test_case_id, path):
+        test_case_dir = self.store.test_case_dir(test_case_id)
+        with open(os.path.join(test_case_dir, "info"), encoding="utf-8") as f:
+            info = json.load(f)
+        name_list = []
+        for item in info["test_cases"].values():
+            name_list.append(item["input_name"])
+            if not info["spj"]:
+                name_list.append(item["output_name"])
+        name_list.append("info")
+
+        os.makedirs(self.root, exist_ok=True)
+        # 동시에 여러 요청이 만들어도 완성된 zip 만 보이도록 임시 파일에 쓰고 rename 한다
+        temp = f"{path}.{rand_str(8)}.tmp"
+        try:
+            with zipfile.ZipFile(temp, "w", compression=zipfile.ZIP_DEFLATED) as file:
+                for name in name_list:
+                    file.write(os.path.join(test_case_dir, name), name)
+            os.replace(temp, path)
+        except BaseException:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
+
+        # 같은 test case 의 이전 버전 zip 은 더 이상 쓰이지 않는다
+        for entry in os.scandir(self.root):
+            if entry.name.startswith(f"{test_case_id}-") and entry.name.endswith(".zip") and entry.path != path:
+                self._remove(entry.path)
+        # 이전에는 test case 디렉터리 안에 zip 을 만들었다
+        self._remove(os.path.join(test_case_dir, f"{test_case_id}.zip"))
+
+    def evict(self, keep=None):
+        """
+        전체 크기가 budget 이하가 될 때까지 오래 사용하지 않은 zip 을 지우고, 지운 수를 돌려준다
+        """
+        entries = []
+        total = 0
+        for entry in os.scandir(self.root):
+            if not entry.name.endswith(".zip"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, entry.path, stat.st_size))
+            total += stat.st_size
+        count = 0
+        for _, path, size in sorted(entries):
+            if total <= self.budget:
+                break
+            if path == keep:
+                continue
+            self._remove(path)
+            total -= size
+            count += 1
+        return count
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,221 @@
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from utils.shortcuts import rand_str
+
+# TEST_CASE_DIR 아래에 두어야 hardlink 를 만들 수 있고, rsync -H 로 judge server 에도 한 번만 전송된다
+BLOB_DIR = ".blobs"
+CHUNK_SIZE = 1024 * 1024
+# 압축을 푼 크기의 합이 이보다 크면 파일들을 여러 thread 에서 동시에 푼다 (zlib, hashlib 은 GIL 을 놓는다)
+PARALLEL_EXTRACT_SIZE = 64 * 1024 * 1024
+EXTRACT_WORKERS = 4
+
+
+def normalize_newlines(chunks):
+    """
+    CRLF 를 LF 로 바꾼다, chunk 경계에서 CR 과 LF 가 나뉘면 CR 을 다음 chunk 에 붙여서 바꾼다
+    """
+    pending = b""
+    for chunk in chunks:
+        if pending:
+            chunk = pending + chunk
+        if chunk.endswith(b"\r"):
+            chunk, pending = chunk[:-1], b"\r"
+        else:
+            pending = b""
+        if chunk:
+            yield chunk.replace(b"\r\n", b"\n")
+    if pending:
+        yield pending
+
+
+class StrippedMD5:
+    """
+    md5(content.rstrip()) 를 chunk 단위로 계산한다, 끝의 공백은 뒤에 다른 내용이 올 때까지 보관한다
+    """
+    def __init__(self):
+        self.md5 = hashlib.md5()
+        self.tail = bytearray()
+
+    def update(self, chunk):
+        stripped = chunk.rstrip()
+        if stripped:
+            self.md5.update(self.tail)
+            self.md5.update(stripped)
+            self.tail = bytearray(chunk[len(stripped):])
+        else:
+            self.tail += chunk
+
+    def hexdigest(self):
+        return self.md5.hexdigest()
+
+
+class TestCaseStore:
+    """
+    test case 파일을 SHA-256 으로 TEST_CASE_DIR/.blobs 에 한 번만 저장하고, 문제의 test case 디렉터리에는 hardlink 를 둔다
+     - blob 의 link 수 - 1 이 참조 수이므로 참조 수를 따로 저장하지 않는다, 참조가 없는 blob 은 prune 으로 지운다
+     - 여러 문제가 같은 inode 를 쓰므로 test case 디렉터리의 파일은 고쳐 쓰지 말고 write 로 바꿔야 한다
+    """
+    def __init__(self, root=None):
+        self.root = root or settings.TEST_CASE_DIR
+        self.blob_root = os.path.join(self.root, BLOB_DIR)
+
+    def blob_path(self, digest):
+        return os.path.join(self.blob_root, digest[:2], digest)
+
+    def test_case_dir(self, test_case_id):
+        return os.path.join(self.root, test_case_id)
+
+    def create_dir(self):
+        while True:
+            test_case_id = rand_str()
+            test_case_dir = self.test_case_dir(test_case_id)
+            try:
+                os.mkdir(test_case_dir)
+            except FileExistsError:
+                continue
+            os.chmod(test_case_dir, 0o710)
+            return test_case_id, test_case_dir
+
+    def _temp_path(self, directory):
+        return os.path.join(directory, f".tmp_{rand_str(16)}")
+
+    def _link(self, src, dst):
+        # 같은 이름의 파일이 있으면 원자적으로 바꾼다
+        temp = self._temp_path(os.path.dirname(dst))
+        os.link(src, temp)
+        os.replace(temp, dst)
+
+    def _adopt(self, digest, path):
+        """
+        blob 이 없으면 path 를 blob 으로 등록한다, 이미 있으면 아무것도 하지 않는다
+        """
+        blob = self.blob_path(digest)
+        os.makedirs(os.path.dirname(blob), mode=0o710, exist_ok=True)
+        try:
+            os.link(path, blob)
+        except FileExistsError:
+            pass
+
+    def write(self, test_case_dir, name, content):
+        """
+        content(bytes) 를 test_case_dir/name 에 쓰고 digest 를 돌려준다
+        """
+        return self.write_stream(test_case_dir, name, [content])
+
+    def write_stream(self, test_case_dir, name, chunks):
+        """
+        chunks(bytes 의 iterable) 를 메모리에 모으지 않고 test_case_dir/name 에 쓰고 digest 를 돌려준다
+        """
+        sha256 = hashlib.sha256()
+        temp = self._temp_path(test_case_dir)
+        with open(temp, "wb") as f:
+            for chunk in chunks:
+                sha256.update(chunk)
+                f.write(chunk)
+        digest = sha256.hexdigest()
+        target = os.path.join(test_case_dir, name)
+        while True:
+            # 같은 내용의 blob 이 없으면 temp 가 blob 이 된다
+            self._adopt(digest, temp)
+            try:
+                self._link(self.blob_path(digest), target)
+                break
+            except FileNotFoundError:
+                # 참조가 없던 blob 이 그 사이에 prune 되었다
+                continue
+        os.remove(temp)
+        return digest
+
+    def copy(self, src_test_case_id):
+        """
+        test case 디렉터리를 hardlink 로 복사하고 새 test_case_id 를 돌려준다
+        """
+        src = self.test_case_dir(src_test_case_id)
+        test_case_id, test_case_dir = self.create_dir()
+        for entry in os.scandir(src):
+            if entry.is_file(follow_symlinks=False):
+                os.link(entry.path, os.path.join(test_case_dir, entry.name))
+        return test_case_id
+
+    @staticmethod
+    def file_digest(path):
+        sha256 = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                sha256.update(chunk)
+        return sha256.hexdigest()
+
+    def dedupe_file(self, path):
+        """
+        이미 있는 파일을 blob 의 hardlink 로 바꾸고, 줄어든 byte 수를 돌려준다
+        """
+        digest = self.file_digest(path)
+        blob = self.blob_path(digest)
+        if os.path.exists(blob):
+            if os.path.samefile(path, blob):
+                return 0
+            saved = os.stat(path).st_size if os.stat(path).st_nlink == 1 else 0
+            self._link(blob, path)
+            return saved
+        self._adopt(digest, path)
+        return 0
+
+    def refcount(self, digest):
+        return os.stat(self.blob_path(digest)).st_nlink - 1
+
+    def blobs(self):
+        if not os.path.isdir(self.blob_root):
+            return
+        for prefix in os.scandir(self.blob_root):
+            if prefix.is_dir():
+                yield from os.scandir(prefix.path)
+
+    def prune(self, dry_run=False):
+        """
+        어느 test case 디렉터리에서도 참조하지 않는 blob 을 지우고, (지운 수, byte 수) 를 돌려준다
+        """
+        count = size = 0
+        for blob in self.blobs():
+            stat = blob.stat()
+            if stat.st_nlink > 1:
+                continue
+            count += 1
+            size += stat.st_size
+            if not dry_run:
+                os.remove(blob.path)
+        return count, size
+
+    def extract(self, zip_file, members, test_case_dir, stripped_md5=lambda name: False):
+        """
+        zip 안의 test case 파일들을 CRLF -> LF 로 바꾸면서 조금씩 test_case_dir 에 저장한다
+
+        :param members: [(zip 안의 이름, 저장할 이름), ...]
+        :param stripped_md5: 저장할 이름을 받아 rstrip 한 내용의 md5 가 필요한지 돌려주는 함수
+        :return: {저장할 이름: (크기, md5 또는 None)}
+        """
+        def extract_one(member):
+            arcname, name = member
+            size = 0
+            md5 = StrippedMD5() if stripped_md5(name) else None
+
+            def chunks():
+                nonlocal size
+                with zip_file.open(arcname) as f:
+                    for chunk in normalize_newlines(iter(lambda: f.read(CHUNK_SIZE), b"")):
+                        size += len(chunk)
+                        if md5:
+                            md5.update(chunk)
+                        yield chunk
+
+            self.write_stream(test_case_dir, name, chunks())
+            return name, (size, md5.hexdigest() if md5 else None)
+
+        total = sum(zip_file.getinfo(arcname).file_size for arcname, _ in members)
+        if total >= PARALLEL_EXTRACT_SIZE and len(members) > 1:
+            with ThreadPoolExecutor(max_workers=EXTRACT_WORKERS) as executor:
+                return dict(executor.map(extract_one, members))
+        return dict(map(extract_one, members))
@@ -1,19 +1,38 @@
+import base64
 import copy
 import hashlib
+import io
+import json
 import os
 import shutil
+import tempfile
+import tracemalloc
 from datetime import timedelta
-from zipfile import ZipFile
+from unittest import mock
+from zipfile import ZipFile, ZIP_DEFLATED, ZIP_STORED
 
 from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase, RequestFactory, override_settings
 
+from fps.parser import FPSHelper, FPSStreamParser
 from utils.api.tests import APITestCase
+from utils.shortcuts import file_response
+from utils.PlagiarismChecker.Plag import winnowing
 
 from .models import ProblemTag, ProblemIOMode
-from .models import Problem, ProblemRuleType
+from .models import Problem, ProblemRuleType, Plag_Fingerprint, Plag_Result, Plag_Summary, UserProblemStatus
 from contest.models import Contest
 from contest.tests import DEFAULT_CONTEST_DATA
-
+from lecture.models import Lecture
+from submission.models import JudgeStatus, Submission
+from utils.PlagiarismChecker.Plag.plagindex import PlagIndex
+from utils.PlagiarismChecker.Plag.plagjob import PlagJob, PlagJobStatus
+
+from .export import test_case_entries
+from .importer import ProblemImporter
+from .test_case_archive import TestCaseArchiveCache
+from .test_case_store import StrippedMD5, TestCaseStore, normalize_newlines
 from .views.admin import TestCaseAPI
 from .utils import parse_problem_template
 
@@ -130,6 +149,447 @@ class TestCaseUploadAPITest(APITestCase):
                 with open(os.path.join(test_case_dir, name), "r", encoding="utf-8") as f:
                     self.assertEqual(f.read(), name + "\n" + name + "\n" + "end")
 
+    def test_upload_same_test_case_zip_is_deduplicated(self):
+        test_case_dirs = []
+        for _ in range(2):
+            with open(self.make_test_case_zip(), "rb") as f:
+                resp = self.client.post(self.url, data={"spj": "false", "file": f}, format="multipart")
+            self.assertSuccess(resp)
+            test_case_dirs.append(os.path.join(settings.TEST_CASE_DIR, resp.data["data"]["id"]))
+        for name in ["1.in", "1.out", "info"]:
+            self.assertTrue(os.path.samefile(os.path.join(test_case_dirs[0], name),
+                                             os.path.join(test_case_dirs[1], name)))
+
+
+class TestCaseStoreTest(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.store = TestCaseStore(self.root)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_refcount_and_prune(self):
+        test_case_id, test_case_dir = self.store.create_dir()
+        digest = self.store.write(test_case_dir, "1.in", b"1 2\n")
+        copied_id = self.store.copy(test_case_id)
+        self.assertEqual(self.store.refcount(digest), 2)
+
+        shutil.rmtree(test_case_dir)
+        self.assertEqual(self.store.prune(), (0, 0))
+        shutil.rmtree(self.store.test_case_dir(copied_id))
+        self.assertEqual(self.store.prune(), (1, 4))
+        self.assertFalse(os.path.exists(self.store.blob_path(digest)))
+
+    def test_write_does_not_change_other_problems(self):
+        _, first = self.store.create_dir()
+        _, second = self.store.create_dir()
+        self.store.write(first, "1.in", b"same")
+        self.store.write(second, "1.in", b"same")
+        self.store.write(first, "1.in", b"changed")
+        with open(os.path.join(second, "1.in"), "rb") as f:
+            self.assertEqual(f.read(), b"same")
+
+    def test_dedupe_existing_file(self):
+        _, first = self.store.create_dir()
+        self.store.write(first, "1.in", b"same")
+        legacy = os.path.join(self.root, "a" * 32)
+        os.mkdir(legacy)
+        with open(os.path.join(legacy, "1.in"), "wb") as f:
+            f.write(b"same")
+        self.assertEqual(self.store.dedupe_file(os.path.join(legacy, "1.in")), 4)
+        self.assertTrue(os.path.samefile(os.path.join(legacy, "1.in"), os.path.join(first, "1.in")))
+
+
+class TestCaseStreamTest(TestCase):
+    contents = [b"1 2\r\n3 4\r\n", b"a\r", b"\r\r\n", b"\r\n\r\n", b"x\r\ny  \r\n\n", b"  \n\t", b"end\r\n  \r\n \t", b""]
+
+    @staticmethod
+    def split(content, size):
+        return [content[i:i + size] for i in range(0, len(content), size)]
+
+    def stripped_md5(self, chunks):
+        md5 = StrippedMD5()
+        for chunk in chunks:
+            md5.update(chunk)
+        return md5.hexdigest()
+
+    def test_normalize_newlines(self):
+        for content in self.contents:
+            for size in (1, 2, 3, 7, 1024):
+                self.assertEqual(b"".join(normalize_newlines(self.split(content, size))),
+                                 content.replace(b"\r\n", b"\n"), (content, size))
+        # CR 과 LF 가 chunk 경계에서 나뉜 경우, 마지막에 CR 만 남은 경우
+        self.assertEqual(b"".join(normalize_newlines([b"a\r", b"\nb\r", b"\n"])), b"a\nb\n")
+        self.assertEqual(b"".join(normalize_newlines([b"a", b"b\r"])), b"ab\r")
+
+    def test_stripped_md5(self):
+        for content in self.contents:
+            for size in (1, 2, 3, 7, 1024):
+                self.assertEqual(self.stripped_md5(self.split(content, size)),
+                                 hashlib.md5(content.rstrip()).hexdigest(), (content, size))
+        # 공백만 있는 chunk 는 뒤에 내용이 올 때만 포함된다
+        chunks = [b"a", b"  ", b"\n\t", b"b", b" \n", b"\n  "]
+        self.assertEqual(self.stripped_md5(chunks), hashlib.md5(b"".join(chunks).rstrip()).hexdigest())
+
+    def test_parallel_extract_matches_serial(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        store = TestCaseStore(root)
+        line = b"1 2 3 4 5 6 7 8 9 10\r\n"
+        # 합이 PARALLEL_EXTRACT_SIZE(64 MB) 이상이어야 thread 로 푼다
+        size = 34 * 1024 * 1024
+        buffer = io.BytesIO()
+        with ZipFile(buffer, "w", ZIP_DEFLATED) as f:
+            f.writestr("1.in", line * (size // len(line)) + b"\r")
+            f.writestr("1.out", line * (size // len(line)) + b"  \r\n\n")
+        members = [("1.in", "1.in"), ("1.out", "1.out")]
+        results = []
+        for threshold in (64 * 1024 * 1024, float("inf")):
+            _, test_case_dir = store.create_dir()
+            with mock.patch("problem.test_case_store.PARALLEL_EXTRACT_SIZE", threshold), ZipFile(buffer) as f:
+                info = store.extract(f, members, test_case_dir, stripped_md5=lambda name: name.endswith(".out"))
+            files = {name: store.file_digest(os.path.join(test_case_dir, name)) for _, name in members}
+            results.append((info, files))
+        self.assertEqual(results[0], results[1])
+        with ZipFile(buffer) as f:
+            expected = f.read("1.out").replace(b"\r\n", b"\n")
+        self.assertEqual(results[0][0]["1.out"], (len(expected), hashlib.md5(expected.rstrip()).hexdigest()))
+
+
+class TestCaseArchiveCacheTest(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.test_case_root = os.path.join(self.root, "test_case")
+        os.mkdir(self.test_case_root)
+        self.override = override_settings(TEST_CASE_DIR=self.test_case_root)
+        self.override.enable()
+        self.cache = TestCaseArchiveCache(os.path.join(self.root, "archive"), budget=1024 * 1024)
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def create_test_case(self, content=b"1 2\n"):
+        store = TestCaseStore()
+        test_case_id, test_case_dir = store.create_dir()
+        store.write(test_case_dir, "1.in", content)
+        store.write(test_case_dir, "1.out", b"3\n")
+        info = {"spj": False, "test_cases": {"1": {"input_name": "1.in", "output_name": "1.out",
+                                                   "input_size": len(content)}}}
+        store.write(test_case_dir, "info", json.dumps(info).encode("utf-8"))
+        return test_case_id, test_case_dir
+
+    def test_archive_is_reused(self):
+        test_case_id, _ = self.create_test_case()
+        path = self.cache.get(test_case_id)
+        with ZipFile(path) as f:
+            self.assertEqual(sorted(f.namelist()), ["1.in", "1.out", "info"])
+            self.assertEqual(f.read("1.in"), b"1 2\n")
+        os.utime(path, (0, 0))
+        self.assertEqual(self.cache.get(test_case_id), path)
+        self.assertGreater(os.path.getmtime(path), 0)
+
+    def test_changed_info_builds_new_archive(self):
+        test_case_id, test_case_dir = self.create_test_case()
+        old = self.cache.get(test_case_id)
+        TestCaseStore().write(test_case_dir, "info", b'{"spj": true, "test_cases": {}}')
+        new = self.cache.get(test_case_id)
+        self.assertNotEqual(old, new)
+        self.assertFalse(os.path.exists(old))
+
+    def test_evict_least_recently_used(self):
+        paths = [self.cache.get(self.create_test_case(os.urandom(4096))[0]) for _ in range(3)]
+        os.utime(paths[0], (1, 1))
+        self.cache.budget = os.path.getsize(paths[1]) + os.path.getsize(paths[2])
+        self.assertEqual(self.cache.evict(), 1)
+        self.assertEqual([os.path.exists(path) for path in paths], [False, True, True])
+
+    def test_range_response(self):
+        test_case_id, _ = self.create_test_case()
+        path = self.cache.get(test_case_id)
+        with open(path, "rb") as f:
+            content = f.read()
+        request = RequestFactory().get("/", HTTP_RANGE="bytes=10-19")
+        resp = file_response(request, path, "test_cases.zip")
+        self.assertEqual(resp.status_code, 206)
+        self.assertEqual(resp["Content-Range"], f"bytes 10-19/{len(content)}")
+        self.assertEqual(b"".join(resp.streaming_content), content[10:20])
+
+        resp = file_response(RequestFactory().get("/", HTTP_RANGE="bytes=-5"), path, "test_cases.zip")
+        self.assertEqual(b"".join(resp.streaming_content), content[-5:])
+        resp = file_response(RequestFactory().get("/", HTTP_RANGE=f"bytes={len(content)}-"), path, "test_cases.zip")
+        self.assertEqual(resp.status_code, 416)
+
+
+class ProblemExportTest(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.store = TestCaseStore(self.root)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_compression_by_content(self):
+        test_case_id, test_case_dir = self.store.create_dir()
+        self.store.write(test_case_dir, "1.in", b"1 2 3\n" * 10000)
+        self.store.write(test_case_dir, "1.out", os.urandom(100000))
+        self.store.write(test_case_dir, "2.in", b"1\n")
+        info = {"spj": False, "test_cases": {"1": {"input_name": "1.in", "output_name": "1.out"},
+                                             "2": {"input_name": "2.in", "output_name": "1.out"}}}
+        self.store.write(test_case_dir, "info", json.dumps(info).encode("utf-8"))
+        entries = {arcname: compress_type for _, arcname, compress_type in test_case_entries(test_case_id, 3, self.store)}
+        self.assertEqual(entries, {"3/testcase/1.in": ZIP_DEFLATED, "3/testcase/1.out": ZIP_STORED,
+                                   "3/testcase/2.in": ZIP_STORED})
+
+
+class ProblemImporterTest(APITestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.override = override_settings(TEST_CASE_DIR=self.root)
+        self.override.enable()
+        self.user = self.create_super_admin()
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def problem_json(self, display_id, tags):
+        html = {"format": "html", "value": "<p>test</p>"}
+        return {"display_id": display_id, "title": "test", "description": html, "input_description": html,
+                "output_description": html, "hint": html, "test_case_score": None, "time_limit": 1000,
+                "memory_limit": 256, "samples": [{"input": "1", "output": "2"}], "template": {}, "spj": None,
+                "rule_type": "ACM", "source": "", "answers": [], "tags": tags}
+
+    def test_import_zip(self):
+        ProblemTag.objects.create(name="dp")
+        path = os.path.join(self.root, "import.zip")
+        with ZipFile(path, "w") as f:
+            for index in (1, 2):
+                f.writestr(f"{index}/problem.json", json.dumps(self.problem_json(f"P{index}", ["dp", "graph"])))
+                f.writestr(f"{index}/testcase/1.in", "1 2\r\n")
+                f.writestr(f"{index}/testcase/1.out", "3\r\n")
+            f.writestr("3/problem.json", json.dumps(dict(self.problem_json("P3", []), time_limit=0)))
+            f.writestr("4/problem.json", json.dumps(self.problem_json("P4", [])))
+
+        importer = ProblemImporter(self.user.id)
+        created = importer.import_zip(path)
+        self.assertEqual(sorted(problem._id for problem in created), ["P1", "P2"])
+        self.assertEqual(sorted(item["index"] for item in importer.errors), [3, 4])
+        self.assertEqual(ProblemTag.objects.filter(name="dp").count(), 1)
+        problem = Problem.objects.get(_id="P2")
+        self.assertEqual(sorted(problem.tags.values_list("name", flat=True)), ["dp", "graph"])
+        with open(os.path.join(self.root, problem.test_case_id, "1.in"), "rb") as f:
+            self.assertEqual(f.read(), b"1 2\n")
+
+    def test_import_zip_with_corrupt_member(self):
+        path = os.path.join(self.root, "import.zip")
+        with ZipFile(path, "w", ZIP_STORED) as f:
+            for index in (1, 2):
+                f.writestr(f"{index}/problem.json", json.dumps(self.problem_json(f"P{index}", [])))
+                f.writestr(f"{index}/testcase/1.in", "1 2\r\n")
+            f.writestr("1/testcase/1.out", "3\r\n")
+            f.writestr("2/testcase/1.out", "CORRUPTED\r\n")
+        # CRC 가 맞지 않도록 저장된 내용을 바꾼다
+        with open(path, "rb") as f:
+            content = f.read()
+        with open(path, "wb") as f:
+            f.write(content.replace(b"CORRUPTED", b"corrupted"))
+
+        importer = ProblemImporter(self.user.id)
+        created = importer.import_zip(path)
+        self.assertEqual([problem._id for problem in created], ["P1"])
+        self.assertEqual([item["index"] for item in importer.errors], [2])
+        # 2 번 문제의 일부만 풀린 test case 디렉터리는 지운다
+        test_case_dirs = {entry.name for entry in os.scandir(self.root) if entry.is_dir() and entry.name != ".blobs"}
+        self.assertEqual(test_case_dirs, {created[0].test_case_id})
+
+    def test_unknown_job(self):
+        job_id = "0" * 32
+        for url_name in ("export_problem_api", "import_problem_api", "fps_problem_api"):
+            resp = self.client.get(self.reverse(url_name), data={"job_id": job_id})
+            self.assertFailed(resp, "Job does not exist")
+            self.client.logout()
+            resp = self.client.get(self.reverse(url_name), data={"job_id": job_id})
+            self.assertFailed(resp, "Please login first")
+            self.client.force_login(self.user)
+
+
+class FPSStreamParserTest(TestCase):
+    # FPS_MEMORY_TEST_MB=4096 으로 몇 GB 짜리 파일도 확인할 수 있다
+    size_mb = int(os.environ.get("FPS_MEMORY_TEST_MB", "64"))
+    memory_ceiling = 32 * 1024 * 1024
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def write_fps(self, path, problems):
+        line = b"1234567 " * 16 + b"\n"
+        image = base64.b64encode(os.urandom(48 * 1024)) + b"\n"
+        per_problem = self.size_mb * 1024 * 1024 // problems
+        with open(path, "wb") as f:
+            f.write(b'<?xml version="1.0" encoding="UTF-8"?>\n<fps version="1.2">\n')
+            for _ in range(problems):
+                f.write(b"<item><title>test</title><description><![CDATA[<img src='a.png'>]]></description>"
+                        b"<input>in</input><output>out</output><time_limit unit=\"s\">1</time_limit>"
+                        b"<memory_limit unit=\"mb\">128</memory_limit><img><src>a.png</src><base64>")
+                for _ in range(per_problem // 4 // len(image)):
+                    f.write(image)
+                f.write(b"</base64></img><test_input><![CDATA[")
+                for _ in range(per_problem * 3 // 4 // len(line)):
+                    f.write(line)
+                f.write(b"]]></test_input><test_output>42  \n\n</test_output></item>\n")
+            f.write(b"</fps>\n")
+
+    def test_memory_ceiling(self):
+        path = os.path.join(self.root, "fps.xml")
+        self.write_fps(path, problems=4)
+        spool_dir = os.path.join(self.root, "spool")
+        os.mkdir(spool_dir)
+        helper = FPSHelper()
+        tracemalloc.start()
+        try:
+            count = 0
+            for problem in FPSStreamParser(path, spool_dir).parse():
+                test_case_dir = tempfile.mkdtemp(dir=self.root)
+                info = helper.save_test_case(problem, test_case_dir)
+                problem = helper.save_image(problem, test_case_dir, "/upload")
+                count += 1
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(count, 4)
+        self.assertLess(peak, self.memory_ceiling)
+        self.assertEqual(info["test_cases"][0]["stripped_output_md5"], hashlib.md5(b"42").hexdigest())
+        self.assertEqual(info["test_cases"][0]["input_size"], os.path.getsize(os.path.join(test_case_dir, "1.in")))
+        self.assertIn("/upload/", problem["description"])
+        self.assertEqual(os.listdir(spool_dir), [])
+
+
+class WinnowingEngineTest(TestCase):
+    code = """#include <stdio.h>
+int main() {
+    int n, total = 0;
+    scanf("%d", &n);
+    for (int i = 0; i < n; i++) {
+        if (i % 3 == 0) total += i * i;
+        else total -= i;
+    }
+    printf("%d\\n", total);
+    return 0;
+}
+"""
+    other = """#include <stdio.h>
+int main() {
+    double x;
+    scanf("%lf", &x);
+    while (x > 1.0) { x /= 2; }
+    puts(x < 0.5 ? "small" : "large");
+    return 0;
+}
+"""
+
+    def test_renamed_copy_is_detected(self):
+        disguised = self.code.replace("total", "answer").replace("    ", "\t") + "// done\n"
+        fingerprints = {"a": winnowing.fingerprint(self.code, "C"), "b": winnowing.fingerprint(disguised, "C"),
+                        "c": winnowing.fingerprint(self.other, "C")}
+        matches = winnowing.WinnowingEngine(workers=1).compare(fingerprints)
+        self.assertEqual([(match.a, match.b) for match in matches], [("a", "b")])
+        self.assertEqual(matches[0].similarity, 100.0)
+        self.assertEqual(matches[0].lines_a, [(2, 11)])
+
+    def test_copy_ring_in_small_section(self):
+        # 코드가 10 개뿐이어도 3 명 이상이 같은 코드를 내면 찾는다
+        fingerprints = {name: winnowing.fingerprint(self.code, "C") for name in ("a", "b", "c")}
+        fingerprints.update({f"o{i}": winnowing.fingerprint(self.other.replace("x", f"v{i}"), "C") for i in range(7)})
+        pairs = {(match.a, match.b) for match in winnowing.WinnowingEngine(workers=1).compare(fingerprints)}
+        self.assertTrue({("a", "b"), ("a", "c"), ("b", "c")} <= pairs)
+
+        # 문제의 template 코드는 모두가 같이 가지고 있어도 표절로 보지 않는다
+        template = winnowing.template_kgrams([self.other], "C")
+        matches = winnowing.WinnowingEngine(workers=1).compare(fingerprints, template=template)
+        self.assertEqual({(match.a, match.b) for match in matches}, {("a", "b"), ("a", "c"), ("b", "c")})
+
+    def test_python_tokenizer_ignores_comments_and_names(self):
+        self.assertEqual(winnowing.tokenize("x = 1  # one\nprint(x)\n", "Python3")[0],
+                         winnowing.tokenize("value = 2\n\nprint(value)\n", "Python3")[0])
+
+    def test_report(self):
+        result_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, result_dir, ignore_errors=True)
+        fingerprints = {"a": winnowing.fingerprint(self.code, "C"), "b": winnowing.fingerprint(self.code, "C")}
+        matches = winnowing.WinnowingEngine(workers=1).compare(fingerprints)
+        winnowing.write_report(result_dir, matches, {"a": self.code, "b": self.code}, len(fingerprints))
+        self.assertEqual(sorted(os.listdir(result_dir)), ["index.html", "match0.html", "result.json"])
+
+
+class PlagIndexTest(APITestCase):
+    def setUp(self):
+        admin = self.create_admin(login=False)
+        lecture = Lecture.objects.create(title="lecture", description="", created_by=admin, year=2020,
+                                         semester=1, status=True, password="")
+        self.contest = Contest.objects.create(created_by=admin, lecture=lecture, **DEFAULT_CONTEST_DATA)
+        data = copy.deepcopy(DEFAULT_PROBLEM_DATA)
+        data.pop("tags")
+        self.problem = Problem.objects.create(contest=self.contest, created_by=admin, **data)
+        self.users = [self.create_user(f"user{i}", "test123", login=False) for i in range(3)]
+
+    def submit(self, user, code):
+        return Submission.objects.create(contest=self.contest, problem=self.problem, lecture=self.contest.lecture,
+                                         user=user, username=user.username, code=code, language="C")
+
+    def test_incremental_check(self):
+        self.submit(self.users[0], WinnowingEngineTest.other)
+        self.submit(self.users[0], WinnowingEngineTest.code)
+        self.submit(self.users[1], WinnowingEngineTest.code.replace("total", "answer"))
+        self.submit(self.users[2], WinnowingEngineTest.other)
+        index = PlagIndex(self.problem, winnowing.WinnowingEngine(workers=1))
+        self.assertEqual(index.check(), 3)
+        # 사용자마다 최근 제출만 fingerprint 를 만든다
+        self.assertEqual(Plag_Fingerprint.objects.count(), 3)
+        self.assertEqual([(m.a, m.b) for m in index.matches()], [(self.users[0].id, self.users[1].id)])
+
+        self.assertEqual(index.check(), 0)
+
+        self.submit(self.users[2], WinnowingEngineTest.code)
+        self.assertEqual(index.check(), 1)
+        self.assertEqual(Plag_Fingerprint.objects.count(), 4)
+        result = Plag_Result.objects.get(problem=self.problem, user=self.users[0]).result
+        self.assertEqual(sorted(entry["user_id"] for entry in result), [self.users[1].id, self.users[2].id])
+        summary = Plag_Summary.objects.get(problem=self.problem, user=self.users[2]).summary
+        self.assertEqual((summary["match_count"], summary["max_similarity"]), (2, 100.0))
+
+    def test_job_id_follows_submissions(self):
+        self.submit(self.users[0], WinnowingEngineTest.code)
+        job_id = PlagJob.create([self.problem.id]).job_id
+        self.assertEqual(PlagJob.create([str(self.problem.id)]).job_id, job_id)
+        self.submit(self.users[1], WinnowingEngineTest.code)
+        self.assertNotEqual(PlagJob.create([self.problem.id]).job_id, job_id)
+
+    def test_job_result_is_reused(self):
+        self.submit(self.users[0], WinnowingEngineTest.code)
+        self.submit(self.users[1], WinnowingEngineTest.code)
+        result_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, result_dir, ignore_errors=True)
+        with override_settings(PLAGIARISM_RESULT_DIR=result_dir):
+            job = PlagJob.create([self.problem.id])
+            self.assertTrue(job.run())
+            self.assertEqual(PlagJob.progress(job.job_id)["status"], PlagJobStatus.FINISHED)
+            # 작업 디렉터리는 지우고 결과 zip 만 남긴다
+            self.assertEqual(os.listdir(os.path.join(result_dir, "work")), [])
+            with ZipFile(PlagJob.resultPath(job.job_id)) as f:
+                self.assertIn("index.html", f.namelist())
+
+            self.create_super_admin()
+            resp = self.client.get(self.reverse("copy_killer"), data={"id": self.problem.id})
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(resp["Content-Disposition"], f"attachment; filename={self.problem.id}_copykiller.zip")
+            resp = self.client.get(self.reverse("copy_killer_job_api"), data={"job_id": "../../etc"})
+            self.assertFailed(resp)
+
 
 class ProblemAdminAPITest(APITestCase):
     def setUp(self):
@@ -193,6 +653,32 @@ class ProblemAPITest(ProblemCreateTestBase):
         self.assertSuccess(resp)
 
 
+class UserProblemStatusTest(ProblemCreateTestBase):
+    def setUp(self):
+        admin = self.create_admin(login=False)
+        self.problem = self.add_problem(DEFAULT_PROBLEM_DATA, admin)
+        self.user = self.create_user("test", "test123")
+
+    def test_problem_list_status(self):
+        UserProblemStatus.objects.create(user=self.user, problem=self.problem, status=JudgeStatus.ACCEPTED)
+        resp = self.client.get(f"{self.reverse('problem_api')}?limit=10")
+        self.assertSuccess(resp)
+        self.assertEqual(resp.data["data"]["results"][0]["my_status"], JudgeStatus.ACCEPTED)
+
+    def test_backfill(self):
+        profile = self.user.userprofile
+        problem_status = {"status": JudgeStatus.WRONG_ANSWER, "_id": self.problem._id}
+        profile.acm_problems_status = {"problems": {str(self.problem.id): problem_status},
+                                       "contest_problems": {"999999": {"status": JudgeStatus.ACCEPTED, "_id": "x"}}}
+        profile.save()
+        call_command("backfill_problem_status", stdout=io.StringIO())
+        call_command("backfill_problem_status", stdout=io.StringIO())
+        status = UserProblemStatus.objects.get(user=self.user)
+        self.assertEqual((status.problem_id, status.status), (self.problem.id, JudgeStatus.WRONG_ANSWER))
+        acm, _ = UserProblemStatus.profile_status(self.user.id)
+        self.assertEqual(acm["problems"], {str(self.problem.id): problem_status})
+
+
 class ContestProblemAdminTest(APITestCase):
     def setUp(self):
         self.url = self.reverse("contest_problem_admin_api")
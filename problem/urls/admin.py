@@ -2,7 +2,8 @@ from django.conf.urls import url
 
 from ..views.admin import (ContestProblemAPI, ProblemAPI, TestCaseAPI, MakeContestProblemPublicAPIView,
                            CompileSPJAPI, AddContestProblemAPI, ExportProblemAPI, ImportProblemAPI,
-                           FPSProblemImport, CopyKiller, CopyKillerAPIView)
+                           FPSProblemImport, CopyKiller, CopyKillerAPIView, CopyKillerJobAPI,
+                           CopyKillerResultAPI)
 
 urlpatterns = [
     url(r"^test_case/?$", TestCaseAPI.as_view(), name="test_case_api"),
@@ -16,4 +17,6 @@ urlpatterns = [
     url(r"^import_fps/?$", FPSProblemImport.as_view(), name="fps_problem_api"),
     url(r"^problem/copy_killer/?$", CopyKiller.as_view(), name="copy_killer"),
     url(r"^problem/copykiller/?$", CopyKillerAPIView.as_view(), name="copy_killer_api"),
+    url(r"^problem/copy_killer/job/?$", CopyKillerJobAPI.as_view(), name="copy_killer_job_api"),
+    url(r"^problem/copy_killer/result/?$", CopyKillerResultAPI.as_view(), name="copy_killer_result_api"),
 ]
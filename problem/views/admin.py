@@ -1,118 +1,32 @@
 import hashlib
-import json
 import os
+import re
 import shutil
-import tempfile
-import zipfile
-from wsgiref.util import FileWrapper
 
 from django.conf import settings
-from django.db import transaction
 from django.db.models import Q
-from django.http import StreamingHttpResponse, FileResponse
 
-from account.decorators import problem_permission_required, ensure_created_by
+from account.decorators import problem_permission_required, ensure_created_by, admin_role_required
 from contest.models import Contest, ContestStatus
-from fps.parser import FPSHelper, FPSParser
 from judge.dispatcher import SPJCompiler
 from lecture.views.LectureBuilder import LectureBuilder, ProblemBuilder
-from options.options import SysOptions
-from submission.models import Submission, JudgeStatus
+from submission.models import Submission
 from utils.api import APIView, CSRFExemptAPIView, validate_serializer, APIError, HttpResponse
-from utils.constants import Difficulty
-from utils.shortcuts import rand_str, natural_sort_key
-from utils.tasks import delete_files
+from utils.PlagiarismChecker.Plag.plagjob import PlagJob
+from utils.shortcuts import rand_str, file_response
+from ..export import ProblemExportJob, ProblemExportStatus
+from ..importer import ProblemImportJob, TestCaseZipProcessor
 from ..models import Problem, ProblemRuleType, ProblemTag
 from ..serializers import (CreateContestProblemSerializer, CompileSPJSerializer,
                            CreateProblemSerializer, EditProblemSerializer, EditContestProblemSerializer,
                            ProblemAdminSerializer, TestCaseUploadForm, ContestProblemMakePublicSerializer,
-                           AddContestProblemSerializer, ExportProblemSerializer,
-                           ExportProblemRequestSerialzier, UploadProblemForm, ImportProblemSerializer,
-                           FPSProblemSerializer)
-from ..utils import TEMPLATE_BASE, build_problem_template
+                           AddContestProblemSerializer,
+                           ExportProblemRequestSerialzier, UploadProblemForm)
+from ..tasks import build_test_case_archive
+from ..test_case_archive import TestCaseArchiveCache
 import logging
 
 
-class TestCaseZipProcessor(object):
-    def process_zip(self, uploaded_zip_file, spj, dir=""):
-        try:
-            zip_file = zipfile.ZipFile(uploaded_zip_file, "r")
-        except zipfile.BadZipFile:
-            raise APIError("Bad zip file")
-        name_list = zip_file.namelist()
-        test_case_list = self.filter_name_list(name_list, spj=spj, dir=dir)
-        if not test_case_list:
-            raise APIError("Empty file")
-
-        test_case_id = rand_str()
-        test_case_dir = os.path.join(settings.TEST_CASE_DIR, test_case_id)
-        os.mkdir(test_case_dir)
-        os.chmod(test_case_dir, 0o710)
-
-        size_cache = {}
-        md5_cache = {}
-
-        for item in test_case_list:
-            with open(os.path.join(test_case_dir, item), "wb") as f:
-                content = zip_file.read(f"{dir}{item}").replace(b"\r\n", b"\n")
-                size_cache[item] = len(content)
-                if item.endswith(".out"):
-                    md5_cache[item] = hashlib.md5(content.rstrip()).hexdigest()
-                f.write(content)
-        test_case_info = {"spj": spj, "test_cases": {}}
-
-        info = []
-
-        if spj:
-            for index, item in enumerate(test_case_list):
-                data = {"input_name": item, "input_size": size_cache[item]}
-                info.append(data)
-                test_case_info["test_cases"][str(index + 1)] = data
-        else:
-            # ["1.in", "1.out", "2.in", "2.out"] => [("1.in", "1.out"), ("2.in", "2.out")]
-            test_case_list = zip(*[test_case_list[i::2] for i in range(2)])
-            for index, item in enumerate(test_case_list):
-                data = {"stripped_output_md5": md5_cache[item[1]],
-                        "input_size": size_cache[item[0]],
-                        "output_size": size_cache[item[1]],
-                        "input_name": item[0],
-                        "output_name": item[1]}
-                info.append(data)
-                test_case_info["test_cases"][str(index + 1)] = data
-
-        with open(os.path.join(test_case_dir, "info"), "w", encoding="utf-8") as f:
-            f.write(json.dumps(test_case_info, indent=4))
-
-        for item in os.listdir(test_case_dir):
-            os.chmod(os.path.join(test_case_dir, item), 0o640)
-
-        return info, test_case_id
-
-    def filter_name_list(self, name_list, spj, dir=""):
-        ret = []
-        prefix = 1
-        if spj:
-            while True:
-                in_name = f"{prefix}.in"
-                if f"{dir}{in_name}" in name_list:
-                    ret.append(in_name)
-                    prefix += 1
-                    continue
-                else:
-                    return sorted(ret, key=natural_sort_key)
-        else:
-            while True:
-                in_name = f"{prefix}.in"
-                out_name = f"{prefix}.out"
-                if f"{dir}{in_name}" in name_list and f"{dir}{out_name}" in name_list:
-                    ret.append(in_name)
-                    ret.append(out_name)
-                    prefix += 1
-                    continue
-                else:
-                    return sorted(ret, key=natural_sort_key)
-
-
 class TestCaseAPI(CSRFExemptAPIView, TestCaseZipProcessor):
     request_parsers = ()
 
@@ -130,21 +44,14 @@ class TestCaseAPI(CSRFExemptAPIView, TestCaseZipProcessor):
         else:
             ensure_created_by(problem, request.user)
 
-        test_case_dir = os.path.join(settings.TEST_CASE_DIR, problem.test_case_id)
-        if not os.path.isdir(test_case_dir):
+        try:
+            file_name = TestCaseArchiveCache().get(problem.test_case_id)
+        except FileNotFoundError:
             return self.error("Test case does not exists")
-        name_list = self.filter_name_list(os.listdir(test_case_dir), problem.spj)
-        name_list.append("info")
-        file_name = os.path.join(test_case_dir, problem.test_case_id + ".zip")
-        with zipfile.ZipFile(file_name, "w") as file:
-            for test_case in name_list:
-                file.write(f"{test_case_dir}/{test_case}", test_case)
-        response = StreamingHttpResponse(FileWrapper(open(file_name, "rb")),
-                                         content_type="application/octet-stream")
-
-        response["Content-Disposition"] = f"attachment; filename=problem_{problem.id}_test_cases.zip"
-        response["Content-Length"] = os.path.getsize(file_name)
-        return response
+        accel_path = None
+        if settings.TEST_CASE_ARCHIVE_ACCEL_PREFIX:
+            accel_path = f"{settings.TEST_CASE_ARCHIVE_ACCEL_PREFIX}/{os.path.basename(file_name)}"
+        return file_response(request, file_name, f"problem_{problem.id}_test_cases.zip", accel_path=accel_path)
 
     def post(self, request):
         form = TestCaseUploadForm(request.POST, request.FILES)
@@ -159,6 +66,8 @@ class TestCaseAPI(CSRFExemptAPIView, TestCaseZipProcessor):
                 f.write(chunk)
         info, test_case_id = self.process_zip(zip_file, spj=spj)
         os.remove(zip_file)
+        if settings.TEST_CASE_ARCHIVE_PREBUILD:
+            build_test_case_archive.send(test_case_id)
         return self.success({"id": test_case_id, "info": info, "spj": spj})
 
 
@@ -526,53 +435,69 @@ class CopyKillerAPIView(APIView):
         return self.success(result)
 
 
-class CopyKiller(CSRFExemptAPIView):
+class CopyKillerJobBase(object):
+    job_id_re = re.compile(r"^[0-9a-f]{16}-[0-9a-f]{16}$")
+
+    def create_job(self, ids):
+        if not ids:
+            raise APIError("Problem does not exist")
+        try:
+            problems = Problem.objects.filter(id__in=ids).select_related("contest")
+            if len(problems) != len(set(ids)):
+                raise APIError("Problem does not exist")
+        except ValueError:
+            raise APIError("Problem does not exist")
+        if any(problem.contest is None or problem.contest.lecture_id is None for problem in problems):
+            raise APIError("Only lecture problems can be checked")
+        return PlagJob.create(ids)
+
+    def get_job_id(self, request):
+        job_id = request.GET.get("job_id", "")
+        if not self.job_id_re.match(job_id):
+            raise APIError("Invalid job_id")
+        return job_id
+
+
+class CopyKiller(CSRFExemptAPIView, CopyKillerJobBase):
     request_parsers = ()
 
+    @admin_role_required
     def get(self, request):
-        id = request.GET.getlist("id")
-
-        if len(id) > 0:
-            try:
-                problem = Problem.objects.get(id=id[0])
-            except Problem.DoesNotExist:
-                return self.error("Problem does not exist")
-
-        import utils.PlagiarismChecker.Plag.plagchecker as copyKiller
-        import os
+        # 결과가 이미 있으면 바로 내려받고, 없으면 worker 에서 검사를 시작하고 진행 상황을 돌려준다
+        ids = request.GET.getlist("id")
+        job = self.create_job(ids)
+        if job.ready():
+            return file_response(request, PlagJob.resultPath(job.job_id), f"{ids[0]}_copykiller.zip")
+        job.start()
+        return self.success(PlagJob.progress(job.job_id))
 
-        file_locate = ''
 
-        if len(id) == 1:
-            file_locate = copyKiller.singleLecture(problem.contest.lecture.id, problem.contest.id, problem.id)
-        else:
-            _lecList = list()
-            _contList = list()
-            _probList = id
-
-            for val in _probList:
-                prob = Problem.objects.get(id=val)
-                _lecList.append(prob.contest.lecture.id)
-                _contList.append(prob.contest.id)
+class CopyKillerJobAPI(APIView, CopyKillerJobBase):
+    @admin_role_required
+    def get(self, request):
+        job_id = self.get_job_id(request)
+        progress = PlagJob.progress(job_id)
+        if "status" not in progress:
+            return self.error("Job does not exist")
+        return self.success(progress)
 
-            file_locate = copyKiller.multiLecture(_lecList, _contList, _probList)
+    @admin_role_required
+    def post(self, request):
+        job = self.create_job(request.data.get("id") or [])
+        job.start()
+        return self.success(PlagJob.progress(job.job_id))
 
-        locate = os.getcwd() + file_locate[1:]
-        if os.path.isfile(locate+ "/copy.zip"):
-            os.remove(locate+ "/copy.zip")
-        file_name = os.path.join(locate, "copy.zip")
-        name_list = os.listdir(locate)
-        with zipfile.ZipFile(file_name, "w") as file:
-            for files in name_list:
-                file.write(f"{locate}/{files}", files)
-        response = StreamingHttpResponse(FileWrapper(open(file_name, "rb")),
-                                         content_type="application/octet-stream")
 
-        response["Content-Disposition"] = f"attachment; filename={problem.id}_copykiller.zip"
-        response["Content-Length"] = os.path.getsize(file_name)
+class CopyKillerResultAPI(CSRFExemptAPIView, CopyKillerJobBase):
+    request_parsers = ()
 
-        print('response')
-        return response
+    @admin_role_required
+    def get(self, request):
+        job_id = self.get_job_id(request)
+        path = PlagJob.resultPath(job_id)
+        if not os.path.exists(path):
+            return self.error("Result is not ready")
+        return file_response(request, path, f"{job_id}_copykiller.zip")
 
 
 class AddContestProblemAPI(APIView):
@@ -608,205 +533,76 @@ class AddContestProblemAPI(APIView):
 
 
 class ExportProblemAPI(APIView):
-    def choose_answers(self, user, problem):
-        ret = []
-        for item in problem.languages:
-            submission = Submission.objects.filter(problem=problem,
-                                                   user_id=user.id,
-                                                   language=item,
-                                                   result=JudgeStatus.ACCEPTED).order_by("-create_time").first()
-            if submission:
-                ret.append({"language": submission.language, "code": submission.code})
-        return ret
-
-    def process_one_problem(self, zip_file, user, problem, index):
-        info = ExportProblemSerializer(problem).data
-        info["answers"] = self.choose_answers(user, problem=problem)
-        compression = zipfile.ZIP_DEFLATED
-        zip_file.writestr(zinfo_or_arcname=f"{index}/problem.json",
-                          data=json.dumps(info, indent=4),
-                          compress_type=compression)
-        problem_test_case_dir = os.path.join(settings.TEST_CASE_DIR, problem.test_case_id)
-        with open(os.path.join(problem_test_case_dir, "info")) as f:
-            info = json.load(f)
-        for k, v in info["test_cases"].items():
-            zip_file.write(filename=os.path.join(problem_test_case_dir, v["input_name"]),
-                           arcname=f"{index}/testcase/{v['input_name']}",
-                           compress_type=compression)
-            if not info["spj"]:
-                zip_file.write(filename=os.path.join(problem_test_case_dir, v["output_name"]),
-                               arcname=f"{index}/testcase/{v['output_name']}",
-                               compress_type=compression)
+    """
+    GET problem_id: worker 에서 내보내기 zip 을 만들기 시작하고 진행 상황을 돌려준다
+    GET job_id: 다 만들었으면 zip 을 내려받고, 아니면 진행 상황 (status, done, total) 을 돌려준다
+    """
+    job_id_re = re.compile(r"^[0-9a-f]{32}$")
 
     @validate_serializer(ExportProblemRequestSerialzier)
-    def get(self, request):
-        problems = Problem.objects.filter(id__in=request.data["problem_id"])
+    def start(self, request):
+        problem_ids = request.data["problem_id"]
+        problems = Problem.objects.filter(id__in=problem_ids).select_related("contest")
         for problem in problems:
             if problem.contest:
                 ensure_created_by(problem.contest, request.user)
             else:
                 ensure_created_by(problem, request.user)
-        path = f"/tmp/{rand_str()}.zip"
-        with zipfile.ZipFile(path, "w") as zip_file:
-            for index, problem in enumerate(problems):
-                self.process_one_problem(zip_file=zip_file, user=request.user, problem=problem, index=index + 1)
-        delete_files.send_with_options(args=(path,), delay=300_000)
-        resp = FileResponse(open(path, "rb"))
-        resp["Content-Type"] = "application/zip"
-        resp["Content-Disposition"] = f"attachment;filename=problem-export.zip"
-        return resp
-
-
-class ImportProblemAPI(CSRFExemptAPIView, TestCaseZipProcessor):
-    request_parsers = ()
+        job = ProblemExportJob.create(request.user.id, [problem.id for problem in problems])
+        job.start()
+        return self.success(ProblemExportJob.progress(job.job_id))
+
+    @problem_permission_required
+    def get(self, request):
+        job_id = request.GET.get("job_id")
+        if job_id is None:
+            return self.start(request)
+        if not self.job_id_re.match(job_id):
+            return self.error("Invalid job_id")
+        progress = ProblemExportJob.progress(job_id)
+        # 만료되었거나 없는 job 은 job_id 만 있다
+        if "user_id" not in progress or progress["user_id"] != request.user.id:
+            return self.error("Job does not exist")
+        if progress.get("status") == ProblemExportStatus.FINISHED:
+            path = ProblemExportJob.exportPath(job_id)
+            if not os.path.exists(path):
+                return self.error("Export file has expired")
+            return file_response(request, path, "problem-export.zip", content_type="application/zip")
+        return self.success(progress)
+
+
+class ProblemImportJobMixin(object):
+    """
+    POST 로 올린 파일은 worker 에서 문제로 만들고, GET job_id 로 진행 상황과 문제별 오류를 확인한다
+    """
+    job_id_re = re.compile(r"^[0-9a-f]{32}$")
+    import_kind = "zip"
 
+    @problem_permission_required
+    def get(self, request):
+        job_id = request.GET.get("job_id", "")
+        if not self.job_id_re.match(job_id):
+            return self.error("Invalid job_id")
+        progress = ProblemImportJob.progress(job_id)
+        if "user_id" not in progress or progress["user_id"] != request.user.id:
+            return self.error("Job does not exist")
+        return self.success(progress)
+
+    @problem_permission_required
     def post(self, request):
         form = UploadProblemForm(request.POST, request.FILES)
-        if form.is_valid():
-            file = form.cleaned_data["file"]
-            tmp_file = f"/tmp/{rand_str()}.zip"
-            with open(tmp_file, "wb") as f:
-                for chunk in file:
-                    f.write(chunk)
-        else:
+        if not form.is_valid():
             return self.error("Upload failed")
+        job = ProblemImportJob.create(request.user.id, self.import_kind, form.cleaned_data["file"])
+        job.start()
+        return self.success(ProblemImportJob.progress(job.job_id))
+
 
-        count = 0
-        with zipfile.ZipFile(tmp_file, "r") as zip_file:
-            name_list = zip_file.namelist()
-            for item in name_list:
-                if "/problem.json" in item:
-                    count += 1
-            with transaction.atomic():
-                for i in range(1, count + 1):
-                    with zip_file.open(f"{i}/problem.json") as f:
-                        problem_info = json.load(f)
-                        serializer = ImportProblemSerializer(data=problem_info)
-                        if not serializer.is_valid():
-                            return self.error(f"Invalid problem format, error is {serializer.errors}")
-                        else:
-                            problem_info = serializer.data
-                            for item in problem_info["template"].keys():
-                                if item not in SysOptions.language_names:
-                                    return self.error(f"Unsupported language {item}")
-
-                        problem_info["display_id"] = problem_info["display_id"][:24]
-                        for k, v in problem_info["template"].items():
-                            problem_info["template"][k] = build_problem_template(v["prepend"], v["template"],
-                                                                                 v["append"])
-
-                        spj = problem_info["spj"] is not None
-                        rule_type = problem_info["rule_type"]
-                        test_case_score = problem_info["test_case_score"]
-
-                        # process test case
-                        _, test_case_id = self.process_zip(tmp_file, spj=spj, dir=f"{i}/testcase/")
-
-                        problem_obj = Problem.objects.create(_id=problem_info["display_id"],
-                                                             title=problem_info["title"],
-                                                             description=problem_info["description"]["value"],
-                                                             input_description=problem_info["input_description"][
-                                                                 "value"],
-                                                             output_description=problem_info["output_description"][
-                                                                 "value"],
-                                                             hint=problem_info["hint"]["value"],
-                                                             test_case_score=test_case_score if test_case_score else [],
-                                                             time_limit=problem_info["time_limit"],
-                                                             memory_limit=problem_info["memory_limit"],
-                                                             samples=problem_info["samples"],
-                                                             template=problem_info["template"],
-                                                             rule_type=problem_info["rule_type"],
-                                                             source=problem_info["source"],
-                                                             spj=spj,
-                                                             spj_code=problem_info["spj"]["code"] if spj else None,
-                                                             spj_language=problem_info["spj"][
-                                                                 "language"] if spj else None,
-                                                             spj_version=rand_str(8) if spj else "",
-                                                             languages=SysOptions.language_names,
-                                                             created_by=request.user,
-                                                             visible=False,
-                                                             difficulty=Difficulty.MID,
-                                                             total_score=sum(item["score"] for item in test_case_score)
-                                                             if rule_type == ProblemRuleType.OI else 0,
-                                                             test_case_id=test_case_id
-                                                             )
-                        for tag_name in problem_info["tags"]:
-                            tag_obj, _ = ProblemTag.objects.get_or_create(name=tag_name)
-                            problem_obj.tags.add(tag_obj)
-        return self.success({"import_count": count})
-
-
-class FPSProblemImport(CSRFExemptAPIView):
+class ImportProblemAPI(ProblemImportJobMixin, CSRFExemptAPIView):
     request_parsers = ()
+    import_kind = "zip"
 
-    def _create_problem(self, problem_data, creator):
-        if problem_data["time_limit"]["unit"] == "ms":
-            time_limit = problem_data["time_limit"]["value"]
-        else:
-            time_limit = problem_data["time_limit"]["value"] * 1000
-        template = {}
-        prepend = {}
-        append = {}
-        for t in problem_data["prepend"]:
-            prepend[t["language"]] = t["code"]
-        for t in problem_data["append"]:
-            append[t["language"]] = t["code"]
-        for t in problem_data["template"]:
-            our_lang = lang = t["language"]
-            if lang == "Python":
-                our_lang = "Python3"
-            template[our_lang] = TEMPLATE_BASE.format(prepend.get(lang, ""), t["code"], append.get(lang, ""))
-        spj = problem_data["spj"] is not None
-        Problem.objects.create(_id=f"fps-{rand_str(4)}",
-                               title=problem_data["title"],
-                               description=problem_data["description"],
-                               input_description=problem_data["input"],
-                               output_description=problem_data["output"],
-                               hint=problem_data["hint"],
-                               test_case_score=problem_data["test_case_score"],
-                               time_limit=time_limit,
-                               memory_limit=problem_data["memory_limit"]["value"],
-                               samples=problem_data["samples"],
-                               template=template,
-                               rule_type=ProblemRuleType.ACM,
-                               source=problem_data.get("source", ""),
-                               spj=spj,
-                               spj_code=problem_data["spj"]["code"] if spj else None,
-                               spj_language=problem_data["spj"]["language"] if spj else None,
-                               spj_version=rand_str(8) if spj else "",
-                               visible=False,
-                               languages=SysOptions.language_names,
-                               created_by=creator,
-                               difficulty=Difficulty.MID,
-                               test_case_id=problem_data["test_case_id"])
 
-    def post(self, request):
-        form = UploadProblemForm(request.POST, request.FILES)
-        if form.is_valid():
-            file = form.cleaned_data["file"]
-            with tempfile.NamedTemporaryFile("wb") as tf:
-                for chunk in file.chunks(4096):
-                    tf.file.write(chunk)
-                problems = FPSParser(tf.name).parse()
-        else:
-            return self.error("Parse upload file error")
-
-        helper = FPSHelper()
-        with transaction.atomic():
-            for _problem in problems:
-                test_case_id = rand_str()
-                test_case_dir = os.path.join(settings.TEST_CASE_DIR, test_case_id)
-                os.mkdir(test_case_dir)
-                score = []
-                for item in helper.save_test_case(_problem, test_case_dir)["test_cases"].values():
-                    score.append({"score": 0, "input_name": item["input_name"],
-                                  "output_name": item.get("output_name")})
-                problem_data = helper.save_image(_problem, settings.UPLOAD_DIR, settings.UPLOAD_PREFIX)
-                s = FPSProblemSerializer(data=problem_data)
-                if not s.is_valid():
-                    return self.error(f"Parse FPS file error: {s.errors}")
-                problem_data = s.data
-                problem_data["test_case_id"] = test_case_id
-                problem_data["test_case_score"] = score
-                self._create_problem(problem_data, request.user)
-        return self.success({"import_count": len(problems)})
+class FPSProblemImport(ProblemImportJobMixin, CSRFExemptAPIView):
+    request_parsers = ()
+    import_kind = "fps"
@@ -47,20 +47,91 @@ class Submission(models.Model):
     lecture = models.ForeignKey(Lecture, null=True, on_delete=models.CASCADE)
 
     def check_user_permission(self, user, check_share=True):
-        ta_user = ta_admin_class.objects.filter(lecture__id=self.lecture_id, user__id=user.id)
-        if self.user_id == user.id or user.is_super_admin() or user.can_mgmt_all_problem() or self.problem.created_by_id == user.id or ta_user[0].code_isallow:
-            return True
-
-        if check_share:
-            if self.contest and self.contest.status != ContestStatus.CONTEST_ENDED:
-                return False
-            if self.problem.share_submission or self.shared:
-                return True
-        return False
+        return SubmissionPermission(user, [self]).check(self, check_share)
 
     class Meta:
         db_table = "submission"
         ordering = ("-create_time",)
+        # 목록 API 의 keyset 페이지네이션 (create_time, id) 순서
+        indexes = [
+            models.Index(fields=["-create_time", "-id"], name="submission_time_idx"),
+            models.Index(fields=["contest", "-create_time", "-id"], name="submission_contest_time_idx"),
+            models.Index(fields=["user", "-create_time", "-id"], name="submission_user_time_idx"),
+        ]
 
     def __str__(self):
         return self.id
+
+
+class SubmissionPermission:
+    """
+    user 가 제출 목록의 각 제출 코드를 볼 수 있는지 계산한다
+    사용자 권한, 코드 열람이 허용된 TA 강의, 문제 작성자/공유 여부, 대회 상태를 목록 전체에 대해 한 번씩만 읽는다
+    """
+    def __init__(self, user, submissions):
+        self.user = user
+        self.submissions = submissions
+        self.is_manager = user.is_super_admin() or user.can_mgmt_all_problem()
+        self._ta_lectures = None
+        self._problems = None
+        self._contests = None
+
+    @property
+    def ta_lectures(self):
+        if self._ta_lectures is None:
+            self._ta_lectures = set(ta_admin_class.objects.filter(user_id=self.user.id, code_isallow=True)
+                                    .values_list("lecture_id", flat=True))
+        return self._ta_lectures
+
+    @property
+    def problems(self):
+        """
+        {problem_id: (created_by_id, share_submission)}, select_related 로 읽은 문제는 다시 읽지 않는다
+        """
+        if self._problems is None:
+            self._problems = {}
+            missing = set()
+            for submission in self.submissions:
+                if Submission.problem.is_cached(submission):
+                    problem = submission.problem
+                    self._problems[problem.id] = (problem.created_by_id, problem.share_submission)
+                else:
+                    missing.add(submission.problem_id)
+            if missing:
+                for problem_id, created_by_id, share_submission in \
+                        Problem.objects.filter(id__in=missing).values_list("id", "created_by_id", "share_submission"):
+                    self._problems[problem_id] = (created_by_id, share_submission)
+        return self._problems
+
+    @property
+    def contests(self):
+        """
+        {contest_id: 대회 상태}
+        """
+        if self._contests is None:
+            self._contests = {}
+            missing = set()
+            for submission in self.submissions:
+                if submission.contest_id is None:
+                    continue
+                if Submission.contest.is_cached(submission):
+                    self._contests[submission.contest_id] = submission.contest.status
+                else:
+                    missing.add(submission.contest_id)
+            if missing:
+                for contest in Contest.objects.filter(id__in=missing).only("id", "start_time", "end_time"):
+                    self._contests[contest.id] = contest.status
+        return self._contests
+
+    def check(self, submission, check_share=True):
+        created_by_id, share_submission = self.problems[submission.problem_id]
+        if submission.user_id == self.user.id or self.is_manager or created_by_id == self.user.id or \
+                submission.lecture_id in self.ta_lectures:
+            return True
+
+        if check_share:
+            if submission.contest_id and self.contests[submission.contest_id] != ContestStatus.CONTEST_ENDED:
+                return False
+            if share_submission or submission.shared:
+                return True
+        return False
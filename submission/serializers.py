@@ -1,5 +1,5 @@
 from utils.api import UsernameSerializer
-from .models import Submission
+from .models import Submission, SubmissionPermission
 from utils.api import serializers
 from utils.serializers import LanguageNameChoiceField
 
@@ -41,6 +41,7 @@ class SubmissionListSerializer(serializers.ModelSerializer):
 
     def __init__(self, *args, **kwargs):
         self.user = kwargs.pop("user", None)
+        self.permission = None
         super().__init__(*args, **kwargs)
 
     class Meta:
@@ -51,4 +52,8 @@ class SubmissionListSerializer(serializers.ModelSerializer):
         # 没传user或为匿名user
         if self.user is None or not self.user.is_authenticated:
             return False
-        return obj.check_user_permission(self.user)
+        # many=True 이면 목록 전체의 권한을 처음 한 번만 계산한다
+        if self.permission is None:
+            submissions = self.parent.instance if self.parent is not None else [obj]
+            self.permission = SubmissionPermission(self.user, submissions)
+        return self.permission.check(obj)
@@ -1,8 +1,17 @@
 from copy import deepcopy
 from unittest import mock
 
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from account.models import User
+from options.options import SysOptions
 from problem.models import Problem, ProblemTag
 from utils.api.tests import APITestCase
+from utils.cache import cache
+from utils.constants import CacheKey
+from utils.throttling import TokenBucket, consume_buckets
 from .models import Submission
 
 DEFAULT_PROBLEM_DATA = {"_id": "A-110", "title": "test", "description": "<p>test</p>", "input_description": "test",
@@ -56,6 +65,44 @@ class SubmissionListTest(SubmissionPrepare):
         resp = self.client.get(self.url, data={"limit": "10"})
         self.assertSuccess(resp)
 
+    def test_get_submission_list_with_cursor(self):
+        for _ in range(4):
+            Submission.objects.create(**self.submission_data)
+        ids = []
+        cursor = ""
+        while cursor is not None:
+            resp = self.client.get(self.url, data={"limit": "2", "cursor": cursor})
+            self.assertSuccess(resp)
+            ids.extend(item["id"] for item in resp.data["data"]["results"])
+            self.assertEqual(resp.data["data"]["total"], 5)
+            cursor = resp.data["data"]["next_cursor"]
+        expected = Submission.objects.order_by("-create_time", "-id").values_list("id", flat=True)
+        self.assertEqual(ids, list(expected))
+
+    def test_get_submission_list_with_invalid_cursor(self):
+        resp = self.client.get(self.url, data={"limit": "2", "cursor": "invalid"})
+        self.assertFailed(resp)
+
+    def _count_list_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            resp = self.client.get(self.url, data={"limit": "50"})
+        self.assertSuccess(resp)
+        return len(context.captured_queries), resp.data["data"]["results"]
+
+    def test_submission_list_query_count_is_constant(self):
+        other = self.create_user("other", "other123", login=False)
+        self.submission_data.update({"user_id": other.id, "username": other.username})
+        Submission.objects.create(**self.submission_data)
+        small, results = self._count_list_queries()
+        self.assertEqual(len(results), 2)
+        for _ in range(30):
+            Submission.objects.create(**self.submission_data)
+        large, results = self._count_list_queries()
+        self.assertEqual(len(results), 32)
+        self.assertEqual(small, large)
+        # 문제가 공유되지 않았으므로 남의 코드는 볼 수 없다
+        self.assertFalse(any(item["show_link"] for item in results))
+
 
 @mock.patch("submission.views.oj.judge_task.send")
 class SubmissionAPITest(SubmissionPrepare):
@@ -76,3 +123,94 @@ class SubmissionAPITest(SubmissionPrepare):
         self.assertDictEqual(resp.data, {"error": "error",
                                          "data": "Python3 is now allowed in the problem"})
         judge_task.assert_not_called()
+
+    @override_settings(JUDGE_MODE="sync")
+    @mock.patch("submission.views.oj.JudgeDispatcher")
+    def test_create_submission_sync_mode(self, dispatcher, judge_task):
+        resp = self.client.post(self.url, self.submission_data)
+        self.assertSuccess(resp)
+        dispatcher.return_value.judge.assert_called_once()
+        judge_task.assert_not_called()
+
+    def _throttling_keys(self, users):
+        return [f"{CacheKey.throttling}:user:{user.id}" for user in users] + [f"{CacheKey.throttling}:ip:127.0.0.1"]
+
+    def _submit_as(self, users, times):
+        for user in users:
+            self.client.login(username=user.username, password="test123")
+            for _ in range(times):
+                self.assertSuccess(self.client.post(self.url, self.submission_data))
+
+    def test_shared_ip_is_not_throttled(self, judge_task):
+        # 실습실처럼 여러 사용자가 같은 IP 로 제출해도 사용자마다의 한도까지는 제출할 수 있다
+        users = [self.user] + [self.create_user(f"student{i}", "test123", login=False) for i in range(4)]
+        keys = self._throttling_keys(users)
+        cache.delete_many(keys)
+        self.addCleanup(cache.delete_many, keys)
+        origin = SysOptions.throttling
+        self.addCleanup(setattr, SysOptions, "throttling", origin)
+        SysOptions.throttling = {"ip": {"capacity": 3, "fill_rate": 0.001, "default_capacity": 3},
+                                 "user": {"capacity": 3, "fill_rate": 0.001, "default_capacity": 3}}
+        self._submit_as(users, 3)
+        self.assertFailed(self.client.post(self.url, self.submission_data))
+
+    def test_ip_throttling_when_enabled(self, judge_task):
+        users = [self.user, self.create_user("student", "test123", login=False)]
+        keys = self._throttling_keys(users)
+        cache.delete_many(keys)
+        self.addCleanup(cache.delete_many, keys)
+        origin = SysOptions.throttling
+        self.addCleanup(setattr, SysOptions, "throttling", origin)
+        SysOptions.throttling = {"ip": {"enabled": True, "capacity": 3, "fill_rate": 0.001, "default_capacity": 3},
+                                 "user": {"capacity": 3, "fill_rate": 0.001, "default_capacity": 3}}
+        self._submit_as(users[:1], 3)
+        self.client.login(username="student", password="test123")
+        self.assertFailed(self.client.post(self.url, self.submission_data))
+
+
+class SubmissionStatusAPITest(SubmissionPrepare):
+    def setUp(self):
+        self._create_problem_and_submission()
+        self.url = self.reverse("submission_status_api")
+
+    def test_get_own_submission_status(self):
+        self.client.login(username="test", password="test123")
+        self.submission.user_id = User.objects.get(username="test").id
+        self.submission.save()
+        resp = self.client.get(self.url, data={"id": self.submission.id})
+        self.assertSuccess(resp)
+        self.assertEqual(resp.data["data"]["result"], self.submission.result)
+        self.assertTrue(resp.data["data"]["finished"])
+
+    def test_get_other_submission_status(self):
+        self.create_user("other", "other123")
+        resp = self.client.get(self.url, data={"id": self.submission.id})
+        self.assertFailed(resp, "No permission for this submission")
+
+
+class TokenBucketTest(TestCase):
+    def setUp(self):
+        self.keys = [f"{CacheKey.throttling}:test:user", f"{CacheKey.throttling}:test:ip"]
+        cache.delete_many(self.keys)
+
+    def tearDown(self):
+        cache.delete_many(self.keys)
+
+    def test_consume_until_empty(self):
+        bucket = TokenBucket(key=self.keys[0], capacity=3, fill_rate=0.001, default_capacity=2, redis_conn=cache)
+        self.assertTrue(bucket.consume()[0])
+        self.assertTrue(bucket.consume()[0])
+        result, wait = bucket.consume()
+        self.assertFalse(result)
+        self.assertGreater(wait, 0)
+        # 오래 쓰지 않으면 만료된다
+        self.assertGreater(cache.ttl(self.keys[0]), 0)
+
+    def test_multi_scope_is_all_or_nothing(self):
+        user = TokenBucket(key=self.keys[0], capacity=5, fill_rate=0.001, default_capacity=5, redis_conn=cache)
+        ip = TokenBucket(key=self.keys[1], capacity=1, fill_rate=0.001, default_capacity=1, redis_conn=cache)
+        self.assertTrue(consume_buckets([user, ip])[0])
+        result, _, blocked = consume_buckets([user, ip])
+        self.assertFalse(result)
+        self.assertIs(blocked, ip)
+        self.assertEqual(float(cache.hget(self.keys[0], "last_capacity")), 4)
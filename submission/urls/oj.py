@@ -1,9 +1,10 @@
 from django.conf.urls import url
 
-from ..views.oj import SubmissionAPI, SubmissionListAPI, ContestSubmissionListAPI, SubmissionExistsAPI, SubmissionLogAPI, GithubPushAPI
+from ..views.oj import SubmissionAPI, SubmissionListAPI, ContestSubmissionListAPI, SubmissionExistsAPI, SubmissionLogAPI, GithubPushAPI, SubmissionStatusAPI
 
 urlpatterns = [
     url(r"^submission/?$", SubmissionAPI.as_view(), name="submission_api"),
+    url(r"^submission_status/?$", SubmissionStatusAPI.as_view(), name="submission_status_api"),
     url(r"^submissions/?$", SubmissionListAPI.as_view(), name="submission_list_api"),
     url(r"^submissionslog/?$", SubmissionLogAPI.as_view(), name="submission_log_api"),
     url(r"^submission_exists/?$", SubmissionExistsAPI.as_view(), name="submission_exists"),
@@ -3,40 +3,53 @@ import requests
 import base64
 
 import os
+from django.conf import settings
 from django.db.models import Q
 from account.decorators import login_required, check_contest_permission
 from contest.models import Contest, ContestStatus, ContestRuleType
 from judge.dispatcher import JudgeDispatcher
+from judge.tasks import judge_task
 from options.options import SysOptions
 from problem.models import Problem, ProblemRuleType
-from utils.api import APIView, validate_serializer
+from utils.api import APIView, CountMode, validate_serializer
 from utils.cache import cache
+from utils.constants import CacheKey
 from utils.captcha import Captcha
-from utils.throttling import TokenBucket
-from ..models import Submission
+from utils.throttling import TokenBucket, consume_buckets
+from ..models import Submission, JudgeStatus
 from ..serializers import (CreateSubmissionSerializer, SubmissionModelSerializer,
                            ShareSubmissionSerializer)
 from ..serializers import SubmissionSafeModelSerializer, SubmissionListSerializer
 
 
+# 목록 API 의 cursor 페이지네이션 순서, Submission.Meta.indexes 와 맞춘다
+SUBMISSION_KEYSET = ("-create_time", "-id")
+
+
 class SubmissionAPI(APIView):
     def throttling(self, request):
         # 使用 open_api 的请求暂不做限制
         auth_method = getattr(request, "auth_method", "")
         if auth_method == "api_key":
             return
-        user_bucket = TokenBucket(key=str(request.user.id),
-                                  redis_conn=cache, **SysOptions.throttling["user"])
-        can_consume, wait = user_bucket.consume()
+        # 사용자, IP, 대회 안의 사용자 bucket 을 한 번에 확인하고 꺼낸다
+        config = SysOptions.throttling
+        buckets = [TokenBucket(key=f"{CacheKey.throttling}:user:{request.user.id}",
+                               redis_conn=cache, **config["user"])]
+        # IP bucket 은 "enabled" 를 켠 경우만 쓴다, 실습실처럼 여러 사용자가 한 IP 를 함께 쓰면 사용자 한도보다 먼저 막힌다
+        ip_config = dict(config.get("ip", {}))
+        ip = request.session.get("ip")
+        contest = getattr(self, "contest", None)
+        if ip and ip_config.pop("enabled", False) and not (contest and contest.allowed_ip_ranges):
+            buckets.append(TokenBucket(key=f"{CacheKey.throttling}:ip:{ip}", redis_conn=cache, **ip_config))
+        contest_id = request.data.get("contest_id")
+        if contest_id and "contest" in config:
+            buckets.append(TokenBucket(key=f"{CacheKey.throttling}:contest:{contest_id}:{request.user.id}",
+                                       redis_conn=cache, **config["contest"]))
+        can_consume, wait, _ = consume_buckets(buckets)
         if not can_consume:
             return "Please wait %d seconds" % (int(wait))
 
-        # ip_bucket = TokenBucket(key=request.session["ip"],
-        #                         redis_conn=cache, **SysOptions.throttling["ip"])
-        # can_consume, wait = ip_bucket.consume()
-        # if not can_consume:
-        #     return "Captcha is required"
-
     @check_contest_permission(check_type="problems")
     def check_contest_permission(self, request):
         contest = self.contest
@@ -108,9 +121,11 @@ class SubmissionAPI(APIView):
                                                    ip=request.session["ip"],
                                                    contest_id=data.get("contest_id"),
                                                    lecture_id=None)
-        # use this for debug
-        JudgeDispatcher(submission.id, problem.id).judge()
-        #judge_task.send(submission.id, problem.id)
+        if settings.JUDGE_MODE == "sync":
+            # use this for debug
+            JudgeDispatcher(submission.id, problem.id).judge()
+        else:
+            judge_task.send(submission.id, problem.id)
         if hide_id:
             return self.success()
         else:
@@ -155,6 +170,27 @@ class SubmissionAPI(APIView):
         return self.success()
 
 
+class SubmissionStatusAPI(APIView):
+    @login_required
+    def get(self, request):
+        """
+        비동기 채점 결과를 polling 하기 위한 API, code/info 같은 큰 필드는 읽지 않는다
+        """
+        submission_id = request.GET.get("id")
+        if not submission_id:
+            return self.error("Parameter id doesn't exist")
+        submission = Submission.objects.filter(id=submission_id).values("user_id", "result", "statistic_info").first()
+        if not submission:
+            return self.error("Submission doesn't exist")
+        if submission["user_id"] != request.user.id and not request.user.is_admin_role():
+            return self.error("No permission for this submission")
+        result = submission["result"]
+        return self.success({"id": submission_id,
+                             "result": result,
+                             "finished": result not in (JudgeStatus.PENDING, JudgeStatus.JUDGING),
+                             "statistic_info": submission["statistic_info"]})
+
+
 class SubmissionLogAPI(APIView):
     def get(self, request):
         print("SubmissionLogAPI GET")
@@ -180,7 +216,7 @@ class SubmissionListAPI(APIView):
         if request.GET.get("contest_id"):
             return self.error("Parameter error")
 
-        submissions = Submission.objects.filter(contest_id__isnull=True).select_related("problem__created_by")
+        submissions = Submission.objects.filter(contest_id__isnull=True).select_related("problem", "user")
         problem_id = request.GET.get("problem_id")
         myself = request.GET.get("myself")
         result = request.GET.get("result")
@@ -199,7 +235,7 @@ class SubmissionListAPI(APIView):
             submissions = submissions.filter(Q(user__realname__contains=username) | Q(username__icontains=username))
         if result:
             submissions = submissions.filter(result=result)
-        data = self.paginate_data(request, submissions)
+        data = self.paginate_data(request, submissions, keyset=SUBMISSION_KEYSET, count_mode=CountMode.ESTIMATE)
         data["results"] = SubmissionListSerializer(data["results"], many=True, user=request.user).data
         return self.success(data)
 
@@ -212,7 +248,7 @@ class ContestSubmissionListAPI(APIView):
             return self.error("Limit is needed")
 
         contest = self.contest
-        submissions = Submission.objects.filter(contest_id=contest.id).select_related("problem__created_by").select_related("user")
+        submissions = Submission.objects.filter(contest_id=contest.id).select_related("problem", "user")
 
         problem_id = request.GET.get("problem_id")
         myself = request.GET.get("myself")
@@ -241,7 +277,7 @@ class ContestSubmissionListAPI(APIView):
             if not contest.real_time_rank and not request.user.is_contest_admin(contest):
                 submissions = submissions.filter(user_id=request.user.id)
 
-        data = self.paginate_data(request, submissions)
+        data = self.paginate_data(request, submissions, keyset=SUBMISSION_KEYSET, count_mode=CountMode.ESTIMATE)
         data["results"] = SubmissionListSerializer(data["results"], many=True, user=request.user).data
         return self.success(data)
 
@@ -3,32 +3,23 @@ import sys
 import json
 import django
 
-from utils.shortcuts import rand_str
-
 sys.path.append("../../")
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "oj.settings")
 django.setup()
 from problem.models import Problem
+from problem.test_case_store import TestCaseStore
 
 
 def copy_dataset_create(problems):
-    # copy dataset create
+    # copy dataset create (hardlink 로 복사하므로 디스크를 더 쓰지 않는다)
+    store = TestCaseStore()
     for _prob in problems:
-        test_case_id = rand_str()  # create new id
-        from django.conf import settings
-        test_case_dir = os.path.join(settings.TEST_CASE_DIR, test_case_id)
-        origin_test_case_dir = os.path.join(settings.TEST_CASE_DIR, _prob.test_case_id)
-        if not os.path.isdir(test_case_dir):
-            # os.mkdir(test_case_dir)
-            import shutil
-            shutil.copytree(origin_test_case_dir, test_case_dir)  # copy_dataset
+        test_case_id = store.copy(_prob.test_case_id)
         print(": change testCase id")
 
         _prob.test_case_id = test_case_id
         _prob.save()
 
-        os.chmod(test_case_dir, 0o710)
-
 
 def main():
     try:
@@ -1,54 +1,69 @@
-from django.db.models import Max
+import datetime
+
+from django.db import transaction
 
 from lecture.models import signup_class
-from lecture.views.LectureAnalysis import lecDispatcher
+from lecture.views.LectureBuilder import BATCH_CHUNK_SIZE, saveScores
+from lecture.views.LectureScoreTree import ScoreTree
 from problem.models import Problem
 from submission.models import Submission
 
-import datetime
+
+def latestSubmissions(lecture_id, user_ids):
+    '''
+        학생마다 (contest, problem) 별 가장 최근 제출
+    '''
+    return Submission.objects.filter(lecture=lecture_id, user_id__in=user_ids).select_related("contest") \
+        .order_by("user_id", "contest_id", "problem_id", "-create_time").distinct("user_id", "contest_id", "problem_id")
+
+
+def migrateLecture(lecture_id):
+    '''
+        Lecture 의 문제 목록과 학생별 최근 제출로 score 를 처음부터 다시 만들고, 성적표 summary 도 함께 저장한다
+
+        @return : 수정한 학생 수
+    '''
+    base = ScoreTree()
+    for p in Problem.objects.filter(contest__lecture=lecture_id).select_related('contest'):
+        base.migrateProblem(p)
+    base.cleanDataForScorebard()
+    template = base.dump()
+
+    students = signup_class.objects.filter(isallow=True, lecture=lecture_id).order_by("id")
+    last_id = 0
+    done = 0
+    while True:
+        ids = list(students.filter(id__gt=last_id).values_list("id", flat=True)[:BATCH_CHUNK_SIZE])
+        if not ids:
+            break
+        last_id = ids[-1]
+        # 잠근 뒤에 제출을 읽어서, 그 사이에 LectureSubmit 으로 저장된 결과를 덮어쓰지 않는다
+        with transaction.atomic():
+            rows = list(signup_class.objects.select_for_update().filter(id__in=ids)
+                        .only("id", "lecture_id", "user_id", "score").order_by("id"))
+            submissions = dict()
+            for submit in latestSubmissions(lecture_id, [row.user_id for row in rows]):
+                submissions.setdefault(submit.user_id, []).append(submit)
+            pairs = []
+            for row in rows:
+                tree = ScoreTree.load(template)
+                for submit in submissions.get(row.user_id, []):
+                    tree.associateSubmission(submit)
+                pairs.append((row, tree))
+            saveScores(pairs)
+        done += len(ids)
+    return done
+
 
 def migrate():
-    year = datetime.today().year
-    semester = (8 > datetime.today().month >= 3) and 1 or (3 > datetime.today().month >= 1) and 3 or 2
-
-    try:
-        print("Try")
-        lectures = signup_class.objects.filter(isallow=True, lecture__year=year, lecture__semester=semester).select_related('lecture').order_by('lecture')
-        lid = -1
-        total = lectures.count()
-        cnt = 0
-        for lec in lectures:
-            try:
-                cnt += 1
-
-                if lid != lec.lecture_id:
-                    lid = lec.lecture_id
-
-                    plist = Problem.objects.filter(contest__lecture=lec.lecture_id).prefetch_related('contest')
-
-                    # test
-                    LectureInfo = lecDispatcher()
-                    for p in plist:
-                        LectureInfo.migrateProblem(p)
-
-                    # get Submission
-                    sublist = Submission.objects.filter(lecture=lec.lecture_id)
-
-                ldates = sublist.filter(user=lec.user).values('contest', 'problem').annotate(
-                    latest_created_at=Max('create_time'))
-                sdata = sublist.filter(create_time__in=ldates.values('latest_created_at')).order_by('-create_time')
-                LectureInfo.cleanDataForScorebard()
-
-                for submit in sdata:
-                    LectureInfo.associateSubmission(submit)
-
-                lec.score = LectureInfo.toDict()
-                lec.save()
-
-                print("(", cnt, "/", total, ")", lec.lecture_id, lec.id, lec.user.realname, lec.user.username,
-                      lec.lecture.title, 'Completedd')
-            except:
-                print("exception")
-
-    except:
-        print("exception")
\ No newline at end of file
+    today = datetime.date.today()
+    year = today.year
+    semester = (8 > today.month >= 3) and 1 or (3 > today.month >= 1) and 3 or 2
+
+    lecture_ids = signup_class.objects.filter(isallow=True, lecture__year=year, lecture__semester=semester) \
+        .values_list("lecture_id", flat=True).distinct()
+    for lecture_id in lecture_ids:
+        try:
+            print(lecture_id, migrateLecture(lecture_id), "students Completed")
+        except Exception as e:
+            print("exception", lecture_id, e)
@@ -2,20 +2,22 @@ import errno
 import shutil
 import sys
 import os
-import numpy as np
-import pandas as pd
-from subprocess import Popen, PIPE
 #from sqlmanager import SQLManager
+from django.conf import settings
 from submission.models import Submission
-from django.db.models import Max
 import json
 
+from problem.models import Plag_Summary, Problem
+from utils.PlagiarismChecker.Plag import winnowing
+from utils.PlagiarismChecker.Plag.plagindex import PlagIndex, load_fingerprints, to_fingerprint
+
 class PlagChecker:
     data = None
 
-    def __init__(self, _lid=-1, _cid=-1, _pid=-1, _multi=False):
+    def __init__(self, _lid=-1, _cid=-1, _pid=-1, _multi=False, _resultRoom=None):
         self.CheckRoomPath = './data/copykiller/checkroom'
-        self.ResultRoomPath = './data/copykiller/resultroom'
+        # 작업마다 다른 디렉터리를 넘겨야 동시에 검사해도 결과가 섞이지 않는다
+        self.ResultRoomPath = _resultRoom or './data/copykiller/resultroom'
         self.multi = _multi
         self.lid = _lid
         self.cid = _cid
@@ -31,25 +33,33 @@ class PlagChecker:
 
         #subdatas = {userID : submission ID}
         self.matchlist = dict()
+        # {제출 이름 : 코드}, {제출 이름 : Fingerprint}
+        self.codes = dict()
+        self.fingerprints = dict()
+        # {submission id : Plag_Fingerprint}
+        self.rows = dict()
 
     def runChecker(self):
-        data = self.loadSubmissionData()
-        print(data)
-        self.makeSourceFiles(data)
-        self.doChecker()
+        # 저장된 fingerprint 로 지난 검사 뒤에 바뀐 사용자만 비교하고, 결과는 Plag_Summary/Plag_Result 에서 읽는다
+        problem = Problem.objects.select_related("contest").get(id=self.pid)
+        index = PlagIndex(problem)
+        index.check()
+        self.makeReport(index)
 
         return self.ResRoom_SubDirPath
 
     def runMultiChecker(self):
         data = self.loadSubmissionDatas()
         print(data)
+        # 채점할 때 만들어 둔 fingerprint 를 쓴다
+        self.rows = load_fingerprints([submission.id for sub in data for submission in sub])
         self.makeMultiLectureSourceFiles(data)
         self.doChecker()
 
         return self.ResRoom_SubDirPath
 
     def loadSubmissionData(self):
-        data = Submission.objects.filter(lecture=self.lid, contest=self.cid, problem=self.pid)
+        data = self.DataSelector(Submission.objects.filter(lecture=self.lid, contest=self.cid, problem=self.pid))
 
         self.DataRowCnt = data.count()
 
@@ -64,7 +74,7 @@ class PlagChecker:
         data = list()
 
         for lec, cont, prob in zip(self.lid, self.cid, self.pid):
-            sub = Submission.objects.filter(lecture=lec, contest=cont, problem=prob)
+            sub = self.DataSelector(Submission.objects.filter(lecture=lec, contest=cont, problem=prob))
 
             self.DataRowCnt = sub.count()
 
@@ -81,84 +91,66 @@ class PlagChecker:
         return d[d['create_time'] == d['create_time'].max()]
 
     def DataSelector(self, data):
-        #data = data.groupby('user_id').apply(self.testset)
-        data = data.values('user', 'contest', 'problem').annotate(latest_created_at=Max('create_time'))
-        return data
+        # 사용자마다 가장 최근 제출 하나만 비교한다
+        latest = data.order_by('user_id', '-create_time').distinct('user_id').values_list('id', flat=True)
+        return Submission.objects.filter(id__in=list(latest)).select_related('user')
 
     def makeMultiLectureSourceFiles(self, data):
-        filechecker = True
-        #make base directory
-        if self.checkDirectory(self.CheckRoomPath):
-            #make submission dir
-            print('make sub directory')
-            if self.lid == -1:
-                lidname = 'x'
-            else:
-                lidname = str(self.lid[0])
-
-            self.subDirName = '/sub_' + lidname + '_' + str(self.cid[0]) + '_' + str(self.pid[0])
-            self.chkRoom_SubDirPath = self.CheckRoomPath + self.subDirName
-            self.ResRoom_SubDirPath = self.ResultRoomPath + self.subDirName
-
-            #Make Submission Dir
-            if self.checkDirectory(self.chkRoom_SubDirPath, True):
-                print('make files..')
-                rcnt = 0
-                for lec in data:
-                    for rdata in lec:
-                        uid = str(rdata.user.schoolssn)
-                        if rcnt == 0:
-                            siddir = self.chkRoom_SubDirPath + '/target_sid_' + str(self.lid[rcnt]) + "_" + str(uid)
-                        else:
-                            siddir = self.chkRoom_SubDirPath + '/sid_' + str(self.lid[rcnt]) + "_" + str(uid)
-                        if self.checkDirectory(siddir) is True:
-                            filename = siddir + '/code_' + str(self.lid[rcnt]) + "_" + uid + self.languageChecker(rdata.language)
-                            self.makeText(filename, rdata.code)
-                        else:
-                            filechecker = False
-                    rcnt += 1
-            else:
-                filechecker = True
+        # 첫 번째 강의의 제출은 target_ 을 붙여 구분한다
+        if self.lid == -1:
+            lidname = 'x'
         else:
-            filechecker = True
-
-        return filechecker
-
-    def makeSourceFiles(self, data):
-        filechecker = True
-        #make base directory
-        if self.checkDirectory(self.CheckRoomPath):
-            #make submission dir
-            print('make sub directory')
-            if self.lid == -1:
-                lidname = 'x'
-            else:
-                lidname = str(self.lid)
-
-            self.subDirName = '/sub_' + lidname + '_' + str(self.cid) + '_' + str(self.pid)
-            self.chkRoom_SubDirPath = self.CheckRoomPath + self.subDirName
-            self.ResRoom_SubDirPath = self.ResultRoomPath + self.subDirName
-
-            #Make Submission Dir
-            if self.checkDirectory(self.chkRoom_SubDirPath, True):
-                print('make files..')
-                rcnt = 1
-                for rdata in data:
-                    uid = str(rdata.user.schoolssn)
-                    siddir = self.chkRoom_SubDirPath + '/sid_' + str(self.lid) + "_" + str(uid)
-                    if self.checkDirectory(siddir) is True:
-
-                        filename = siddir + '/code_' + str(self.lid) + "_" + uid + self.languageChecker(rdata.language)
-                        self.makeText(filename, rdata.code)
-                        rcnt += 1
-                    else:
-                        filechecker = False
-            else:
-                filechecker = True
+            lidname = str(self.lid[0])
+
+        self.subDirName = '/sub_' + lidname + '_' + str(self.cid[0]) + '_' + str(self.pid[0])
+        self.ResRoom_SubDirPath = self.ResultRoomPath + self.subDirName
+
+        rcnt = 0
+        for lec in data:
+            for rdata in lec:
+                uid = str(rdata.user.schoolssn)
+                if rcnt == 0:
+                    name = 'target_sid_' + str(self.lid[rcnt]) + "_" + str(uid)
+                else:
+                    name = 'sid_' + str(self.lid[rcnt]) + "_" + str(uid)
+                self.addDocument(name, rdata)
+            rcnt += 1
+
+        return True
+
+    def makeReport(self, index):
+        if self.lid == -1:
+            lidname = 'x'
         else:
-            filechecker = True
-
-        return filechecker
+            lidname = str(self.lid)
+
+        self.subDirName = '/sub_' + lidname + '_' + str(self.cid) + '_' + str(self.pid)
+        self.ResRoom_SubDirPath = self.ResultRoomPath + self.subDirName
+
+        matches = index.matches()
+        users = {match.a for match in matches} | {match.b for match in matches}
+        summaries = Plag_Summary.objects.filter(problem_id=self.pid, user_id__in=users).values_list('user_id', 'summary')
+        submissions = Submission.objects.filter(id__in=[summary['submission_id'] for _, summary in summaries])
+        names = dict()
+        for submission in submissions.select_related('user').only('user__schoolssn', 'code'):
+            names[submission.user_id] = 'sid_' + str(self.lid) + "_" + str(submission.user.schoolssn)
+            self.codes[names[submission.user_id]] = submission.code
+        matches = [match._replace(a=names[match.a], b=names[match.b]) for match in matches
+                   if match.a in names and match.b in names]
+
+        self.checkDirectory(self.ResRoom_SubDirPath, True)
+        compared = Plag_Summary.objects.filter(problem_id=self.pid).count()
+        winnowing.write_report(self.ResRoom_SubDirPath, matches, self.codes, compared)
+        for match in matches:
+            self.matchlist.setdefault(match.a, dict())[match.b] = match.similarity
+            self.matchlist.setdefault(match.b, dict())[match.a] = match.similarity
+
+    def addDocument(self, name, submission):
+        self.codes[name] = submission.code
+        if submission.id in self.rows:
+            self.fingerprints[name] = to_fingerprint(self.rows[submission.id])
+        else:
+            self.fingerprints[name] = winnowing.fingerprint(submission.code, submission.language)
 
     def checkDirectory(self, name, delExist = False):
         try:
@@ -207,13 +199,14 @@ class PlagChecker:
         return ret
 
     def doChecker(self):
-        import os
-        p = Popen(['java', '-jar', os.getcwd()+'/utils/PlagiarismChecker/Plag/jplag/jplag-2.12.1-SNAPSHOT-jar-with-dependencies.jar', '-l', self.selectedLang, '-s', self.chkRoom_SubDirPath, '-r', self.ResRoom_SubDirPath], stdin=PIPE, stdout=PIPE)
-        stdout = p.communicate()[0]
-        print('STDOUT:{}'.format(stdout))
-        #self.matchClassifier(stdout)
-        #cmd = 'java -jar ./jplag/jplag-2.12.1-SNAPSHOT-jar-with-dependencies.jar -l c/c++ -s ../checkroom/'
-        #os.system(cmd)
+        # JPlag(java subprocess) 대신 winnowing engine 으로 비교하고 같은 형식의 report 를 만든다
+        matches = winnowing.WinnowingEngine(workers=settings.PLAGIARISM_WORKERS).compare(self.fingerprints)
+        self.checkDirectory(self.ResRoom_SubDirPath, True)
+        winnowing.write_report(self.ResRoom_SubDirPath, matches, self.codes, len(self.fingerprints))
+        for match in matches:
+            self.matchlist.setdefault(match.a, dict())[match.b] = match.similarity
+            self.matchlist.setdefault(match.b, dict())[match.a] = match.similarity
+        return matches
 
     def matchClassifier(self, data):
         class_text = 'Comparing '
@@ -243,10 +236,12 @@ class PlagChecker:
         app_json = json.dumps(ddata)
         return app_json
 
-def singleLecture(lec, cont, prob):
-    PC = PlagChecker(_lid=lec, _cid=cont, _pid=prob)
+
+def singleLecture(lec, cont, prob, resultRoom=None):
+    PC = PlagChecker(_lid=lec, _cid=cont, _pid=prob, _resultRoom=resultRoom)
     return PC.runChecker()
 
-def multiLecture(lecList, contList, probList):
-    PC = PlagChecker(_lid=lecList, _cid=contList, _pid=probList, _multi=True)
+
+def multiLecture(lecList, contList, probList, resultRoom=None):
+    PC = PlagChecker(_lid=lecList, _cid=contList, _pid=probList, _multi=True, _resultRoom=resultRoom)
     return PC.runMultiChecker()
\ No newline at end of file
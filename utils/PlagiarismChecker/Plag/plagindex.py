@@ -0,0 +1,170 @@
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+
+from problem.models import Plag_Fingerprint, Plag_Result, Plag_Summary
+from problem.utils import parse_problem_template
+from submission.models import Submission
+from utils.PlagiarismChecker.Plag import winnowing
+
+
+# pg_advisory_lock(key1, key2) 의 key1, 다른 기능의 advisory lock 과 겹치지 않도록 고정한다
+ADVISORY_LOCK_NAMESPACE = 0x504c4147
+
+
+@contextmanager
+def problem_check_lock(problem_id):
+    """
+    같은 문제의 검사를 하나씩 실행한다
+    채점이 잠그는 Problem row 대신 session advisory lock 을 쓰므로 검사 중에도 그 문제의 채점은 기다리지 않는다,
+    worker 가 죽으면 연결이 끊기면서 lock 도 풀린다
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_lock(%s, %s)", [ADVISORY_LOCK_NAMESPACE, problem_id])
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s, %s)", [ADVISORY_LOCK_NAMESPACE, problem_id])
+
+
+def build_fingerprint(submission):
+    fp = winnowing.fingerprint(submission.code, submission.language)
+    return Plag_Fingerprint(submission_id=submission.id, problem_id=submission.problem_id, user_id=submission.user_id,
+                            language=submission.language, hashes=fp.hashes, kgrams=fp.kgrams, lines=fp.lines,
+                            length=fp.length)
+
+
+def save_fingerprint(row):
+    return Plag_Fingerprint.objects.get_or_create(submission_id=row.submission_id, defaults={
+        "problem_id": row.problem_id, "user_id": row.user_id, "language": row.language,
+        "hashes": row.hashes, "kgrams": row.kgrams, "lines": row.lines, "length": row.length})[0]
+
+
+def to_fingerprint(row):
+    return winnowing.Fingerprint(hashes=[tuple(item) for item in row.hashes], kgrams=row.kgrams, lines=row.lines,
+                                 length=row.length)
+
+
+def load_fingerprints(submission_ids):
+    """
+    {submission_id: Plag_Fingerprint}, 없는 것 (이 기능 전에 채점된 제출) 은 지금 만들어 저장한다
+    """
+    rows = {row.submission_id: row for row in Plag_Fingerprint.objects.filter(submission_id__in=submission_ids)}
+    missing = [sid for sid in submission_ids if sid not in rows]
+    if missing:
+        created = [build_fingerprint(submission) for submission in
+                   Submission.objects.filter(id__in=missing).only("id", "problem_id", "user_id", "language", "code")]
+        try:
+            with transaction.atomic():
+                Plag_Fingerprint.objects.bulk_create(created)
+        except IntegrityError:
+            # 채점 worker 가 그 사이에 같은 제출의 fingerprint 를 만들었다
+            for row in created:
+                save_fingerprint(row)
+        rows.update({row.submission_id: row for row in created})
+    return rows
+
+
+def latest_submissions(**filters):
+    """
+    사용자마다 가장 최근 제출 하나씩 [{"id", "user_id", "language"}, ...]
+    """
+    return list(Submission.objects.filter(**filters).order_by("user_id", "-create_time")
+                .distinct("user_id").values("id", "user_id", "language"))
+
+
+class PlagIndex:
+    """
+    문제의 사용자별 최근 제출 fingerprint 를 저장해 두고, 지난 검사 뒤에 새로 제출했거나 바뀐 사용자만 비교한다
+     - 결과는 사용자마다 Plag_Summary (검사한 제출, 최대 similarity) 와 Plag_Result (일치한 다른 사용자 목록) 에 둔다
+     - 언어가 다른 제출끼리는 비교하지 않는다 (C 와 C++ 은 같이 비교한다)
+    """
+    def __init__(self, problem, engine=None):
+        self.problem = problem
+        self.engine = engine or winnowing.WinnowingEngine(workers=settings.PLAGIARISM_WORKERS)
+
+    def _entry(self, match, own, other, submissions):
+        lines, other_lines = (match.lines_a, match.lines_b) if match.a == own else (match.lines_b, match.lines_a)
+        # JSON 으로 저장한 뒤 다시 읽은 값과 비교할 수 있도록 list 로 바꾼다
+        return {"user_id": other, "submission_id": submissions[other]["id"], "similarity": match.similarity,
+                "max_similarity": match.max_similarity, "lines": [list(item) for item in lines],
+                "other_lines": [list(item) for item in other_lines]}
+
+    def _template(self, family):
+        codes = [(language, parse_problem_template(template)["template"])
+                 for language, template in (self.problem.template or {}).items()
+                 if winnowing.LANGUAGE_FAMILY.get(language, "c") == family]
+        return frozenset().union(*(winnowing.template_kgrams([code], language) for language, code in codes))
+
+    @staticmethod
+    def _checked_submission(summary):
+        return summary.summary.get("submission_id") if isinstance(summary.summary, dict) else None
+
+    def check(self):
+        """
+        :return: 비교한 사용자 수, 이미 최신이면 0
+        """
+        # fingerprint 를 만들고 비교하는 동안에는 transaction 을 열지 않고, 결과 저장만 한 transaction 으로 한다
+        with problem_check_lock(self.problem.id):
+            submissions = {row["user_id"]: row for row in latest_submissions(problem_id=self.problem.id,
+                                                                             contest_id=self.problem.contest_id)}
+            summaries = {item.user_id: item for item in Plag_Summary.objects.filter(problem=self.problem)}
+            changed = {uid for uid, row in submissions.items()
+                       if uid not in summaries or self._checked_submission(summaries[uid]) != row["id"]}
+            removed = set(summaries) - set(submissions)
+            if not changed and not removed:
+                return 0
+
+            rows = load_fingerprints([row["id"] for row in submissions.values()])
+            results = {item.user_id: item for item in Plag_Result.objects.filter(problem=self.problem)}
+            stale = changed | removed
+            matches = {}
+            for uid in submissions:
+                previous = results[uid].result if uid in results and uid not in changed else []
+                matches[uid] = [entry for entry in previous if entry["user_id"] not in stale]
+
+            families = {}
+            for uid, row in submissions.items():
+                family = winnowing.LANGUAGE_FAMILY.get(row["language"], "c")
+                families.setdefault(family, {})[uid] = to_fingerprint(rows[row["id"]])
+            for family, fingerprints in families.items():
+                targets = changed & set(fingerprints)
+                if not targets:
+                    continue
+                for match in self.engine.compare(fingerprints, targets=targets, template=self._template(family)):
+                    matches[match.a].append(self._entry(match, match.a, match.b, submissions))
+                    matches[match.b].append(self._entry(match, match.b, match.a, submissions))
+
+            with transaction.atomic():
+                Plag_Summary.objects.filter(problem=self.problem, user_id__in=removed).delete()
+                for uid, row in submissions.items():
+                    entries = sorted(matches[uid], key=lambda entry: -entry["similarity"])
+                    if uid not in changed and uid in results and entries == results[uid].result:
+                        continue
+                    summary = {"submission_id": row["id"], "language": row["language"], "match_count": len(entries),
+                               "max_similarity": entries[0]["similarity"] if entries else 0}
+                    if uid in summaries:
+                        Plag_Summary.objects.filter(id=summaries[uid].id).update(summary=summary)
+                        summary_id = summaries[uid].id
+                    else:
+                        summary_id = Plag_Summary.objects.create(lecture_id=self.problem.contest.lecture_id,
+                                                                 contest_id=self.problem.contest_id,
+                                                                 problem=self.problem, user_id=uid, summary=summary).id
+                    Plag_Result.objects.update_or_create(problem=self.problem, user_id=uid, defaults={
+                        "lecture_id": self.problem.contest.lecture_id, "contest_id": self.problem.contest_id,
+                        "plag_summary_id": summary_id, "result": entries})
+            return len(changed)
+
+    def matches(self):
+        """
+        저장된 결과를 쌍마다 하나씩 winnowing.Match 로 돌려준다 (a, b 는 user_id), similarity 가 큰 순서
+        """
+        pairs = []
+        for item in Plag_Result.objects.filter(problem=self.problem).only("user_id", "result"):
+            for entry in item.result:
+                if item.user_id < entry["user_id"]:
+                    pairs.append(winnowing.Match(item.user_id, entry["user_id"], entry["similarity"],
+                                                 entry["max_similarity"], 0, entry["lines"], entry["other_lines"]))
+        return sorted(pairs, key=lambda match: (-match.similarity, match.a, match.b))
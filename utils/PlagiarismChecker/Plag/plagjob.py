@@ -0,0 +1,171 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from problem.models import Problem
+from submission.models import Submission
+from utils.cache import cache
+from utils.constants import CacheKey
+
+PROGRESS_TTL = 24 * 60 * 60
+# 이 시간 동안 진행 상황이 바뀌지 않은 running 작업은 worker 가 죽은 것으로 보고 다시 실행할 수 있다
+JOB_TIMEOUT = 60 * 60
+# 실행 중인 작업 수가 한도에 닿았을 때 다시 시도할 때까지의 시간(ms)
+RETRY_DELAY = 10 * 1000
+
+# KEYS[1]: 실행 중인 작업 zset, ARGV: now, lease 만료 시간, job id, 최대 작업 수
+_ACQUIRE_SLOT_SCRIPT = """
+redis.call("ZREMRANGEBYSCORE", KEYS[1], "-inf", ARGV[1])
+if redis.call("ZSCORE", KEYS[1], ARGV[3]) then
+    return 1
+end
+if redis.call("ZCARD", KEYS[1]) >= tonumber(ARGV[4]) then
+    return 0
+end
+redis.call("ZADD", KEYS[1], ARGV[2], ARGV[3])
+redis.call("EXPIREAT", KEYS[1], math.ceil(tonumber(ARGV[2])))
+return 1
+"""
+
+
+class PlagJobStatus:
+    QUEUED = "queued"
+    RUNNING = "running"
+    FINISHED = "finished"
+    FAILED = "failed"
+
+
+class PlagJob:
+    """
+    표절 검사를 dramatiq worker 에서 실행하고 결과 zip 을 PLAGIARISM_RESULT_DIR 에 둔다
+     - job id 는 문제 목록과 그 문제들의 제출 수, 마지막 제출 시간으로 만든다, 새 제출이 없으면 같은 id 라서 이전 결과를 바로 쓴다
+     - 작업마다 따로 만든 디렉터리에서 report 를 만들므로 같은 문제를 동시에 검사해도 서로 덮어쓰지 않는다
+     - 동시에 실행하는 작업 수는 PLAGIARISM_MAX_JOBS 로 제한한다
+    """
+    _acquire_slot_script = None
+
+    def __init__(self, job_id, problem_ids):
+        self.job_id = job_id
+        self.problem_ids = problem_ids
+
+    @classmethod
+    def create(cls, problem_ids):
+        # 여러 문제를 검사할 때는 첫 번째 문제가 비교 기준이므로 순서를 유지한다
+        problem_ids = list(dict.fromkeys(int(item) for item in problem_ids))
+        # 제출 id 는 임의의 문자열이라 순서가 없으므로 "최대 제출 id" 대신 제출 수와 마지막 제출 시간을 쓴다
+        submissions = Submission.objects.filter(problem_id__in=problem_ids)
+        watermark = submissions.aggregate(count=Count("id"), last=Max("create_time"))
+        problem_key = hashlib.sha256(",".join(map(str, problem_ids)).encode()).hexdigest()[:16]
+        last = watermark["last"].isoformat() if watermark["last"] else ""
+        submission_key = hashlib.sha256(f"{watermark['count']}:{last}".encode()).hexdigest()[:16]
+        return cls(f"{problem_key}-{submission_key}", problem_ids)
+
+    @staticmethod
+    def progressKey(job_id):
+        return f"{CacheKey.plagiarism_job}:{job_id}"
+
+    @staticmethod
+    def resultPath(job_id):
+        return os.path.join(settings.PLAGIARISM_RESULT_DIR, f"{job_id}.zip")
+
+    @classmethod
+    def progress(cls, job_id):
+        data = {k.decode("utf-8"): v.decode("utf-8") for k, v in cache.hgetall(cls.progressKey(job_id)).items()}
+        for field in ("total", "done"):
+            if field in data:
+                data[field] = int(data[field])
+        if os.path.exists(cls.resultPath(job_id)):
+            data["status"] = PlagJobStatus.FINISHED
+        data["job_id"] = job_id
+        return data
+
+    def setProgress(self, **kwargs):
+        key = self.progressKey(self.job_id)
+        pipe = cache.pipeline()
+        pipe.hmset(key, dict(kwargs, updated_at=time.time()))
+        pipe.expire(key, PROGRESS_TTL)
+        pipe.execute()
+
+    def start(self):
+        """
+        결과가 없고 실행 중이 아니면 worker 에 작업을 보낸다
+        """
+        from problem.tasks import plagiarism_task
+        if self.ready() or self.pending():
+            return
+        self.setProgress(status=PlagJobStatus.QUEUED, stage="queued", done=0, total=2, error="",
+                         problem_ids=",".join(map(str, self.problem_ids)))
+        plagiarism_task.send(self.job_id, self.problem_ids)
+
+    def ready(self):
+        return os.path.exists(self.resultPath(self.job_id))
+
+    def pending(self):
+        data = self.progress(self.job_id)
+        if data.get("status") not in (PlagJobStatus.QUEUED, PlagJobStatus.RUNNING):
+            return False
+        return time.time() - float(data.get("updated_at", 0)) < JOB_TIMEOUT
+
+    def acquireSlot(self):
+        if PlagJob._acquire_slot_script is None:
+            PlagJob._acquire_slot_script = cache.register_script(_ACQUIRE_SLOT_SCRIPT)
+        now = time.time()
+        return bool(PlagJob._acquire_slot_script(keys=[CacheKey.plagiarism_running],
+                                                 args=[now, now + JOB_TIMEOUT, self.job_id, settings.PLAGIARISM_MAX_JOBS]))
+
+    def releaseSlot(self):
+        cache.zrem(CacheKey.plagiarism_running, self.job_id)
+
+    def _check(self, result_room):
+        # plagchecker 는 채점 worker 와 view 가 import 할 때 같이 읽지 않도록 검사할 때만 import 한다
+        from utils.PlagiarismChecker.Plag import plagchecker
+        problems = {problem.id: problem for problem in
+                    Problem.objects.filter(id__in=self.problem_ids).select_related("contest")}
+        problems = [problems[problem_id] for problem_id in self.problem_ids if problem_id in problems]
+        if len(problems) == 1:
+            problem = problems[0]
+            return plagchecker.singleLecture(problem.contest.lecture_id, problem.contest_id, problem.id, result_room)
+        return plagchecker.multiLecture([problem.contest.lecture_id for problem in problems],
+                                        [problem.contest_id for problem in problems],
+                                        [problem.id for problem in problems], result_room)
+
+    def run(self):
+        """
+        :return: 실행 중인 작업이 많아서 실행하지 못했으면 False
+        """
+        if self.ready():
+            self.setProgress(status=PlagJobStatus.FINISHED)
+            return True
+        if not self.acquireSlot():
+            return False
+        work_root = os.path.join(settings.PLAGIARISM_RESULT_DIR, "work")
+        os.makedirs(work_root, exist_ok=True)
+        work_dir = tempfile.mkdtemp(prefix=f"{self.job_id}-", dir=work_root)
+        try:
+            self.setProgress(status=PlagJobStatus.RUNNING, stage="checking", done=0, total=2)
+            report_dir = self._check(work_dir)
+            self.setProgress(stage="archiving", done=1)
+            temp = os.path.join(work_dir, "result.zip")
+            with zipfile.ZipFile(temp, "w", compression=zipfile.ZIP_DEFLATED) as file:
+                for name in os.listdir(report_dir):
+                    file.write(os.path.join(report_dir, name), name)
+            os.replace(temp, self.resultPath(self.job_id))
+            # 같은 문제 목록의 이전 결과는 새 제출이 반영되지 않았으므로 지운다
+            prefix = self.job_id.split("-")[0] + "-"
+            for entry in os.scandir(settings.PLAGIARISM_RESULT_DIR):
+                if entry.name.startswith(prefix) and entry.name.endswith(".zip") and entry.name != f"{self.job_id}.zip":
+                    os.remove(entry.path)
+            self.setProgress(status=PlagJobStatus.FINISHED, stage="finished", done=2)
+        except Exception as e:
+            self.setProgress(status=PlagJobStatus.FAILED, error=str(e))
+            raise
+        finally:
+            self.releaseSlot()
+            shutil.rmtree(work_dir, ignore_errors=True)
+        return True
@@ -0,0 +1,280 @@
+import html
+import json
+import os
+import re
+import zlib
+from collections import Counter, defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+
+# noise threshold: 이보다 짧은 같은 token 열은 무시한다
+K = 10
+# window 크기, K + WINDOW - 1 token 이상 같은 부분은 반드시 찾는다
+WINDOW = 6
+# 후보 쌍이 이보다 적으면 process pool 을 쓰지 않는다
+PARALLEL_MIN_PAIRS = 2000
+PAIR_CHUNK_SIZE = 500
+
+LANGUAGE_FAMILY = {"C": "c", "C++": "c", "Java": "java", "Python2": "python", "Python3": "python"}
+
+_C_KEYWORDS = {
+    "auto", "break", "case", "char", "const", "continue", "default", "do", "double", "else", "enum", "extern",
+    "float", "for", "goto", "if", "int", "long", "register", "return", "short", "signed", "sizeof", "static",
+    "struct", "switch", "typedef", "union", "unsigned", "void", "volatile", "while", "bool", "class", "delete",
+    "new", "namespace", "operator", "private", "protected", "public", "template", "this", "throw", "try", "catch",
+    "using", "virtual", "true", "false", "nullptr", "std", "string", "vector", "cin", "cout", "endl",
+}
+_JAVA_KEYWORDS = {
+    "abstract", "boolean", "break", "byte", "case", "catch", "char", "class", "continue", "default", "do",
+    "double", "else", "extends", "final", "finally", "float", "for", "if", "implements", "import", "instanceof",
+    "int", "interface", "long", "new", "package", "private", "protected", "public", "return", "short", "static",
+    "super", "switch", "this", "throw", "throws", "try", "void", "while", "true", "false", "null", "String",
+}
+_PYTHON_KEYWORDS = {
+    "and", "as", "assert", "break", "class", "continue", "def", "del", "elif", "else", "except", "finally", "for",
+    "from", "global", "if", "import", "in", "is", "lambda", "nonlocal", "not", "or", "pass", "raise", "return",
+    "try", "while", "with", "yield", "True", "False", "None", "print", "input", "range", "len", "int", "str",
+}
+
+_C_TOKEN_RE = re.compile(r"""
+    (?P<skip>//[^\n]*|/\*.*?\*/|\#[^\n]*|\s+)
+    |(?P<string>"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*')
+    |(?P<number>\.?\d[\w.]*)
+    |(?P<name>[A-Za-z_]\w*)
+    |(?P<op>.)
+""", re.S | re.X)
+_JAVA_TOKEN_RE = re.compile(r"""
+    (?P<skip>//[^\n]*|/\*.*?\*/|@\w+|\s+)
+    |(?P<string>"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*')
+    |(?P<number>\.?\d[\w.]*)
+    |(?P<name>[A-Za-z_$][\w$]*)
+    |(?P<op>.)
+""", re.S | re.X)
+_PYTHON_TOKEN_RE = re.compile(r"""
+    (?P<skip>\#[^\n]*|\\\n|[ \t\f\r]+)
+    |(?P<string>[rRbBuUfF]{0,2}(?:\"\"\".*?\"\"\"|'''.*?'''|"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*'))
+    |(?P<number>\.?\d[\w.]*)
+    |(?P<name>[A-Za-z_]\w*)
+    |(?P<newline>\n)
+    |(?P<op>.)
+""", re.S | re.X)
+
+_LANGUAGES = {
+    "c": (_C_TOKEN_RE, _C_KEYWORDS),
+    "java": (_JAVA_TOKEN_RE, _JAVA_KEYWORDS),
+    "python": (_PYTHON_TOKEN_RE, _PYTHON_KEYWORDS),
+}
+
+# hashes: winnowing 으로 고른 (k-gram hash, token 위치), 역색인에 쓴다
+# kgrams: 모든 k-gram 의 hash, 후보 쌍의 점수를 정확하게 계산할 때 쓴다
+# lines: token 마다 원본 코드의 줄 번호
+Fingerprint = namedtuple("Fingerprint", ["hashes", "kgrams", "lines", "length"])
+# similarity: 두 코드의 일치 token 비율 (JPlag 의 avg), max_similarity: 더 많이 겹친 쪽의 비율 (JPlag 의 max)
+# lines_a, lines_b: 일치하는 줄 범위 [(시작, 끝), ...]
+Match = namedtuple("Match", ["a", "b", "similarity", "max_similarity", "matched_tokens", "lines_a", "lines_b"])
+
+
+def tokenize(code, language):
+    """
+    식별자, 숫자, 문자열은 종류만 남기고 주석과 공백을 지운 token 목록과 token 마다의 줄 번호를 돌려준다
+    변수 이름을 바꾸거나 주석을 고쳐도 같은 token 열이 된다
+    """
+    token_re, keywords = _LANGUAGES[LANGUAGE_FAMILY.get(language, "c")]
+    tokens, lines = [], []
+    line, last = 1, 0
+    for match in token_re.finditer(code):
+        kind = match.lastgroup
+        if kind == "skip":
+            continue
+        line += code.count("\n", last, match.start())
+        last = match.start()
+        if kind == "name":
+            value = match.group() if match.group() in keywords else "ID"
+        elif kind == "string":
+            value = "STR"
+        elif kind == "number":
+            value = "NUM"
+        elif kind == "newline":
+            if not tokens or tokens[-1] == "NL":
+                continue
+            value = "NL"
+        else:
+            value = match.group()
+        tokens.append(value)
+        lines.append(line)
+    return tokens, lines
+
+
+def winnow(hashes, window=WINDOW):
+    """
+    window 마다 가장 작은 hash (같으면 오른쪽) 를 골라 [(hash, 위치), ...] 로 돌려준다
+    """
+    selected = []
+    last = -1
+    for start in range(max(len(hashes) - window + 1, 1 if hashes else 0)):
+        end = min(start + window, len(hashes))
+        position = min(range(start, end), key=lambda i: (hashes[i], -i))
+        if position != last:
+            selected.append((hashes[position], position))
+            last = position
+    return selected
+
+
+def fingerprint(code, language, k=K, window=WINDOW):
+    tokens, lines = tokenize(code, language)
+    # 내장 hash() 는 process 마다 달라지므로 crc32 를 쓴다
+    hashes = [zlib.crc32("\x00".join(tokens[i:i + k]).encode()) for i in range(len(tokens) - k + 1)]
+    return Fingerprint(hashes=winnow(hashes, window), kgrams=hashes, lines=lines, length=len(tokens))
+
+
+def template_kgrams(codes, language):
+    """
+    문제에서 준 template 코드들의 k-gram, 모든 학생의 코드에 들어가므로 비교할 때 뺀다
+    """
+    return frozenset(h for code in codes for h in fingerprint(code, language).kgrams)
+
+
+def _line_ranges(positions, lines):
+    ranges = []
+    for line in sorted({lines[position] for position in positions}):
+        if ranges and line <= ranges[-1][1] + 1:
+            ranges[-1][1] = line
+        else:
+            ranges.append([line, line])
+    return [tuple(item) for item in ranges]
+
+
+def score(name_a, fp_a, name_b, fp_b, k=K, template=frozenset()):
+    """
+    공유하는 k-gram 이 덮는 token 의 비율로 JPlag 와 같은 avg/max similarity(%) 를 계산한다
+    :param template: 문제 template 의 k-gram, 모두에게 주어진 코드이므로 공유한 것으로 보지 않는다
+    """
+    shared = set(fp_a.kgrams) & set(fp_b.kgrams) - template
+    if not shared or not fp_a.length or not fp_b.length:
+        return Match(name_a, name_b, 0.0, 0.0, 0, [], [])
+    covered = []
+    for fp in (fp_a, fp_b):
+        positions = set()
+        for position, h in enumerate(fp.kgrams):
+            if h in shared:
+                positions.update(range(position, min(position + k, fp.length)))
+        covered.append(positions)
+    matched_a, matched_b = len(covered[0]), len(covered[1])
+    similarity = 200.0 * min(matched_a, matched_b) / (fp_a.length + fp_b.length)
+    max_similarity = 100.0 * max(matched_a / fp_a.length, matched_b / fp_b.length)
+    return Match(name_a, name_b, round(similarity, 2), round(max_similarity, 2), min(matched_a, matched_b),
+                 _line_ranges(covered[0], fp_a.lines), _line_ranges(covered[1], fp_b.lines))
+
+
+_worker_fingerprints = None
+_worker_template = frozenset()
+
+
+def _init_worker(fingerprints, template):
+    global _worker_fingerprints, _worker_template
+    _worker_fingerprints = fingerprints
+    _worker_template = template
+
+
+def _score_chunk(pairs):
+    return [score(a, _worker_fingerprints[a], b, _worker_fingerprints[b], template=_worker_template)
+            for a, b in pairs]
+
+
+class WinnowingEngine:
+    """
+    winnowing fingerprint 의 역색인으로 hash 를 공유하는 쌍만 골라 비교한다
+    모든 쌍을 비교하지 않으므로 비교 비용은 제출 수의 제곱이 아니라 겹치는 부분의 수에 비례한다
+    """
+    def __init__(self, min_similarity=20, min_shared=2, max_document_ratio=0.2, min_template_docs=10, workers=None):
+        """
+        :param min_shared: 후보 쌍이 되려면 공유해야 하는 (흔하지 않은) hash 의 최소 수
+            작은 쪽 fingerprint 의 min_similarity / 2 % 이상도 공유해야 한다
+        :param max_document_ratio: 이 비율보다 많은 코드에 있는 hash 는 템플릿으로 보고 후보를 찾을 때 쓰지 않는다
+        :param min_template_docs: 코드 수가 적어도 이 수 이하의 코드에만 있는 hash 는 템플릿으로 보지 않는다
+            (수강생이 적은 분반에서 여러 명이 같은 코드를 내도 찾을 수 있도록)
+        :param workers: process pool 크기, None 이면 os.cpu_count()
+        """
+        self.min_similarity = min_similarity
+        self.min_shared = min_shared
+        self.max_document_ratio = max_document_ratio
+        self.min_template_docs = min_template_docs
+        self.workers = workers
+
+    def candidates(self, fingerprints, targets=None, template=frozenset()):
+        """
+        :param fingerprints: {이름: Fingerprint}
+        :param targets: 있으면 이 이름들이 포함된 쌍만 돌려준다
+        :param template: 문제 template 의 k-gram, 후보를 찾을 때 쓰지 않는다
+        """
+        index = defaultdict(set)
+        sizes = {}
+        for name, fp in fingerprints.items():
+            for h, _ in fp.hashes:
+                if h not in template:
+                    index[h].add(name)
+            sizes[name] = len({h for h, _ in fp.hashes if h not in template})
+        limit = max(self.min_template_docs, int(len(fingerprints) * self.max_document_ratio))
+        shared = Counter()
+        for names in index.values():
+            if len(names) > limit:
+                continue
+            for pair in combinations(sorted(names), 2):
+                if targets is None or pair[0] in targets or pair[1] in targets:
+                    shared[pair] += 1
+        # 겹치는 fingerprint 의 비율은 similarity 와 비슷하므로 여유를 두고 절반을 기준으로 거른다
+        ratio = self.min_similarity / 200
+        return [(a, b) for (a, b), count in shared.items()
+                if count >= max(self.min_shared, ratio * min(sizes[a], sizes[b]))]
+
+    def compare(self, fingerprints, targets=None, template=frozenset()):
+        """
+        :param template: 문제 template 의 k-gram, template_kgrams 참고
+        :return: similarity 가 min_similarity 이상인 Match 목록, similarity 가 큰 순서
+        """
+        pairs = self.candidates(fingerprints, targets, template)
+        if len(pairs) < PARALLEL_MIN_PAIRS or self.workers == 1:
+            matches = [score(a, fingerprints[a], b, fingerprints[b], template=template) for a, b in pairs]
+        else:
+            chunks = [pairs[i:i + PAIR_CHUNK_SIZE] for i in range(0, len(pairs), PAIR_CHUNK_SIZE)]
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                     initargs=(fingerprints, template)) as executor:
+                matches = [match for result in executor.map(_score_chunk, chunks) for match in result]
+        matches = [match for match in matches if match.similarity >= self.min_similarity]
+        return sorted(matches, key=lambda match: (-match.similarity, match.a, match.b))
+
+
+def _code_html(code, ranges):
+    marked = set()
+    for start, end in ranges:
+        marked.update(range(start, end + 1))
+    rows = []
+    for number, line in enumerate(code.split("\n"), 1):
+        style = ' style="background:#ffd6d6"' if number in marked else ""
+        rows.append(f"<tr{style}><td>{number}</td><td><pre>{html.escape(line)}</pre></td></tr>")
+    return "<table>" + "".join(rows) + "</table>"
+
+
+def write_report(result_dir, matches, codes, compared):
+    """
+    JPlag 결과처럼 index.html (쌍 목록), matchN.html (두 코드의 일치하는 줄 표시), result.json 을 만든다
+    :param codes: {이름: 코드}
+    :param compared: 비교한 코드 수
+    """
+    os.makedirs(result_dir, exist_ok=True)
+    rows = []
+    for number, match in enumerate(matches):
+        rows.append(f'<tr><td><a href="match{number}.html">{html.escape(match.a)} - {html.escape(match.b)}</a></td>'
+                    f'<td>{match.similarity}%</td><td>{match.max_similarity}%</td></tr>')
+        with open(os.path.join(result_dir, f"match{number}.html"), "w", encoding="utf-8") as f:
+            f.write(f"<html><head><meta charset='utf-8'><title>{html.escape(match.a)} - {html.escape(match.b)}"
+                    f"</title></head><body><h3>{match.similarity}% (max {match.max_similarity}%)</h3>"
+                    f"<table><tr><th>{html.escape(match.a)}</th><th>{html.escape(match.b)}</th></tr><tr valign='top'>"
+                    f"<td>{_code_html(codes.get(match.a, ''), match.lines_a)}</td>"
+                    f"<td>{_code_html(codes.get(match.b, ''), match.lines_b)}</td></tr></table></body></html>")
+    with open(os.path.join(result_dir, "index.html"), "w", encoding="utf-8") as f:
+        f.write(f"<html><head><meta charset='utf-8'><title>Plagiarism report</title></head><body>"
+                f"<p>{compared} submissions, {len(matches)} matches</p>"
+                f"<table><tr><th>pair</th><th>avg</th><th>max</th></tr>{''.join(rows)}</table></body></html>")
+    with open(os.path.join(result_dir, "result.json"), "w", encoding="utf-8") as f:
+        json.dump([match._asdict() for match in matches], f)
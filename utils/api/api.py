@@ -1,12 +1,21 @@
 import functools
+import hashlib
 import json
 import logging
+from datetime import datetime
 
+from django.core import signing
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
+from django.db.models import Q
 from django.http import HttpResponse, QueryDict
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import View
 
+from utils.cache import cache
+from utils.constants import CacheKey, Choices
+
 logger = logging.getLogger("")
 
 
@@ -50,6 +59,71 @@ class JSONResponse(object):
         return resp
 
 
+class CountMode(Choices):
+    EXACT = "exact"
+    # EXPLAIN 의 예상 행 수, 예상이 작으면 정확히 센다
+    ESTIMATE = "estimate"
+    # 정확한 count 를 APIView.count_cache_ttl 동안 캐시
+    CACHED = "cached"
+
+
+class KeysetCursor(object):
+    """
+    keyset 페이지네이션의 cursor
+     - keys 는 ("-create_time", "-id") 처럼 결과를 유일하게 정렬하는 field 이름, 앞에 "-" 가 있으면 내림차순
+     - cursor 는 이전 페이지 마지막 행의 key 값을 서명한 문자열이라 클라이언트는 내용을 알 필요가 없다
+    """
+    salt = "utils.api.KeysetCursor"
+
+    def __init__(self, model, keys):
+        self.model = model
+        self.keys = keys
+
+    def _field(self, key):
+        return self.model._meta.get_field(key.lstrip("-"))
+
+    @staticmethod
+    def _lookup(key):
+        return "lt" if key.startswith("-") else "gt"
+
+    def encode(self, obj):
+        values = []
+        for key in self.keys:
+            value = getattr(obj, self._field(key).attname)
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            values.append(value)
+        return signing.dumps(values, salt=self.salt, compress=True)
+
+    def decode(self, cursor):
+        try:
+            values = signing.loads(cursor, salt=self.salt)
+        except signing.BadSignature:
+            raise APIError("Invalid cursor")
+        if not isinstance(values, list) or len(values) != len(self.keys):
+            raise APIError("Invalid cursor")
+        try:
+            return [self._field(key).to_python(value) for key, value in zip(self.keys, values)]
+        except Exception:
+            raise APIError("Invalid cursor")
+
+    def filter(self, query_set, cursor):
+        """
+        (k1, k2) < (v1, v2) 를 k1 < v1 OR (k1 = v1 AND k2 < v2) 로 풀어 쓴다
+        """
+        values = self.decode(cursor)
+        condition = Q()
+        for index, key in enumerate(self.keys):
+            q = Q(**{f"{key.lstrip('-')}__{self._lookup(key)}": values[index]})
+            for prev_key, prev_value in zip(self.keys[:index], values[:index]):
+                q &= Q(**{prev_key.lstrip("-"): prev_value})
+            condition |= q
+        # 첫 key 의 범위 조건을 따로 붙여야 index range scan 을 탄다
+        first = self.keys[0]
+        bound = Q(**{f"{first.lstrip('-')}__{self._lookup(first)}e": values[0]})
+        return query_set.filter(bound, condition)
+
+
 class APIView(View):
     """
     Django view的父类, 和django-rest-framework的用法基本一致
@@ -61,6 +135,10 @@ class APIView(View):
     """
     request_parsers = (JSONParser, URLEncodedParser)
     response_class = JSONResponse
+    # CountMode.ESTIMATE 에서 예상 행 수가 이보다 작으면 정확히 센다
+    estimate_count_threshold = 10000
+    # CountMode.CACHED 의 캐시 시간(초)
+    count_cache_ttl = 60
 
     def _get_request_data(self, request):
         if request.method not in ["GET", "DELETE"]:
@@ -144,11 +222,15 @@ class APIView(View):
                 "total": count}
         return data
 
-    def paginate_data(self, request, query_set, object_serializer=None):
+    def paginate_data(self, request, query_set, object_serializer=None, keyset=None, count_mode=CountMode.EXACT):
         """
         :param request: django request
         :param query_set: django model의 query set 또는 objects 와 같은 목록
         :param object_serializer: 用来序列化query set, 如果为None, 则直接对query set切片
+        :param keyset: 결과를 유일하게 정렬하는 key, 예) ("-create_time", "-id")
+            지정하면 요청에 cursor 가 있을 때 offset 대신 keyset 방식으로 자르고 next_cursor 를 돌려준다
+            (cursor= 처럼 빈 값이면 첫 페이지)
+        :param count_mode: total 을 구하는 방법, CountMode 참고
         :return:
         """
         try:
@@ -163,16 +245,60 @@ class APIView(View):
             offset = 0
         if offset < 0:
             offset = 0
-        results = query_set[offset:offset + limit]
+        data = {}
+        cursor = request.GET.get("cursor") if keyset else None
+        if cursor is not None:
+            query_set = query_set.order_by(*keyset)
+            paginator = KeysetCursor(query_set.model, keyset)
+            page = paginator.filter(query_set, cursor) if cursor else query_set
+            # 한 행을 더 읽어 다음 페이지가 있는지 확인한다
+            results = list(page[:limit + 1])
+            data["next_cursor"] = paginator.encode(results[limit - 1]) if limit and len(results) > limit else None
+            results = results[:limit]
+        else:
+            results = query_set[offset:offset + limit]
+        count = self.count_data(query_set, count_mode)
         if object_serializer:
-            count = query_set.count()
             results = object_serializer(results, many=True).data
-        else:
-            count = query_set.count()
-        data = {"results": results,
-                "total": count}
+        data.update({"results": results,
+                     "total": count})
         return data
 
+    def count_data(self, query_set, count_mode=CountMode.EXACT):
+        if count_mode == CountMode.EXACT or not hasattr(query_set, "query"):
+            return query_set.count()
+        query_set = query_set.order_by()
+        try:
+            if count_mode == CountMode.CACHED:
+                key = f"{CacheKey.paginate_count}:{hashlib.md5(str(query_set.query).encode()).hexdigest()}"
+                count = cache.get(key)
+                if count is None:
+                    count = query_set.count()
+                    cache.set(key, count, timeout=self.count_cache_ttl)
+                return count
+            estimate = self.estimate_count(query_set)
+        except EmptyResultSet:
+            return 0
+        if estimate is None or estimate < self.estimate_count_threshold:
+            return query_set.count()
+        return estimate
+
+    @staticmethod
+    def estimate_count(query_set):
+        """
+        PostgreSQL planner 의 예상 행 수, 다른 DB 는 None
+        """
+        connection = connections[query_set.db]
+        if connection.vendor != "postgresql":
+            return None
+        sql, params = query_set.query.get_compiler(query_set.db).as_sql()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
     def dispatch(self, request, *args, **kwargs):
         if self.request_parsers:
             try:
@@ -29,7 +29,27 @@ class ContestRuleType(Choices):
 class CacheKey:
     waiting_queue = "waiting_queue"
     contest_rank_cache = "contest_rank_cache"
+    contest_scoreboard = "contest_scoreboard"
+    contest_scoreboard_built = "contest_scoreboard_built"
     website_config = "website_config"
+    judge_server_lease = "judge_server_lease"
+    judge_server_failure = "judge_server_failure"
+    judge_server_circuit = "judge_server_circuit"
+    judge_server_latency = "judge_server_latency"
+    judge_pending_queue = "judge_pending_queue"
+    judge_user_inflight = "judge_user_inflight"
+    judge_queue_stats = "judge_queue_stats"
+    lecture_score_progress = "lecture_score_progress"
+    paginate_count = "paginate_count"
+    options_invalidate = "options_invalidate"
+    throttling = "throttling"
+    plagiarism_job = "plagiarism_job"
+    plagiarism_running = "plagiarism_running"
+    contest_submission_export = "contest_submission_export"
+    problem_export_job = "problem_export_job"
+    problem_import_job = "problem_import_job"
+    user_leaderboard = "user_leaderboard"
+    user_leaderboard_built = "user_leaderboard_built"
 
 
 class Difficulty(Choices):
@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand
+from django.db import IntegrityError, transaction
+from django.db.models import Min
+
+from account.models import UserProfile
+from problem.models import Problem, UserProblemStatus
+from submission.models import JudgeStatus, Submission
+
+
+class Command(BaseCommand):
+    help = ("UserProfile 의 acm_problems_status, oi_problems_status 를 UserProblemStatus 로 옮긴다. "
+            "배포할 때 migration 0004 에서 한 번 옮기므로, 그 뒤에 JSON 을 직접 고쳤을 때 다시 맞추는 데 쓴다. "
+            "이미 있는 (사용자, 문제) 는 채점 중에 만들어진 것이므로 건너뛰고, 여러 번 실행해도 된다")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=500, help="한 번에 옮길 사용자 수")
+        parser.add_argument("--skip-first-ac", action="store_true", help="제출 기록에서 first_ac_time 을 찾지 않는다")
+
+    def _rows(self, profiles, skip_first_ac):
+        legacy = {profile.user_id: UserProblemStatus.legacy_status(profile) for profile in profiles}
+        user_ids = list(legacy)
+        problem_ids = {problem_id for items in legacy.values() for problem_id in items}
+        existing_problems = set(Problem.objects.filter(id__in=problem_ids).values_list("id", flat=True))
+        existing = set(UserProblemStatus.objects.filter(user_id__in=user_ids).values_list("user_id", "problem_id"))
+        first_ac = {}
+        if not skip_first_ac:
+            first_ac = {(item["user_id"], item["problem_id"]): item["first_ac_time"] for item in
+                        Submission.objects.filter(user_id__in=user_ids, result=JudgeStatus.ACCEPTED)
+                        .values("user_id", "problem_id").annotate(first_ac_time=Min("create_time"))}
+        rows = []
+        for user_id, items in legacy.items():
+            for problem_id, (status, score) in items.items():
+                if problem_id in existing_problems and (user_id, problem_id) not in existing:
+                    rows.append(UserProblemStatus(user_id=user_id, problem_id=problem_id, status=status, score=score,
+                                                  first_ac_time=first_ac.get((user_id, problem_id))))
+        return rows
+
+    def _save(self, rows):
+        try:
+            with transaction.atomic():
+                UserProblemStatus.objects.bulk_create(rows)
+        except IntegrityError:
+            # 그 사이에 채점 worker 가 같은 (사용자, 문제) 를 만들었다
+            for row in rows:
+                try:
+                    with transaction.atomic():
+                        row.save()
+                except IntegrityError:
+                    pass
+
+    def handle(self, *args, **options):
+        profiles = UserProfile.objects.only("id", "user_id", "acm_problems_status", "oi_problems_status").order_by("id")
+        last_id = 0
+        users = created = 0
+        while True:
+            chunk = list(profiles.filter(id__gt=last_id)[:options["chunk_size"]])
+            if not chunk:
+                break
+            last_id = chunk[-1].id
+            rows = self._rows(chunk, options["skip_first_ac"])
+            self._save(rows)
+            users += len(chunk)
+            created += len(rows)
+            self.stdout.write(f"{users} users, {created} rows")
+        self.stdout.write(self.style.SUCCESS(f"done, {users} users, {created} rows created"))
@@ -0,0 +1,64 @@
+import io
+import random
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import xlsxwriter
+from django.core.management.base import BaseCommand
+
+from contest.export import ContestRankExporter
+from utils.constants import ContestRuleType
+
+
+class Command(BaseCommand):
+    help = "DB 없이 만든 순위 데이터로 대회 순위 내보내기(xlsx/csv)의 시간과 최대 메모리를 잰다"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--participants", type=int, default=5000)
+        parser.add_argument("--problems", type=int, default=30)
+
+    def _ranks(self, participants, problem_ids):
+        for i in range(participants):
+            user = SimpleNamespace(id=i + 1, username=f"user{i}", userprofile=SimpleNamespace(real_name=f"name{i}"))
+            info = {str(pid): {"is_ac": random.random() < 0.5, "ac_time": 0, "error_number": 0, "is_first_ac": False}
+                    for pid in problem_ids if random.random() < 0.8}
+            yield SimpleNamespace(user=user, accepted_number=sum(v["is_ac"] for v in info.values()),
+                                  submission_number=len(info), total_time=random.randint(0, 10 ** 5),
+                                  submission_info=info)
+
+    def _legacy_xlsx(self, ranks, problems):
+        # 이전 ContestRankAPI 와 같은 방식: 메모리 안의 workbook, 셀마다 list.index
+        problem_ids = [pid for pid, _ in problems]
+        f = io.BytesIO()
+        workbook = xlsxwriter.Workbook(f)
+        worksheet = workbook.add_worksheet()
+        for index, rank in enumerate(ranks):
+            worksheet.write_string(index + 1, 0, str(rank.user.id))
+            worksheet.write_string(index + 1, 1, rank.user.username)
+            for k, v in rank.submission_info.items():
+                worksheet.write_string(index + 1, 6 + problem_ids.index(int(k)), str(v["is_ac"]))
+        workbook.close()
+        return f.getvalue()
+
+    def _measure(self, name, func):
+        tracemalloc.start()
+        start = time.time()
+        func()
+        elapsed = time.time() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.stdout.write(f"{name:<16} {elapsed:>8.2f}s  peak {peak / 1024 / 1024:>8.1f} MB")
+
+    def handle(self, *args, **options):
+        problems = [(pid, f"Problem {pid}") for pid in range(1, options["problems"] + 1)]
+        problem_ids = [pid for pid, _ in problems]
+        contest = SimpleNamespace(rule_type=ContestRuleType.ACM)
+        participants = options["participants"]
+
+        def exporter():
+            return ContestRankExporter(contest, self._ranks(participants, problem_ids), problems, is_contest_admin=True)
+
+        self._measure("legacy_xlsx", lambda: self._legacy_xlsx(list(self._ranks(participants, problem_ids)), problems))
+        self._measure("streaming_xlsx", lambda: exporter().xlsx_file().close())
+        self._measure("streaming_csv", lambda: sum(len(chunk) for chunk in exporter().stream_csv()))
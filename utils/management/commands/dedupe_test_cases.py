@@ -0,0 +1,47 @@
+import os
+import re
+
+from django.core.management.base import BaseCommand
+
+from problem.test_case_store import TestCaseStore
+
+
+class Command(BaseCommand):
+    help = "TEST_CASE_DIR 의 기존 test case 파일을 내용(SHA-256)이 같은 blob 의 hardlink 로 바꾼다. 이미 바뀐 파일은 건너뛴다"
+
+    test_case_re = re.compile(r"^[a-zA-Z0-9]{32}$")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="바꾸지 않고 줄어들 크기만 계산한다")
+
+    def _estimate(self, store, path, inodes):
+        digest = store.file_digest(path)
+        stat = os.stat(path)
+        if digest not in inodes:
+            blob = store.blob_path(digest)
+            inodes[digest] = os.stat(blob).st_ino if os.path.exists(blob) else stat.st_ino
+        if stat.st_ino == inodes[digest] or stat.st_nlink > 1:
+            return 0
+        return stat.st_size
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        store = TestCaseStore()
+        dirs = files = saved = 0
+        # dry-run 에서 digest 마다 남게 될 inode
+        inodes = {}
+        for entry in os.scandir(store.root):
+            if not entry.is_dir() or not self.test_case_re.match(entry.name):
+                continue
+            dirs += 1
+            for item in os.scandir(entry.path):
+                if item.is_file(follow_symlinks=False):
+                    files += 1
+                    if dry_run:
+                        saved += self._estimate(store, item.path, inodes)
+                    else:
+                        saved += store.dedupe_file(item.path)
+        pruned, pruned_size = store.prune(dry_run=dry_run)
+        self.stdout.write(f"{'[dry-run] ' if dry_run else ''}{dirs} dirs, {files} files, "
+                          f"{saved / 1024 / 1024:.1f} MB deduplicated, {pruned} unreferenced blobs "
+                          f"({pruned_size / 1024 / 1024:.1f} MB) pruned")
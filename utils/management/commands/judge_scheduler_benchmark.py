@@ -0,0 +1,53 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from conf.models import JudgeServer
+from judge.scheduler import DBLockJudgeScheduler, RedisJudgeScheduler, SchedulePolicy
+
+
+class Command(BaseCommand):
+    help = "judge server 선택(acquire + release) 처리량을 DB lock 방식과 Redis lease 방식으로 비교한다. 운영 DB 가 아닌 곳에서 실행할 것"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--servers", type=int, default=4)
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--seconds", type=float, default=5)
+
+    def _run(self, scheduler, threads, seconds):
+        deadline = time.time() + seconds
+
+        def worker(index):
+            count = 0
+            try:
+                while time.time() < deadline:
+                    server, token = scheduler.acquire(test_case_id=f"bench_{index}_{count % 8}")
+                    if server:
+                        scheduler.release(server, token)
+                        count += 1
+            finally:
+                connection.close()
+            return count
+
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            total = sum(executor.map(worker, range(threads)))
+        return total / (time.time() - start)
+
+    def handle(self, *args, **options):
+        servers = [JudgeServer.objects.create(hostname=f"bench-{i}", judger_version="bench", cpu_core=4,
+                                              memory_usage=0, cpu_usage=0, service_url="http://127.0.0.1",
+                                              last_heartbeat=timezone.now() + timedelta(hours=1))
+                   for i in range(options["servers"])]
+        try:
+            candidates = [("db_lock", DBLockJudgeScheduler())]
+            candidates += [(f"redis_{policy}", RedisJudgeScheduler(policy=policy)) for policy in SchedulePolicy.choices()]
+            for name, scheduler in candidates:
+                ops = self._run(scheduler, options["threads"], options["seconds"])
+                self.stdout.write(f"{name:<24} {ops:>10.1f} dispatch/s")
+        finally:
+            JudgeServer.objects.filter(id__in=[s.id for s in servers]).delete()
@@ -0,0 +1,74 @@
+import builtins
+import json
+import random
+import time
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+
+from lecture.views.LectureAnalysis import lecDispatcher, ContestType
+from lecture.views.LectureScoreTree import ScoreTree
+from submission.models import JudgeStatus
+
+
+class Command(BaseCommand):
+    help = "DB 없이 만든 강의 score 로 이전 dict 형식(lecDispatcher)과 ScoreTree 의 제출 1 건 반영 시간과 저장 크기를 비교한다"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--contests", type=int, default=120)
+        parser.add_argument("--problems", type=int, default=5, help="contest 당 문제 수")
+        parser.add_argument("--submissions", type=int, default=200)
+
+    def _problems(self, contests, per_contest):
+        problems = []
+        for cid in range(1, contests + 1):
+            contest = SimpleNamespace(id=cid, title=f"Contest {cid}", visible=True,
+                                      lecture_contest_type=random.choice(ContestType.cTypeList))
+            for i in range(per_contest):
+                problems.append(SimpleNamespace(id=cid * 100 + i, title=f"Problem {i}", visible=True,
+                                                total_score=100, contest=contest))
+        return problems
+
+    def _submissions(self, problems, count):
+        for _ in range(count):
+            problem = random.choice(problems)
+            accepted = random.random() < 0.5
+            yield SimpleNamespace(contest=problem.contest, problem=problem, problem_id=problem.id,
+                                  result=JudgeStatus.ACCEPTED if accepted else JudgeStatus.WRONG_ANSWER,
+                                  info={"data": [{"score": random.randint(0, 100)}]} if accepted else {})
+
+    def _measure(self, name, score, submissions, load, dump):
+        # 제출마다 DB 에서 읽고(json) 반영한 뒤 다시 저장(json)하는 과정과 같다
+        stored = json.dumps(score)
+        start = time.time()
+        for submission in submissions:
+            tree = load(json.loads(stored))
+            tree.associateSubmission(submission)
+            stored = json.dumps(dump(tree))
+        elapsed = time.time() - start
+        self.stdout.write(f"{name:<12} {elapsed / len(submissions) * 1000:>8.2f} ms/submission  "
+                          f"stored {len(stored) / 1024:>8.1f} KB")
+
+    def handle(self, *args, **options):
+        problems = self._problems(options["contests"], options["problems"])
+        submissions = list(self._submissions(problems, options["submissions"]))
+
+        legacy = lecDispatcher()
+        for problem in problems:
+            legacy.migrateProblem(problem)
+        score = json.loads(json.dumps(legacy.toDict()))
+
+        def legacy_load(data):
+            tree = lecDispatcher()
+            tree.fromDict(data)
+            return tree
+
+        # 이전 구조의 associateSubmission 은 print 를 하므로 측정하는 동안 끈다
+        _print = builtins.print
+        builtins.print = lambda *args, **kwargs: None
+        try:
+            self._measure("dict", score, submissions, legacy_load, lambda tree: tree.toDict())
+            self._measure("score_tree", ScoreTree.fromDict(score).dump(), submissions,
+                          ScoreTree.load, lambda tree: tree.dump())
+        finally:
+            builtins.print = _print
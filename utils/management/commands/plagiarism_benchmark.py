@@ -0,0 +1,155 @@
+import os
+import random
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from utils.PlagiarismChecker.Plag import winnowing
+
+JPLAG_JAR = os.path.join(os.path.dirname(winnowing.__file__), "jplag", "jplag-2.12.1-SNAPSHOT-jar-with-dependencies.jar")
+
+
+class Command(BaseCommand):
+    help = "비슷한 코드 묶음과 서로 다른 코드를 섞은 C 제출을 만들어 winnowing engine 과 JPlag jar 의 시간과 찾은 쌍을 비교한다"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--submissions", type=int, default=1000)
+        parser.add_argument("--copied-ratio", type=float, default=0.1, help="다른 제출을 고쳐서 만든 제출의 비율")
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--threshold", type=float, default=50, help="표절로 볼 avg similarity(%%)")
+        parser.add_argument("--skip-jplag", action="store_true")
+
+    def _expr(self, names, depth):
+        choice = random.randint(0, 5 if depth < 3 else 1)
+        if choice == 0:
+            return random.choice(names)
+        if choice == 1:
+            return str(random.randint(0, 100))
+        if choice == 2:
+            return f"({self._expr(names, depth + 1)})"
+        if choice == 3:
+            return f"{random.choice(['abs', 'f', 'g'])}({self._expr(names, depth + 1)})"
+        if choice == 4:
+            return f"{random.choice(names)}[{self._expr(names, depth + 1)} % 100]"
+        op = random.choice(["+", "-", "*", "/", "%", "<<", "&", "|", "^"])
+        return f"{self._expr(names, depth + 1)} {op} {self._expr(names, depth + 1)}"
+
+    def _cond(self, names):
+        op = random.choice(["<", ">", "<=", ">=", "==", "!="])
+        cond = f"{self._expr(names, 1)} {op} {self._expr(names, 1)}"
+        if random.random() < 0.3:
+            cond += f" {random.choice(['&&', '||'])} {random.choice(names)}"
+        return cond
+
+    def _block(self, names, depth, indent):
+        lines = []
+        for _ in range(random.randint(1, 4 if depth else 12)):
+            lines += self._statement(names, depth, indent)
+        return lines
+
+    def _statement(self, names, depth, indent):
+        pad = "    " * indent
+        choice = random.randint(0, 6 if depth < 2 else 2)
+        if choice == 0:
+            return [f"{pad}{random.choice(names)} {random.choice(['=', '+=', '-=', '*=', '^='])} {self._expr(names, 0)};"]
+        if choice == 1:
+            return [f"{pad}printf(\"%d\\n\", {self._expr(names, 1)});"]
+        if choice == 2:
+            return [f"{pad}{random.choice(names)}{random.choice(['++', '--'])};"]
+        if choice in (3, 4):
+            lines = [f"{pad}if ({self._cond(names)}) {{"] + self._block(names, depth + 1, indent + 1)
+            if random.random() < 0.5:
+                lines += [f"{pad}}} else {{"] + self._block(names, depth + 1, indent + 1)
+            return lines + [f"{pad}}}"]
+        if choice == 5:
+            var = random.choice(names)
+            return ([f"{pad}for ({var} = 0; {var} < {self._expr(names, 2)}; {var}++) {{"] +
+                    self._block(names, depth + 1, indent + 1) + [f"{pad}}}"])
+        return [f"{pad}while ({self._cond(names)}) {{"] + self._block(names, depth + 1, indent + 1) + [f"{pad}}}"]
+
+    def _program(self):
+        names = random.sample(["x", "y", "z", "cnt", "sum", "val", "tmp", "acc", "i", "j", "k", "n"], 4)
+        return ("#include <stdio.h>\n\nint main() {\n    int " + ", ".join(f"{name} = 0" for name in names) +
+                ";\n" + "\n".join(self._block(names, 0, 1)) + "\n    return 0;\n}\n")
+
+    def _disguise(self, code):
+        # 변수 이름 변경, 주석 추가, 공백 변경, 문장 하나 추가
+        for name in re.findall(r"int (\w+) = 0", code):
+            code = re.sub(rf"\b{name}\b", f"{name}_{random.randint(0, 99)}", code)
+        lines = code.split("\n")
+        lines.insert(random.randint(4, len(lines) - 2), "    // " + random.choice(["check", "todo", "loop"]))
+        lines.insert(random.randint(4, len(lines) - 2), "    printf(\"\\n\");")
+        return "\n".join(line.replace("    ", "\t") for line in lines)
+
+    def _submissions(self, count, copied_ratio):
+        codes = {}
+        copied = {}
+        for i in range(count):
+            name = f"sid_{i}"
+            if codes and random.random() < copied_ratio:
+                source = random.choice(list(codes))
+                codes[name] = self._disguise(codes[source])
+                copied[name] = source
+            else:
+                codes[name] = self._program()
+        return codes, copied
+
+    def _winnowing(self, codes, workers):
+        start = time.time()
+        fingerprints = {name: winnowing.fingerprint(code, "C") for name, code in codes.items()}
+        fingerprint_time = time.time() - start
+        matches = winnowing.WinnowingEngine(workers=workers).compare(fingerprints)
+        return matches, fingerprint_time, time.time() - start
+
+    def _jplag(self, codes, base):
+        src = os.path.join(base, "src")
+        for name, code in codes.items():
+            os.makedirs(os.path.join(src, name))
+            with open(os.path.join(src, name, "code.c"), "w") as f:
+                f.write(code)
+        start = time.time()
+        result = subprocess.run(["java", "-jar", JPLAG_JAR, "-l", "c/c++", "-s", src, "-r", os.path.join(base, "result")],
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        elapsed = time.time() - start
+        scores = {}
+        for line in result.stdout.decode(errors="replace").split("\n"):
+            match = re.search(r"Comparing (sid_\d+)-(sid_\d+): ([\d.]+)", line)
+            if match:
+                scores[tuple(sorted(match.group(1, 2)))] = float(match.group(3))
+        return scores, elapsed
+
+    def _recall(self, found, copied):
+        expected = {tuple(sorted(pair)) for pair in copied.items()}
+        return len(expected & found) / len(expected) if expected else 1.0
+
+    def handle(self, *args, **options):
+        random.seed(0)
+        codes, copied = self._submissions(options["submissions"], options["copied_ratio"])
+        threshold = options["threshold"]
+        total_pairs = len(codes) * (len(codes) - 1) // 2
+        self.stdout.write(f"{len(codes)} submissions, {len(copied)} copied, {total_pairs} possible pairs")
+
+        matches, fingerprint_time, elapsed = self._winnowing(codes, options["workers"])
+        found = {(m.a, m.b) if m.a < m.b else (m.b, m.a) for m in matches if m.similarity >= threshold}
+        self.stdout.write(f"{'winnowing':<10} {elapsed:>8.2f}s (fingerprint {fingerprint_time:.2f}s)  "
+                          f"{len(matches)} pairs scored, {len(found)} >= {threshold}%, "
+                          f"recall {self._recall(found, copied):.3f}")
+
+        if options["skip_jplag"]:
+            return
+        if not shutil.which("java"):
+            self.stdout.write("java 가 없어서 JPlag 는 건너뛴다")
+            return
+        base = tempfile.mkdtemp()
+        try:
+            scores, jplag_time = self._jplag(codes, base)
+        finally:
+            shutil.rmtree(base, ignore_errors=True)
+        jplag_found = {pair for pair, value in scores.items() if value >= threshold}
+        self.stdout.write(f"{'jplag':<10} {jplag_time:>8.2f}s  {len(scores)} pairs scored, "
+                          f"{len(jplag_found)} >= {threshold}%, recall {self._recall(jplag_found, copied):.3f}")
+        self.stdout.write(f"agreement {len(found & jplag_found)} / {len(found | jplag_found)} pairs")
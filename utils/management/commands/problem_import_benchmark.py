@@ -0,0 +1,98 @@
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+import zipfile
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from account.models import AdminType, User
+from problem.importer import ProblemImporter, TestCaseZipProcessor
+from problem.models import Problem, ProblemTag
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "문제가 많은 가져오기 zip 을 이전 방식(문제마다 zip 을 다시 열고 하나씩 저장)과 ProblemImporter 로 가져와 시간과 쿼리 수를 비교한다, DB 변경은 되돌린다"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--problems", type=int, default=500)
+        parser.add_argument("--cases", type=int, default=10, help="문제마다 in/out 쌍의 수")
+        parser.add_argument("--case-kb", type=int, default=64, help="test case 파일 하나의 크기(KB)")
+        parser.add_argument("--dir", default=None, help="zip 과 test case 를 만들 디렉터리, 기본은 임시 디렉터리")
+
+    def _problem_json(self, index):
+        html = {"format": "html", "value": f"<p>problem {index}</p>"}
+        return {"display_id": f"bench-{index}", "title": f"bench {index}", "description": html,
+                "input_description": html, "output_description": html, "hint": html, "test_case_score": None,
+                "time_limit": 1000, "memory_limit": 256, "samples": [{"input": "1", "output": "1"}],
+                "template": {}, "spj": None, "rule_type": "ACM", "source": "benchmark", "answers": [],
+                "tags": random.sample([f"bench-tag-{i}" for i in range(30)], 3)}
+
+    def _make_zip(self, path, problems, cases, case_kb):
+        line = " ".join(str(random.randint(0, 10 ** 9)) for _ in range(8)) + "\r\n"
+        content = (line * (case_kb * 1024 // len(line) + 1))[:case_kb * 1024]
+        with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as f:
+            for index in range(1, problems + 1):
+                f.writestr(f"{index}/problem.json", json.dumps(self._problem_json(index)))
+                for case in range(1, cases + 1):
+                    f.writestr(f"{index}/testcase/{case}.in", content)
+                    f.writestr(f"{index}/testcase/{case}.out", content)
+
+    def _legacy(self, path, user):
+        # 이전 ImportProblemAPI 와 같은 방식: 문제마다 process_zip 으로 zip 을 다시 열고, 문제와 tag 를 하나씩 저장한다
+        importer = ProblemImporter(user.id)
+        with zipfile.ZipFile(path) as zip_file:
+            items = importer.read_zip(zip_file, set(zip_file.namelist()))
+        processor = TestCaseZipProcessor()
+        for index, problem_info in items:
+            _, test_case_id = processor.process_zip(path, spj=False, dir=f"{index}/testcase/")
+            problem = importer.zip_problem(problem_info, test_case_id)
+            problem.save()
+            for tag_name in problem_info["tags"]:
+                tag, _ = ProblemTag.objects.get_or_create(name=tag_name)
+                problem.tags.add(tag)
+        return len(items)
+
+    def _pipeline(self, path, user):
+        return len(ProblemImporter(user.id).import_zip(path))
+
+    def _measure(self, name, func, path, user, root):
+        try:
+            with override_settings(TEST_CASE_DIR=root), CaptureQueriesContext(connection) as queries, \
+                    transaction.atomic():
+                start = time.time()
+                count = func(path, user)
+                elapsed = time.time() - start
+                created = Problem.objects.filter(source="benchmark", created_by=user).count()
+                raise _Rollback()
+        except _Rollback:
+            pass
+        self.stdout.write(f"{name:<10} {elapsed:>8.2f}s  {len(queries)} queries, {count} imported, {created} rows")
+
+    def handle(self, *args, **options):
+        random.seed(0)
+        base = tempfile.mkdtemp(dir=options["dir"])
+        try:
+            path = os.path.join(base, "problems.zip")
+            self._make_zip(path, options["problems"], options["cases"], options["case_kb"])
+            self.stdout.write(f"zip {os.path.getsize(path) / 1024 / 1024:.1f} MB, {options['problems']} problems, "
+                              f"{options['cases']} cases each")
+            user = User.objects.filter(admin_type=AdminType.SUPER_ADMIN).first()
+            if user is None:
+                self.stdout.write("super admin 이 없어서 실행할 수 없다")
+                return
+            for name, func in [("legacy", self._legacy), ("pipeline", self._pipeline)]:
+                root = os.path.join(base, name)
+                os.mkdir(root)
+                self._measure(name, func, path, user, root)
+        finally:
+            shutil.rmtree(base, ignore_errors=True)
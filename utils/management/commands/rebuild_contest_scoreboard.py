@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+
+from contest.models import Contest
+from contest.scoreboard import ContestScoreboard
+
+
+class Command(BaseCommand):
+    help = "DB 의 ACMContestRank/OIContestRank 로부터 대회 순위표(Redis)를 다시 만든다"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--contest_id", type=int, help="지정하지 않으면 진행 중인 모든 대회")
+
+    def handle(self, *args, **options):
+        if options["contest_id"]:
+            contests = Contest.objects.filter(id=options["contest_id"])
+        else:
+            current = now()
+            contests = Contest.objects.filter(start_time__lte=current, end_time__gte=current)
+        for contest in contests:
+            scoreboard = ContestScoreboard(contest)
+            scoreboard.rebuild()
+            self.stdout.write(self.style.SUCCESS(f"Contest {contest.id}: {scoreboard.count()} ranks"))
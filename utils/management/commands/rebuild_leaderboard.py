@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from account.leaderboard import Leaderboard, sync_rank_points
+from utils.constants import ContestRuleType
+
+
+class Command(BaseCommand):
+    help = "DB 의 UserProfile 과 제출 기록으로부터 전체 순위표(Redis)를 다시 만든다"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rule", choices=ContestRuleType.choices(), help="지정하지 않으면 모든 순위표")
+        parser.add_argument("--reconcile", action="store_true", help="다시 만들지 않고 DB 와 다른 것만 고친다")
+
+    def handle(self, *args, **options):
+        if options["rule"]:
+            leaderboards = [Leaderboard(options["rule"])]
+        else:
+            leaderboards = Leaderboard.all()
+        if not options["rule"] or options["rule"] == ContestRuleType.POINT:
+            self.stdout.write(f"rank point: {sync_rank_points()} users fixed")
+        for leaderboard in leaderboards:
+            if options["reconcile"]:
+                fixed = leaderboard.reconcile()
+                self.stdout.write(self.style.SUCCESS(f"{leaderboard.rule_type}: {fixed} users fixed, "
+                                                     f"{leaderboard.count()} ranks"))
+            else:
+                leaderboard.rebuild()
+                self.stdout.write(self.style.SUCCESS(f"{leaderboard.rule_type}: {leaderboard.count()} ranks"))
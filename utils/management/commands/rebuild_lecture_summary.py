@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from lecture.models import signup_class
+from lecture.views.LectureBuilder import BATCH_CHUNK_SIZE
+from lecture.views.LectureScoreTree import ScoreTree
+from lecture.views.LectureSummary import bulkSaveSummary
+
+
+class Command(BaseCommand):
+    help = "signup_class.score 로부터 성적표 summary(LectureScoreSummary/ContestScoreSummary)를 다시 만든다"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lecture_id", type=int, help="지정하지 않으면 모든 강의")
+
+    def handle(self, *args, **options):
+        signups = signup_class.objects.filter(isallow=True).only("id", "lecture_id", "user_id", "score").order_by("id")
+        if options["lecture_id"]:
+            signups = signups.filter(lecture_id=options["lecture_id"])
+
+        count = 0
+        chunk = []
+        for signup in signups.iterator(chunk_size=BATCH_CHUNK_SIZE):
+            chunk.append((signup, ScoreTree.load(signup.score)))
+            if len(chunk) >= BATCH_CHUNK_SIZE:
+                bulkSaveSummary(chunk)
+                count += len(chunk)
+                chunk = []
+        bulkSaveSummary(chunk)
+        count += len(chunk)
+        self.stdout.write(self.style.SUCCESS(f"{count} summaries rebuilt"))
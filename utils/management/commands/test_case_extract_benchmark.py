@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from problem import test_case_store
+from problem.views.admin import TestCaseZipProcessor
+
+
+class Command(BaseCommand):
+    help = "큰 test case zip 을 이전 방식(파일 전체를 메모리에서 변환)과 streaming 방식(순차/병렬)으로 풀어 시간, 최대 메모리, info 파일이 같은지 비교한다"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size-mb", type=int, default=2048, help="압축을 푼 전체 크기")
+        parser.add_argument("--cases", type=int, default=8, help="in/out 쌍의 수")
+        parser.add_argument("--dir", default=None, help="zip 과 test case 를 만들 디렉터리, 기본은 임시 디렉터리")
+
+    def _blocks(self):
+        # CRLF 줄과 끝 공백이 섞인 약 1MB 의 블록, 크기가 chunk 크기와 달라서 CR/LF 가 chunk 경계에 걸친다
+        blocks = []
+        for _ in range(16):
+            lines = [" ".join(str(random.randint(0, 10 ** 9)) for _ in range(8)) + random.choice(["\r\n", "\n", " \r\n"])
+                     for _ in range(12000)]
+            blocks.append("".join(lines).encode()[:1000003])
+        return blocks
+
+    def _make_zip(self, path, size_mb, cases):
+        blocks = self._blocks()
+        per_file = size_mb * 1024 * 1024 // (cases * 2)
+        with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            for i in range(1, cases + 1):
+                for ext in ("in", "out"):
+                    with zf.open(f"{i}.{ext}", "w", force_zip64=True) as f:
+                        written = 0
+                        while written < per_file:
+                            block = random.choice(blocks)
+                            f.write(block)
+                            written += len(block)
+                        f.write(b"\r\n  \r\n")
+
+    def _legacy(self, zip_path, test_case_dir):
+        # 이전 process_zip 과 같은 방식: 파일 전체를 읽고 replace, rstrip 한 뒤 md5
+        zip_file = zipfile.ZipFile(zip_path)
+        processor = TestCaseZipProcessor()
+        test_case_list = processor.filter_name_list(zip_file.namelist(), spj=False)
+        os.mkdir(test_case_dir)
+        size_cache, md5_cache = {}, {}
+        for item in test_case_list:
+            with open(os.path.join(test_case_dir, item), "wb") as f:
+                content = zip_file.read(item).replace(b"\r\n", b"\n")
+                size_cache[item] = len(content)
+                if item.endswith(".out"):
+                    md5_cache[item] = hashlib.md5(content.rstrip()).hexdigest()
+                f.write(content)
+        test_case_info = {"spj": False, "test_cases": {}}
+        for index, item in enumerate(zip(*[test_case_list[i::2] for i in range(2)])):
+            test_case_info["test_cases"][str(index + 1)] = {"stripped_output_md5": md5_cache[item[1]],
+                                                            "input_size": size_cache[item[0]],
+                                                            "output_size": size_cache[item[1]],
+                                                            "input_name": item[0],
+                                                            "output_name": item[1]}
+        with open(os.path.join(test_case_dir, "info"), "w", encoding="utf-8") as f:
+            f.write(json.dumps(test_case_info, indent=4))
+        return os.path.join(test_case_dir, "info")
+
+    def _streaming(self, zip_path, root):
+        with override_settings(TEST_CASE_DIR=root), open(zip_path, "rb") as f:
+            _, test_case_id = TestCaseZipProcessor().process_zip(f, spj=False)
+        return os.path.join(root, test_case_id, "info")
+
+    def _measure(self, name, func):
+        tracemalloc.start()
+        start = time.time()
+        result = func()
+        elapsed = time.time() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.stdout.write(f"{name:<20} {elapsed:>8.2f}s  peak {peak / 1024 / 1024:>8.1f} MB")
+        return result
+
+    def handle(self, *args, **options):
+        base = tempfile.mkdtemp(dir=options["dir"])
+        try:
+            zip_path = os.path.join(base, "test_case.zip")
+            self._make_zip(zip_path, options["size_mb"], options["cases"])
+            self.stdout.write(f"zip {os.path.getsize(zip_path) / 1024 / 1024:.1f} MB, "
+                              f"uncompressed {options['size_mb']} MB, {options['cases']} cases")
+
+            legacy_info = self._measure("legacy", lambda: self._legacy(zip_path, os.path.join(base, "legacy")))
+            infos = [legacy_info]
+            for name, threshold in [("streaming", float("inf")), ("streaming_parallel", 0)]:
+                root = os.path.join(base, name)
+                os.mkdir(root)
+                with mock.patch.object(test_case_store, "PARALLEL_EXTRACT_SIZE", threshold):
+                    infos.append(self._measure(name, lambda: self._streaming(zip_path, root)))
+
+            contents = []
+            for path in infos:
+                with open(path, "rb") as f:
+                    contents.append(f.read())
+            self.stdout.write(f"info identical: {all(content == contents[0] for content in contents)}")
+        finally:
+            shutil.rmtree(base, ignore_errors=True)
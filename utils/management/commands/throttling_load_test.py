@@ -0,0 +1,95 @@
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from utils.cache import cache
+from utils.constants import CacheKey
+from utils.throttling import TokenBucket, consume_buckets
+
+
+class Command(BaseCommand):
+    help = "여러 thread 가 동시에 제출 throttling 을 호출할 때 허용 수가 bucket 한도를 넘지 않는지와 처리량을 잰다. 운영 redis 가 아닌 곳에서 실행할 것"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=32)
+        parser.add_argument("--seconds", type=float, default=5)
+        parser.add_argument("--capacity", type=int, default=20)
+        parser.add_argument("--fill-rate", type=float, default=2)
+
+    def _legacy_consume(self, key, capacity, fill_rate, default_capacity):
+        # 이전 TokenBucket 과 같은 순서의 hget/hset, 원자적이지 않다
+        last = cache.hget(key, "last_capacity")
+        if last is None:
+            last = default_capacity
+            cache.hset(key, "last_capacity", last)
+            cache.hset(key, "last_timestamp", time.time())
+        last = float(last)
+        if last >= 1:
+            cache.hset(key, "last_capacity", last - 1)
+            return True
+        now = time.time()
+        current = min(last + fill_rate * (now - float(cache.hget(key, "last_timestamp"))), capacity)
+        if current >= 1:
+            cache.hset(key, "last_capacity", current - 1)
+            cache.hset(key, "last_timestamp", now)
+            return True
+        return False
+
+    def _run(self, consume, threads, seconds):
+        deadline = time.time() + seconds
+
+        def worker(index):
+            calls = admitted = 0
+            while time.time() < deadline:
+                calls += 1
+                admitted += bool(consume(index))
+            return calls, admitted
+
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            results = list(executor.map(worker, range(threads)))
+        elapsed = time.time() - start
+        return sum(c for c, _ in results), sum(a for _, a in results), elapsed
+
+    def handle(self, *args, **options):
+        threads, seconds = options["threads"], options["seconds"]
+        config = {"capacity": options["capacity"], "fill_rate": options["fill_rate"],
+                  "default_capacity": options["capacity"]}
+        prefix = f"{CacheKey.throttling}:load_test:{uuid.uuid4().hex}"
+        keys = []
+
+        def key(name):
+            keys.append(f"{prefix}:{name}")
+            return keys[-1]
+
+        # 모든 thread 가 같은 사용자 bucket 을 쓴다, 허용 수는 처음 용량 + 채워진 양을 넘으면 안 된다
+        shared = key("shared")
+        shared_lua = key("shared_lua")
+        candidates = [
+            ("legacy", lambda i: self._legacy_consume(shared, **config)),
+            ("lua", lambda i: TokenBucket(key=shared_lua, redis_conn=cache, **config).consume()[0]),
+        ]
+        try:
+            self.stdout.write("같은 bucket 을 동시에 consume")
+            for name, consume in candidates:
+                calls, admitted, elapsed = self._run(consume, threads, seconds)
+                limit = config["default_capacity"] + config["fill_rate"] * elapsed
+                self.stdout.write(f"{name:<8} {calls / elapsed:>10.1f} calls/s  admitted {admitted:>6}  "
+                                  f"limit {limit:>8.1f}  {'OK' if admitted <= limit else 'OVER'}")
+
+            # thread 마다 다른 사용자, 사용자 + IP + 대회 bucket 을 한 번에 확인
+            user_keys = [(key(f"user:{i}"), key(f"ip:{i}"), key(f"contest:{i}")) for i in range(threads)]
+
+            def multi(index):
+                buckets = [TokenBucket(key=k, redis_conn=cache, **config) for k in user_keys[index]]
+                return consume_buckets(buckets)[0]
+
+            calls, admitted, elapsed = self._run(multi, threads, seconds)
+            limit = threads * (config["default_capacity"] + config["fill_rate"] * elapsed)
+            self.stdout.write("사용자 + IP + 대회 bucket 을 한 번의 EVALSHA 로 consume")
+            self.stdout.write(f"{'lua_multi':<8} {calls / elapsed:>10.1f} calls/s  admitted {admitted:>6}  "
+                              f"limit {limit:>8.1f}  {'OK' if admitted <= limit else 'OVER'}")
+        finally:
+            cache.delete_many(keys)
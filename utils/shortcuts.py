@@ -5,6 +5,7 @@ import random
 from base64 import b64encode
 from io import BytesIO
 
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
 from django.utils.crypto import get_random_string
 from envelopes import Envelope
 
@@ -92,3 +93,50 @@ def check_is_id(value):
         return int(value) > 0
     except Exception:
         return False
+
+
+def _read_range(file, length, chunk_size=1024 * 1024):
+    try:
+        while length > 0:
+            chunk = file.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+def file_response(request, path, filename, content_type="application/octet-stream", accel_path=None,
+                  _range_re=re.compile(r"^bytes=(\d*)-(\d*)$")):
+    """
+    파일을 첨부 파일로 보낸다, Range 헤더가 하나의 범위(bytes=start-end)이면 206 으로 그 부분만 보낸다
+    :param accel_path: nginx 의 internal location 경로, 있으면 X-Accel-Redirect 로 nginx 가 직접 보낸다 (Range 도 nginx 가 처리한다)
+    """
+    if accel_path:
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = accel_path
+    else:
+        size = os.path.getsize(path)
+        match = _range_re.match(request.META.get("HTTP_RANGE", "").strip())
+        if match and (match.group(1) or match.group(2)):
+            if match.group(1):
+                start = int(match.group(1))
+                end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+            else:
+                start, end = max(0, size - int(match.group(2))), size - 1
+            if start > end:
+                response = HttpResponse(status=416)
+                response["Content-Range"] = f"bytes */{size}"
+                return response
+            file = open(path, "rb")
+            file.seek(start)
+            response = StreamingHttpResponse(_read_range(file, end - start + 1), status=206, content_type=content_type)
+            response["Content-Range"] = f"bytes {start}-{end}/{size}"
+            response["Content-Length"] = end - start + 1
+        else:
+            response = FileResponse(open(path, "rb"), content_type=content_type)
+            response["Content-Length"] = size
+        response["Accept-Ranges"] = "bytes"
+    response["Content-Disposition"] = f"attachment; filename={filename}"
+    return response
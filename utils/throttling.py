@@ -1,10 +1,47 @@
 import time
 
+# KEYS: bucket key 들
+# ARGV: now, num, 그 뒤로 bucket 마다 capacity, fill_rate, default_capacity
+# 모든 bucket 에 num 개 이상 있을 때만 꺼낸다. 오래 안 쓴 bucket 은 가득 찰 시간이 지나면 만료된다
+_CONSUME_SCRIPT = """
+local now = tonumber(ARGV[1])
+local num = tonumber(ARGV[2])
+local tokens = {}
+local wait = 0
+local blocked = 0
+for i, key in ipairs(KEYS) do
+    local base = 2 + (i - 1) * 3
+    local capacity = tonumber(ARGV[base + 1])
+    local fill_rate = tonumber(ARGV[base + 2])
+    local state = redis.call("HMGET", key, "last_capacity", "last_timestamp")
+    local current = tonumber(ARGV[base + 3])
+    if state[1] then
+        current = math.min(capacity, tonumber(state[1]) + math.max(0, now - tonumber(state[2])) * fill_rate)
+    end
+    tokens[i] = current
+    if current < num and (num - current) / fill_rate > wait then
+        wait = (num - current) / fill_rate
+        blocked = i
+    end
+end
+if blocked > 0 then
+    return {0, tostring(wait), blocked}
+end
+for i, key in ipairs(KEYS) do
+    local base = 2 + (i - 1) * 3
+    redis.call("HMSET", key, "last_capacity", tostring(tokens[i] - num), "last_timestamp", ARGV[1])
+    redis.call("EXPIRE", key, math.ceil(tonumber(ARGV[base + 1]) / tonumber(ARGV[base + 2])))
+end
+return {1, "0", 0}
+"""
+
 
 class TokenBucket:
     """
-    注意：对于单个key的操作不是线程安全的
+    token 은 Lua script 안에서 읽고 갱신하므로 같은 key 를 동시에 consume 해도 안전하다
     """
+    _script = None
+
     def __init__(self, key, capacity, fill_rate, default_capacity, redis_conn):
         """
         :param capacity: 最大容量
@@ -18,55 +55,30 @@ class TokenBucket:
         self._default_capacity = default_capacity
         self._redis_conn = redis_conn
 
-        self._last_capacity_key = "last_capacity"
-        self._last_timestamp_key = "last_timestamp"
-
-    def _init_key(self):
-        self._last_capacity = self._default_capacity
-        now = time.time()
-        self._last_timestamp = now
-        return self._default_capacity, now
-
-    @property
-    def _last_capacity(self):
-        last_capacity = self._redis_conn.hget(self._key, self._last_capacity_key)
-        if last_capacity is None:
-            return self._init_key()[0]
-        else:
-            return float(last_capacity)
-
-    @_last_capacity.setter
-    def _last_capacity(self, value):
-        self._redis_conn.hset(self._key, self._last_capacity_key, value)
-
-    @property
-    def _last_timestamp(self):
-        return float(self._redis_conn.hget(self._key, self._last_timestamp_key))
-
-    @_last_timestamp.setter
-    def _last_timestamp(self, value):
-        self._redis_conn.hset(self._key, self._last_timestamp_key, value)
-
-    def _try_to_fill(self, now):
-        delta = self._fill_rate * (now - self._last_timestamp)
-        return min(self._last_capacity + delta, self._capacity)
-
     def consume(self, num=1):
         """
         消耗 num 个 token，返回是否成功
         :param num:
         :return: result: bool, wait_time: float
         """
-        # print("capacity ", self.fill(time.time()))
-        if self._last_capacity >= num:
-            self._last_capacity -= num
-            return True, 0
-        else:
-            now = time.time()
-            cur_num = self._try_to_fill(now)
-            if cur_num >= num:
-                self._last_capacity = cur_num - num
-                self._last_timestamp = now
-                return True, 0
-            else:
-                return False, (num - cur_num) / self._fill_rate
+        result, wait, _ = consume_buckets([self], num)
+        return result, wait
+
+
+def consume_buckets(buckets, num=1):
+    """
+    여러 bucket (사용자, IP, 대회 등) 에서 한 번의 EVALSHA 로 num 개씩 꺼낸다
+    하나라도 모자라면 어느 bucket 에서도 꺼내지 않는다
+    :param buckets: 같은 redis 를 쓰는 TokenBucket 목록
+    :return: result: bool, wait_time: float, 가장 오래 기다려야 하는 bucket (성공하면 None)
+    """
+    redis_conn = buckets[0]._redis_conn
+    if TokenBucket._script is None:
+        TokenBucket._script = redis_conn.register_script(_CONSUME_SCRIPT)
+    args = [repr(time.time()), num]
+    for bucket in buckets:
+        args += [bucket._capacity, bucket._fill_rate, bucket._default_capacity]
+    result, wait, blocked = TokenBucket._script(keys=[bucket._key for bucket in buckets], args=args, client=redis_conn)
+    if result:
+        return True, 0, None
+    return False, float(wait), buckets[blocked - 1]